@@ -5,117 +5,153 @@
 # Remote library imports
 from flask import request
 from flask_restful import Resource
+from sqlalchemy import func, select
 
-from config import app, db, api, SMS_MESSAGES
+from config import app, db, api, blocking
 from models import *
-import re
+from resolver import user_resolver
+from profile_cache import profile_cache
+from outbox import outbox
+from metrics import metrics, family
+from match_index import match_index, load_users
+from commands import *
+from gazetteer import normalize_town, normalize_county, towns
+from ranking import ranker
+from match_cache import match_cache
+from compaction import compactor
+from dedup import dedup, batched_responses, PENDING
+from ratelimit import rate_limiter
+from templates import locales, render, reply, speaking
 
 class SMSProcessor(Resource):
+     # Set while a batch owns the transaction, so finish() leaves committing to the batch
+     batching = False
+
      def post(self):
         data = request.get_json()
-        phone_number = data.get("from")
-        message = data.get("text")
+        return self.process(data.get("from"), data.get("text"), data.get("id"))
+
+     def process(self, phone_number, message, message_id=None):
+        """Run one inbound SMS, or replay the response to an earlier delivery of the same message id"""
+        if not message_id or not phone_number:
+            return self.run(phone_number, message)
+
+        replay = blocking(db.session(), dedup.claim, phone_number, str(message_id))
+        if replay == PENDING:
+            return {"status": "error", "message": "Message is already being processed"}, 409
+        if replay is not None:
+            return replay
+
+        try:
+            response = self.run(phone_number, message)
+        except Exception:
+            blocking(db.session(), dedup.release, phone_number, str(message_id))
+            raise
+        if self.batching:
+            # The batch commits this message's writes later; a failed commit releases the claim instead
+            batched_responses.add(db.session(), (phone_number, str(message_id), response))
+        else:
+            blocking(db.session(), dedup.complete, phone_number, str(message_id), response)
+        return response
 
+     def run(self, phone_number, message):
+        """Run one inbound SMS through its command handler and return (body, status)"""
         if not phone_number or not message:
             return {"status": "error", "message": "Missing phone number or text"}, 400
 
         message = message.strip().lower()
 
-        if message.startswith("start#"):
+        entry = lookup(message)
+        if entry is None:
             return {
-                "status": "success",
-                "response": self.handle_registration(phone_number, message)
-            }, 200
-        
-        elif message.startswith("details#"):
-            user = User.query.filter_by(phone_number=phone_number).first()
-            if not user:
-                return {"status": "error", "message": "User not registered"}, 400
-            return {
-                "status": "success",
-                "response": self.handle_details(user, message)
-            }, 200
-        
-        elif message.startswith("myself"):
-            user = User.query.filter_by(phone_number=phone_number).first()
-            if not user:
-                return {"status": "error", "message": "User not registered"}, 400
-            return {
-                "status": "success",
-                "response": self.handle_self_description(user, message)
-            }, 200
-        
-        elif message.startswith("match#"):
-            user = User.query.filter_by(phone_number=phone_number).first()
-            if not user:
-                return {"status": "error", "message": "User not registered"}, 400
-            return {
-                "status": "success",
-                "response": self.handle_match_request(user, message)
-            }, 200
-        
-        elif message.startswith("next"):
-            user = User.query.filter_by(phone_number=phone_number).first()
-            if not user:
-                return {"status": "error", "message": "User not registered"}, 400
-            return {
-                "status": "success",
-                "response": self.handle_next_matches(user)
-            }, 200
+                "status": "error",
+                "message": "Unsupported command"
+            }, 400
 
-        elif re.fullmatch(r"\d{10}", message):
-            user = User.query.filter_by(phone_number=phone_number).first()
-            if not user:
-                return {"status": "error", "message": "User not registered"}, 400
-            return {
-                "status": "success",
-                "response": self.handle_profile_request(user, message)
-            }, 200
-        
-        elif message.startswith("describe "):
-            user = User.query.filter_by(phone_number=phone_number).first()
-            if not user:
-                return {"status": "error", "message": "User not registered"}, 400
-            return {
-                "status": "success",
-                "response": self.handle_describe_request(user, message)
-            }, 200
-        
-        elif message.upper().startswith("YES"):
-            user = User.query.filter_by(phone_number=phone_number).first()
-            if not user:
+        # Throttle before the sender is resolved, so a flood never reaches the database
+        if app.config['RATE_LIMIT_ENABLED']:
+            wait = blocking(db.session(), rate_limiter.check, phone_number, entry.name)
+            if wait:
+                return {
+                    "status": "success",
+                    "response": render('RATE_LIMITED', command=entry.label.replace('_', ' ').upper(), seconds=wait)
+                }, 200
+
+        with metrics.track(entry.label), self.route(phone_number):
+            try:
+                response = self.dispatch(entry, phone_number, message)
+            except Exception:
+                if not self.batching:
+                    db.session.rollback()
+                raise
+            self.finish()
+            return response
+
+     def dispatch(self, entry, phone_number, message):
+        """Resolve the sender, parse the message and run the command's handler"""
+        if entry.requires_user:
+            sender = user_resolver.resolve(phone_number)
+            if not sender:
                 return {"status": "error", "message": "User not registered"}, 400
+        else:
+            sender = phone_number
+
+        # Reply in the sender's language; unregistered numbers get the default one
+        with speaking(sender.language if entry.requires_user else None):
+            try:
+                parsed = entry.parse(message)
+            except ParseError as e:
+                return {
+                    "status": "success",
+                    "response": render(e.template)
+                }, 200
+
             return {
                 "status": "success",
-                "response": self.handle_interest_confirmation(user)
+                "response": reply(getattr(self, entry.handler)(sender, parsed))
             }, 200
-        
+
+     def route(self, phone_number):
+        """Send the SMS's writes to the sender's shard when users are sharded"""
+        return db.session().home_for_phone(phone_number)
+
+     def flush(self):
+        """Send a handler's writes to the database; they are committed once per SMS by finish()"""
+        db.session.flush()
+
+     def discard(self):
+        """Roll back a failed handler's writes: the SMS's transaction, or its savepoint in a batch"""
+        if self.batching:
+            db.session().get_nested_transaction().rollback()
         else:
-            return {
-                "status": "error",
-                "message": "Unsupported command"
-            }, 400
+            db.session.rollback()
+
+     def finish(self):
+        """Commit the SMS as one transaction, or roll it back if a handler's flush failed"""
+        if self.batching:
+            return
+        if db.session.is_active:
+            db.session.commit()
+        else:
+            db.session.rollback()
          
-     def handle_registration(self, phone_number, message):
+     @command('start', parse_registration, requires_user=False, label='registration')
+     def handle_registration(self, phone_number, registration):
         """Handle initial registration: start#name#age#gender#county#town"""
         try:
-            parts = message.split('#')
-            if len(parts) != 6:
-                return SMS_MESSAGES['REGISTRATION_INVALID_FORMAT']
-            
-            _, name, age, gender, county, town = parts
+            name, age, gender = registration.name, registration.age, registration.gender
+            county, town = registration.county, registration.town
             
             # Validate age, gender and check if the user exists
-            age = int(age)
             if age < 18 or age > 80:
-                return SMS_MESSAGES['REGISTRATION_INVALID_AGE']
+                return render('REGISTRATION_INVALID_AGE')
             
             if gender.lower() not in ['male', 'female']:
-                return SMS_MESSAGES['REGISTRATION_INVALID_GENDER']
+                return render('REGISTRATION_INVALID_GENDER')
             
-            existing_user = User.query.filter_by(phone_number=phone_number).first()
+            existing_user = user_resolver.resolve(phone_number)
             if existing_user:
-                return SMS_MESSAGES['REGISTRATION_ALREADY_EXISTS'].format(name=existing_user.name)
+                return render('REGISTRATION_ALREADY_EXISTS', name=existing_user.name)
             
             # Create new user
             user = User(
@@ -123,38 +159,33 @@ class SMSProcessor(Resource):
                 phone_number=phone_number,
                 age=age,
                 gender=gender.lower(),
-                county=county.title(),
-                town=town.title(),
+                county=normalize_county(county, fuzzy=False),
+                town=normalize_town(town, fuzzy=False),
                 registration_level='basic'
             )
             
             db.session.add(user)
-            db.session.commit()
+            self.flush()
             
-            return SMS_MESSAGES['REGISTRATION_SUCCESS'].format(name=name.title())
+            return render('REGISTRATION_SUCCESS', name=name.title())
             
-        except ValueError:
-            return SMS_MESSAGES['REGISTRATION_INVALID_AGE_FORMAT']
         except Exception as e:
-            return SMS_MESSAGES['REGISTRATION_FAILED'].format(error=str(e))
+            self.discard()
+            return render('REGISTRATION_FAILED', error=str(e))
         
-     def handle_details(self, user, message):
+     @command('details', parse_details)
+     def handle_details(self, user, details):
         """Handle details registration: details#education#profession#marital#religion#ethnicity"""
         try:
-            parts = message.split('#')
-            if len(parts) != 6:
-                return SMS_MESSAGES['DETAILS_INVALID_FORMAT']
-            
-            _, education, profession, marital, religion, ethnicity = parts
+            education, profession, marital = details.education, details.profession, details.marital
+            religion, ethnicity = details.religion, details.ethnicity
             
             # Validate marital status
             if marital.lower() not in ['single', 'married', 'divorced']:
-                return SMS_MESSAGES['DETAILS_INVALID_MARITAL']
+                return render('DETAILS_INVALID_MARITAL')
             
             # Create user details
-            user_detail = UserDetail.query.filter_by(user_id=user.id).first()
-            if not user_detail:
-                user_detail = UserDetail(user_id=user.id)
+            user_detail = user.details or self.stored_details(user)
             
             user_detail.education_level = education.title()
             user_detail.profession = profession.title()
@@ -165,118 +196,221 @@ class SMSProcessor(Resource):
             user.registration_level = 'details'
             
             db.session.add(user_detail)
-            db.session.commit()
+            self.flush()
             
-            return SMS_MESSAGES['DETAILS_PROMPT']
+            return render('DETAILS_PROMPT')
             
         except Exception as e:
-            return SMS_MESSAGES['DETAILS_REGISTRATION_FAILED'].format(error=str(e))
+            self.discard()
+            return render('DETAILS_REGISTRATION_FAILED', error=str(e))
         
-     def handle_self_description(self, user, message):
+     @command('myself', parse_self_description, label='self_description', prefix=True)
+     def handle_self_description(self, user, self_description):
         """Handle self description: MYSELF description"""
         try:
-            description = message[6:].strip()
+            description = self_description.description
             
             if len(description) < 10:
-                return SMS_MESSAGES['SELF_DESCRIPTION_TOO_SHORT']
+                return render('SELF_DESCRIPTION_TOO_SHORT')
             
             # Update user details
-            user_detail = UserDetail.query.filter_by(user_id=user.id).first()
-            if not user_detail:
-                user_detail = UserDetail(user_id=user.id)
-                db.session.add(user_detail)
+            user_detail = user.details or self.stored_details(user)
+            db.session.add(user_detail)
             
             user_detail.self_description = description
             user.registration_level = 'completed'
             
-            db.session.commit()
+            self.flush()
             
-            return SMS_MESSAGES['SELF_DESCRIPTION_SUCCESS']
+            return render('SELF_DESCRIPTION_SUCCESS')
             
         except Exception as e:
-            return SMS_MESSAGES['SELF_DESCRIPTION_FAILED'].format(error=str(e))
+            self.discard()
+            return render('SELF_DESCRIPTION_FAILED', error=str(e))
+        
+     def stored_details(self, user):
+        """Re-read a user's details before creating them, since a cached resolve may predate another worker's write"""
+        return UserDetail.query.filter_by(user_id=user.id).first() or UserDetail(user=user)
         
-     def handle_match_request(self, user, message):
+     @command('match', parse_match)
+     def handle_match_request(self, user, match_query):
         """Handle match request: match#age#town"""
         try:
-            parts = message.split('#')
-            if len(parts) != 3:
-                return SMS_MESSAGES['MATCH_INVALID_FORMAT']
-            
-            _, age_part, town = parts
-    
-            if '-' in age_part:
-                age_start, age_end = map(int, age_part.split('-'))
-            else:
-                age_start = age_end = int(age_part)
+            age_start, age_end = match_query.age_start, match_query.age_end
+            town = self.match_town(user, match_query.town)
             
-            matches = self.find_matches(user, age_start, age_end, town.title())
+            matches = self.find_matches(user, age_start, age_end, town)
             
-            if not matches:
-                return SMS_MESSAGES['MATCH_NO_RESULTS'].format(town=town.title())
-            
-            # Create match request
-            match_request = MatchRequest(
-                user_id=user.id,
-                age_range_start=age_start,
-                age_range_end=age_end,
-                town=town.title(),
-                total_matches=len(matches)
-            )
-            
-            db.session.add(match_request)
-            db.session.commit()
-            
-            # Store matches
-            for i, match_user in enumerate(matches):
-                profile_match = ProfileMatch(
-                    match_request_id=match_request.match_request_id,
-                    matched_user_id=match_user.id,
-                    position=i
+            if app.config['MATCH_MODE'] == 'lazy':
+                total_matches, first_batch = self.store_lazy_matches(
+                    user, matches, age_start, age_end, town
+                )
+            else:
+                total_matches, first_batch = self.store_eager_matches(
+                    user, self.rank_matches(user, matches, age_start, age_end, town), age_start, age_end, town
                 )
-                db.session.add(profile_match)
             
-            db.session.commit()
+            if not total_matches:
+                return render('MATCH_NO_RESULTS', town=town)
             
             # Send first batch
-            gender_term = "gentlemen" if user.gender == "female" else "ladies"
-            response = SMS_MESSAGES['MATCH_SUCCESS'].format(
-                count=len(matches),
-                gender_term=gender_term
-            ) + "\n\n"
-            
-            first_batch = matches[:3]
-            for match_user in first_batch:
-                response += f"{match_user.name} aged {match_user.age}, {match_user.phone_number}. "
-            
-            remaining = len(matches) - 3
-            if remaining > 0:
-                response += "\n\n" + SMS_MESSAGES['MATCH_NEXT_PROMPT'].format(
-                    remaining=remaining,
-                    gender_term=gender_term
-                )
-            
-            return response
+            gender_term = render('GENDER_TERM_MEN' if user.gender == "female" else 'GENDER_TERM_WOMEN')
+            return self.match_page(
+                [render('MATCH_SUCCESS', count=total_matches, gender_term=gender_term)],
+                first_batch, total_matches - 3, gender_term
+            )
             
-        except ValueError:
-            return SMS_MESSAGES['MATCH_INVALID_AGE_FORMAT']
         except Exception as e:
-            return SMS_MESSAGES['MATCH_FAILED'].format(error=str(e))
+            self.discard()
+            return render('MATCH_FAILED', error=str(e))
     
-     def find_matches(self, user, age_start, age_end, town):
-        """Find potential matches based on criteria"""
-        opposite_gender = 'female' if user.gender == 'male' else 'male'
+     def match_page(self, parts, page, remaining, gender_term):
+        """Join a page of matches, and the NEXT prompt while matches remain, onto the reply parts"""
+        parts.append(' '.join([
+            render('MATCH_PROFILE', name=match_user.name, age=match_user.age, phone=match_user.phone_number)
+            for match_user in page
+        ]))
+        if remaining > 0:
+            parts.append(render('MATCH_NEXT_PROMPT', remaining=remaining, gender_term=gender_term))
+        return '\n\n'.join(parts)
+    
+     def rank_matches(self, user, matches, age_start, age_end, town):
+        """Return the ids of a match query, best ranked first when ranking is enabled"""
+        rows = self.candidate_rows(user, matches, age_start, age_end, town)
+        if not app.config['MATCH_RANKING_ENABLED']:
+            return [row[0] for row in rows]
+        return ranker.rank(user.details, rows)
+    
+     def candidate_rows(self, user, matches, age_start, age_end, town):
+        """Ranking columns of every match in (age, id) order, shared through the match cache"""
+        rows = matches.outerjoin(UserDetail).with_entities(
+            User.id, User.age, User.registration_level, User.updated_at,
+            UserDetail.education_level, UserDetail.religion, UserDetail.marital_status, UserDetail.ethnicity
+        )
+        
+        def load():
+            return [tuple(row) for row in db.session().gather(rows.statement, key=lambda row: (row.age, row.id))]
+        
+        if not app.config['MATCH_CACHE_ENABLED']:
+            return load()
+        return match_cache.get_or_load(self.opposite_gender(user), town, age_start, age_end, load)
+    
+     def store_eager_matches(self, user, match_ids, age_start, age_end, town):
+        """Store every match as a ProfileMatch row in ranked order and return the count and first batch"""
+        if not match_ids:
+            return 0, []
+        
+        # Create match request; the first page goes out with this reply, so NEXT starts after it
+        match_request = MatchRequest(
+            user_id=user.id,
+            age_range_start=age_start,
+            age_range_end=age_end,
+            town=town,
+            total_matches=len(match_ids),
+            current_offset=0,
+            matches_per_page=3
+        )
+        match_request.advance_pagination()
         
-        matches = User.query.filter(
-            User.gender == opposite_gender,
+        self.supersede_match_requests(user)
+        db.session.add(match_request)
+        self.flush()
+        
+        # Store matches in one executemany; position is the rank
+        rows = [
+            dict(match_request_id=match_request.match_request_id, matched_user_id=match_id, position=i)
+            for i, match_id in enumerate(match_ids)
+        ]
+        db.session().bulk_insert(ProfileMatch, rows)
+        
+        return len(match_ids), load_users(match_ids[:3])
+    
+     def store_lazy_matches(self, user, matches, age_start, age_end, town):
+        """Store only the match criteria and return the count and first batch"""
+        # NEXT pages are read on demand from the criteria and the cursor
+        match_request = MatchRequest(
+            user_id=user.id,
+            mode='lazy',
+            matched_gender=self.opposite_gender(user),
+            age_range_start=age_start,
+            age_range_end=age_end,
+            town=town,
+            current_offset=0,
+            matches_per_page=3
+        )
+        
+        if app.config['MATCH_INDEX_ENABLED']:
+            match_request.total_matches = match_index.count(
+                match_request.matched_gender, town, age_start, age_end
+            )
+        else:
+            # One count per shard when sharded
+            match_request.total_matches = sum(
+                count for count, in db.session().gather(select(func.count()).select_from(matches.subquery()))
+            )
+        
+        first_batch = self.lazy_page(match_request) if match_request.total_matches else []
+        if not first_batch:
+            return 0, []
+        
+        match_request.advance_pagination(first_batch[-1])
+        
+        self.supersede_match_requests(user)
+        db.session.add(match_request)
+        self.flush()
+        
+        return match_request.total_matches, first_batch
+    
+     def supersede_match_requests(self, user):
+        """Deactivate the user's earlier match requests; NEXT only pages the newest one"""
+        MatchRequest.query.filter_by(user_id=user.id, is_active=True).update({'is_active': False})
+    
+     def lazy_page(self, match_request):
+        """Read the page after a lazy match request's cursor, from the match index or SQL"""
+        if not app.config['MATCH_INDEX_ENABLED']:
+            # Sharded, each shard returns its own first page; keep the first page overall
+            page = match_request.next_page().all()
+            return sorted(page, key=lambda user: (user.age, user.id))[:match_request.matches_per_page]
+        
+        criteria = (
+            match_request.matched_gender, match_request.town,
+            match_request.age_range_start, match_request.age_range_end
+        )
+        match_index.maybe_verify(*criteria)
+        
+        cursor = None
+        if match_request.cursor_user_id is not None:
+            cursor = (match_request.cursor_age, match_request.cursor_user_id)
+        return load_users(match_index.page(*criteria, after=cursor, limit=match_request.matches_per_page))
+    
+     def match_town(self, user, text):
+        """Town to match in: a known name, the spelling as registered if anyone used it, else a fuzzy guess"""
+        typed = normalize_town(text, fuzzy=False)
+        if towns.lookup(text, fuzzy=False):
+            return typed
+        # Registration stores an unknown town as typed, so users who typed the same must still be found
+        registered = User.query.with_entities(User.id).filter(
+            User.gender == self.opposite_gender(user),
+            User.town == typed
+        ).first()
+        return typed if registered else normalize_town(text)
+        
+     def opposite_gender(self, user):
+        """Gender a user is matched against"""
+        return 'female' if user.gender == 'male' else 'male'
+    
+     def find_matches(self, user, age_start, age_end, town):
+        """Find potential matches based on criteria, in stable (age, id) order"""
+        return User.query.filter(
+            User.gender == self.opposite_gender(user),
             User.age >= age_start,
             User.age <= age_end,
             User.town == town,
             User.id != user.id
-        ).all()
-        
-        return matches
-     def handle_next_matches(self, user):
+        ).order_by(User.age, User.id)
+    
+     @command('next', parse_next, prefix=True)
+     def handle_next_matches(self, user, next_page):
         """Handle NEXT command to get more matches"""
         try:
             # Get active match requests
@@ -286,125 +420,386 @@ class SMSProcessor(Resource):
             ).order_by(MatchRequest.created_at.desc()).first()
             
             if not match_request:
-                return SMS_MESSAGES['NEXT_NO_ACTIVE_REQUEST']
+                return render('NEXT_NO_ACTIVE_REQUEST')
             
             if not match_request.has_more_matches():
-                return SMS_MESSAGES['NEXT_NO_MORE_MATCHES']
+                return render('NEXT_NO_MORE_MATCHES')
             
-            # Get next batch of matches
-            next_matches = ProfileMatch.query.filter_by(
-                match_request_id=match_request.match_request_id
-            ).offset(match_request.current_offset).limit(3).all()
+            if match_request.mode == 'lazy':
+                next_matches = self.lazy_page(match_request)
+            else:
+                # Seek to the next batch of matches, loading the matched users with them
+                next_matches = [match.matched_user for match in ProfileMatch.query.options(
+                    db.session().load_related(ProfileMatch.matched_user)
+                ).filter(
+                    ProfileMatch.match_request_id == match_request.match_request_id,
+                    ProfileMatch.position >= match_request.current_offset
+                ).order_by(ProfileMatch.position).limit(match_request.matches_per_page)]
             
             if not next_matches:
-                return SMS_MESSAGES['NEXT_NO_MORE_MATCHES']
-            
-            response = ""
-            for match in next_matches:
-                response += f"{match.matched_user.name} aged {match.matched_user.age}, {match.matched_user.phone_number}. "
+                return render('NEXT_NO_MORE_MATCHES')
             
             # Updates pagination
-            match_request.advance_pagination()
-            
-            remaining = match_request.total_matches - match_request.current_offset
-            if remaining > 0:
-                gender_term = "gentlemen" if user.gender == "female" else "ladies"
-                response += "\n\n" + SMS_MESSAGES['MATCH_NEXT_PROMPT'].format(
-                    remaining=remaining,
-                    gender_term=gender_term
-                )
+            match_request.advance_pagination(next_matches[-1])
+            self.flush()
             
-            return response
+            gender_term = render('GENDER_TERM_MEN' if user.gender == "female" else 'GENDER_TERM_WOMEN')
+            return self.match_page(
+                [], next_matches, match_request.total_matches - match_request.current_offset, gender_term
+            )
             
         except Exception as e:
-            return SMS_MESSAGES['NEXT_FAILED'].format(error=str(e))
+            self.discard()
+            return render('NEXT_FAILED', error=str(e))
         
-     def handle_profile_request(self, user, phone_number):
+     @command(PHONE, parse_profile_lookup, label='profile')
+     def handle_profile_request(self, user, profile_lookup):
         """Handle profile request when user sends a phone number"""
         try:
-            requested_user = User.query.filter_by(phone_number=phone_number).first()
-            
-            if not requested_user:
-                return "Profile not found. Please check the phone number."
-            
-            # Get user details and notify the requested person
-            details = UserDetail.query.filter_by(user_id=requested_user.id).first()
-            
-            response = f"{requested_user.name} aged {requested_user.age}, {requested_user.county} County, {requested_user.town} town"
+            view = self.profile_view(
+                profile_lookup.phone_number, 'profile',
+                lambda requested_user: self.profile_details(requested_user, 'PROFILE_DETAILS', 'PROFILE_BASIC')
+            )
             
-            if details:
-                response += f", {details.education_level or 'N/A'}, {details.profession or 'N/A'}, {details.marital_status or 'N/A'}, {details.religion or 'N/A'}, {details.ethnicity or 'N/A'}"
+            if not view:
+                return render('PROFILE_NOT_FOUND')
             
-            response += f". Send DESCRIBE {phone_number} to get more details about {requested_user.name}."
+            # Send the user's details and notify the requested person
+            response, requested_user = view
             
             self.notify_interest(requested_user, user)
             
             return response
             
         except Exception as e:
-            return f"Failed to get profile: {str(e)}"
+            self.discard()
+            return render('PROFILE_FAILED', error=str(e))
+    
+     def profile_view(self, phone_number, view, build):
+        """(reply, requested user) for a profile view, reusing a cached reply; None if nobody has the number.
+
+        On a hit the requested user is the cached Subject, which has what notify_interest needs.
+        """
+        if app.config['PROFILE_CACHE_ENABLED']:
+            cached = profile_cache.get(phone_number, view)
+            if cached is not None:
+                return cached
         
-     def handle_describe_request(self, user, message):
+        requested_user = user_resolver.resolve(phone_number)
+        if not requested_user:
+            return None
+        
+        response = build(requested_user)
+        if app.config['PROFILE_CACHE_ENABLED']:
+            return response, profile_cache.set(phone_number, view, response, requested_user)
+        return response, requested_user
+    
+     def profile_details(self, profile_user, template, basic_template=None):
+        """Render a user's profile, with basic_template when given and the user has no details"""
+        details = profile_user.details
+        if not details and basic_template:
+            template = basic_template
+        not_given = render('PROFILE_NOT_GIVEN')
+        return render(
+            template,
+            name=profile_user.name,
+            age=profile_user.age,
+            county=profile_user.county,
+            town=profile_user.town,
+            education=details and details.education_level or not_given,
+            profession=details and details.profession or not_given,
+            marital=details and details.marital_status or not_given,
+            religion=details and details.religion or not_given,
+            ethnicity=details and details.ethnicity or not_given,
+            phone=profile_user.phone_number
+        )
+        
+     @command('describe', parse_describe)
+     def handle_describe_request(self, user, describe):
         """Handle DESCRIBE phone_number request"""
         try:
-            parts = message.split()
-            if len(parts) != 2:
-                return "Invalid format. Use: DESCRIBE phone_number"
+            view = self.profile_view(describe.phone_number, 'describe', self.description)
             
-            phone_number = parts[1]
-            requested_user = User.query.filter_by(phone_number=phone_number).first()
+            if not view:
+                return render('DESCRIBE_NOT_FOUND')
             
-            if not requested_user:
-                return "Profile not found."
+            return view[0]
             
-            details = UserDetail.query.filter_by(user_id=requested_user.id).first()
+        except Exception as e:
+            self.discard()
+            return render('DESCRIBE_FAILED', error=str(e))
+        
+     def description(self, requested_user):
+        """Render a user's self description, or that they have not given one"""
+        details = requested_user.details
+        
+        if not details or not details.self_description:
+            return render('DESCRIBE_NO_DESCRIPTION', name=requested_user.name)
+        
+        pronoun = render('PRONOUN_HIMSELF' if requested_user.gender == "male" else 'PRONOUN_HERSELF')
+        
+        return render('DESCRIBE_SUCCESS', name=requested_user.name, pronoun=pronoun,
+                      description=details.self_description)
+        
+     @command('yes', parse_confirmation, prefix=True)
+     def handle_interest_confirmation(self, user, confirmation):
+        """Handle YES reply: confirm the latest pending interest and send the interested user's profile"""
+        try:
+            interest, interested_user = self.pending_interest(user)
+            if not interest:
+                return render('INTEREST_NO_NOTIFICATIONS')
             
-            if not details or not details.self_description:
-                return f"{requested_user.name} has not provided a self description yet."
+            # One YES per notification: each confirms the interest it answers, by primary key
+            interest.status = 'confirmed'
+            self.flush()
             
-            pronoun = "himself" if requested_user.gender == "male" else "herself"
-        
-            return f"{requested_user.name} describes {pronoun} as {details.self_description}"
+            return self.profile_details(interested_user, 'INTEREST_CONFIRMATION_SUCCESS')
             
         except Exception as e:
-            return f"Failed to get description: {str(e)}"
+            self.discard()
+            return render('INTEREST_CONFIRMATION_FAILED', error=str(e))
+        
+     def pending_interest(self, user):
+        """(latest pending interest in user, the interested user with details), or (None, None)"""
+        pending = Interest.query.filter(
+            Interest.requested_id == user.id,
+            Interest.status == 'pending'
+        ).order_by(Interest.created_at.desc(), Interest.id.desc())
+        
+        # One query down the (requested_id, status, created_at, id) index, with the requester loaded alongside
+        interest = pending.options(
+            db.session().load_related(Interest.requester).joinedload(User.details)
+        ).first()
+        return interest, interest and interest.requester
+        
+     @command('language', parse_language)
+     @command('lugha', parse_language, label='language')
+     def handle_language(self, user, choice):
+        """Handle language#code (or lugha#code): reply in that language from now on"""
+        if choice.language not in locales.languages:
+            return render('LANGUAGE_UNSUPPORTED', language=choice.language, languages=', '.join(locales.languages))
+        
+        user.language = choice.language
+        self.flush()
+        
+        with speaking(user.language):
+            return render('LANGUAGE_CHANGED')
         
      def notify_interest(self, requested_user, interested_user):
-        """Notify user that someone is interested"""
-        gender = 'man' if interested_user.gender == 'male' else 'woman'
-        pronoun_subject = 'he' if interested_user.gender == 'male' else 'she'
-        pronoun_object = 'him' if interested_user.gender == 'male' else 'her'
-
-        message = SMS_MESSAGES['INTEREST_NOTIFICATION'].format(
-            name=requested_user.name,
-            gender=gender,
-            interested_name=interested_user.name,
-            phone_number=interested_user.phone_number,
-            pronoun_subject=pronoun_subject,
-            age=interested_user.age,
-            county=interested_user.county,
-            pronoun_object=pronoun_object
-        )
+        """Notify user that someone is interested, in the notified user's language"""
+        male = interested_user.gender == 'male'
+        with speaking(requested_user.language):
+            message = reply(render(
+                'INTEREST_NOTIFICATION',
+                name=requested_user.name,
+                gender=render('GENDER_MAN' if male else 'GENDER_WOMAN'),
+                interested_name=interested_user.name,
+                phone_number=interested_user.phone_number,
+                pronoun_subject=render('PRONOUN_HE' if male else 'PRONOUN_SHE'),
+                age=interested_user.age,
+                county=interested_user.county,
+                pronoun_object=render('PRONOUN_HIM' if male else 'PRONOUN_HER')
+            ))
 
-        notification = Message(
-            sender_id=0,
+        notification = dict(
+            sender_id=interested_user.id,
             recipient_id=requested_user.id,
             phone_number=requested_user.phone_number,
             content=message
         )
 
-        db.session.add(notification)
-        db.session.commit()
+        # The interest is written with the SMS, so a YES right after the notification finds it
+        db.session.add(Interest(requester_id=interested_user.id, requested_id=requested_user.id))
+
+        # The outbox writes and sends the message in the background once this transaction commits
+        if app.config['OUTBOX_ENABLED']:
+            outbox.stage(notification)
+        else:
+            db.session.add(Message(**notification))
+        self.flush()
+
+
+class SMSBatchProcessor(SMSProcessor):
+    def post(self):
+        """Process a JSON array of {from, text, id} messages, replying per message in order.
+
+        Senders are resolved with one IN query and messages run grouped by command,
+        in registry order, which is the order of a conversation. Each message runs in
+        its own savepoint so a failure rolls back only that message, and the batch
+        commits every SMS_BATCH_COMMIT_SIZE messages.
+        """
+        data = request.get_json()
+        if not isinstance(data, list):
+            return {"status": "error", "message": "Expected a JSON array of messages"}, 400
+        if len(data) > app.config['SMS_BATCH_MAX_SIZE']:
+            return {"status": "error", "message": "Too many messages in batch"}, 413
+
+        messages = [
+            (item.get("from"), item.get("text"), item.get("id")) if isinstance(item, dict) else (None, None, None)
+            for item in data
+        ]
+        user_resolver.resolve_many({phone_number for phone_number, text, message_id in messages if phone_number})
+
+        order = {name: position for position, name in enumerate(COMMANDS)}
+        grouped = sorted(
+            range(len(messages)),
+            key=lambda i: order.get(self.command_name(messages[i][1]), len(order))
+        )
+
+        results = [None] * len(messages)
+        pending = 0
+        self.batching = True
+        try:
+            for i in grouped:
+                try:
+                    with db.session.begin_nested():
+                        body, status = self.process(*messages[i])
+                except Exception as e:
+                    body, status = {"status": "error", "message": str(e)}, 500
+                results[i] = dict(body, code=status)
+
+                pending += 1
+                if pending >= app.config['SMS_BATCH_COMMIT_SIZE']:
+                    db.session.commit()
+                    pending = 0
+
+            db.session.commit()
+        finally:
+            self.batching = False
+
+        return {"status": "success", "results": results}, 200
+
+    def command_name(self, message):
+        entry = isinstance(message, str) and lookup(message.strip().lower())
+        return entry.name if entry else None
+
 
 api.add_resource(SMSProcessor, '/sms')
+api.add_resource(SMSBatchProcessor, '/sms/batch')
 
 @app.route('/')
 def index():
     return '<h1>Project Server</h1>'
 
 
+@app.route('/metrics')
+def prometheus_metrics():
+    return metrics.render(), 200, {'Content-Type': 'text/plain; version=0.0.4'}
+
+
+@metrics.register_collector
+def outbox_metrics():
+    stats = outbox.stats()
+    return (
+        family('penzi_outbox_depth', 'gauge', 'Notifications waiting in the outbox', [({}, stats['depth'])])
+        + family('penzi_outbox_notifications_total', 'counter', 'Outbox notifications, by outcome', [
+            ({'outcome': outcome}, stats[outcome]) for outcome in ('enqueued', 'rejected', 'flushed', 'failed')
+        ])
+        + family('penzi_outbox_retries_total', 'counter', 'Outbox write and send retries', [({}, stats['retries'])])
+        + family('penzi_outbox_flush_seconds_total', 'counter', 'Time spent flushing outbox batches',
+                 [({}, stats['flush_seconds_total'])])
+        + family('penzi_outbox_flushes_total', 'counter', 'Outbox batches flushed', [({}, stats['batches'])])
+    )
+
+
+@metrics.register_collector
+def dedup_metrics():
+    return family('penzi_sms_dedup_total', 'counter', 'SMS with a message id, by whether it was new or a retry', [
+        ({'result': result}, count) for result, count in dedup.stats().items()
+    ])
+
+
+@metrics.register_collector
+def rate_limit_metrics():
+    stats = rate_limiter.stats()
+    return family('penzi_sms_throttled_total', 'counter', 'SMS rejected by the per-sender rate limiter, by command', [
+        ({'command': COMMANDS[name].label}, count) for name, count in sorted(stats['throttled'].items())
+    ])
+
+
+@metrics.register_collector
+def locale_metrics():
+    return family('penzi_locale_missing_templates', 'gauge', 'Templates a language falls back to the default language for', [
+        ({'language': language}, len(keys)) for language, keys in locales.missing.items()
+    ])
+
+
+@metrics.register_collector
+def match_index_metrics():
+    stats = match_index.stats()
+    return (
+        family('penzi_match_index_users', 'gauge', 'Users held in the match index', [({}, stats['users'])])
+        + family('penzi_match_index_verifications_total', 'counter', 'Match index queries checked against SQL, by result', [
+            ({'result': 'agree'}, stats['verified'] - stats['mismatches']),
+            ({'result': 'mismatch'}, stats['mismatches'])
+        ])
+    )
+
+
+@metrics.register_collector
+def match_cache_metrics():
+    stats = match_cache.stats()
+    return (
+        family('penzi_match_cache_requests_total', 'counter', 'Match result cache lookups, by result', [
+            ({'result': 'hit'}, stats['hits']), ({'result': 'miss'}, stats['misses'])
+        ])
+        + family('penzi_match_cache_hit_ratio', 'gauge', 'Share of match result cache lookups that hit',
+                 [({}, stats['hit_ratio'])])
+        + family('penzi_match_cache_invalidations_total', 'counter', 'Match result cache buckets invalidated by writes',
+                 [({}, stats['invalidations'])])
+    )
+
+
+@metrics.register_collector
+def profile_cache_metrics():
+    stats = profile_cache.stats()
+    return (
+        family('penzi_profile_cache_entries', 'gauge', 'Rendered profile replies held in the profile cache',
+               [({}, stats['size'])])
+        + family('penzi_profile_cache_bytes', 'gauge', 'Approximate memory held by the profile cache',
+                 [({}, stats['weight'])])
+        + family('penzi_profile_cache_requests_total', 'counter', 'Profile cache lookups, by result', [
+            ({'result': 'hit'}, stats['hits']), ({'result': 'miss'}, stats['misses'])
+        ])
+        + family('penzi_profile_cache_hit_ratio', 'gauge', 'Share of profile cache lookups that hit',
+                 [({}, stats['hit_ratio'])])
+        + family('penzi_profile_cache_invalidations_total', 'counter', 'Profile cache users invalidated by writes',
+                 [({}, stats['invalidations'])])
+    )
+
+
+@metrics.register_collector
+def compaction_metrics():
+    stats = compactor.stats()
+    return (
+        family('penzi_compaction_rows_total', 'counter', 'Rows handled by compaction, by step', [
+            ({'step': step}, count) for step, count in stats['rows'].items()
+        ])
+        + family('penzi_compaction_batches_total', 'counter', 'Compaction batches committed', [({}, stats['batches'])])
+        + family('penzi_compaction_seconds_total', 'counter', 'Time spent in compaction passes',
+                 [({}, stats['seconds_total'])])
+        + family('penzi_compaction_last_run_timestamp_seconds', 'gauge', 'When the last compaction pass finished',
+                 [({}, stats['last_run'] or 0)])
+    )
+
+
+@metrics.register_collector
+def user_cache_metrics():
+    stats = user_resolver.cache.stats()
+    return (
+        family('penzi_user_cache_size', 'gauge', 'Users held in the resolution cache', [({}, stats['size'])])
+        + family('penzi_user_cache_requests_total', 'counter', 'User resolution cache lookups, by result', [
+            ({'result': 'hit'}, stats['hits']), ({'result': 'miss'}, stats['misses'])
+        ])
+    )
+
+
 if __name__ == '__main__':
     with app.app_context():
-        db.create_all()
+        db.session().create_all(db.metadata)
         print("Tables created successfully")
+        if app.config['MATCH_INDEX_ENABLED']:
+            match_index.build()
+    if app.config['COMPACTION_ENABLED']:
+        compactor.start()
     app.run(port=5555, debug=True)
\ No newline at end of file
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+
+# Standard library imports
+import asyncio
+import json
+from functools import partial
+
+# Remote library imports
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import Session
+from sqlalchemy.util import await_only
+
+# Local imports
+from app import SMSProcessor
+from compaction import compactor
+from config import app, db, engine_options, sqlite_pragma_listener
+from sharding import SingleDatabase
+
+# Sync backend name -> async driver used for the same database
+ASYNC_DRIVERS = {
+    'sqlite': 'sqlite+aiosqlite',
+    'postgresql': 'postgresql+asyncpg',
+}
+
+
+def async_database_url():
+    """The configured database URL with its async driver, unless ASYNC_DATABASE_URI is set"""
+    if app.config['ASYNC_DATABASE_URI']:
+        return app.config['ASYNC_DATABASE_URI']
+    with app.app_context():
+        url = db.engine.url
+    return url.set(drivername=ASYNC_DRIVERS.get(url.get_backend_name(), url.drivername))
+
+
+def make_async_engine():
+    if app.config['SHARDS']:
+        raise RuntimeError('The ASGI webhook does not support SHARDS; serve sharded deployments with app.py')
+    engine = create_async_engine(async_database_url(), **engine_options(app.config))
+    if app.config['DB_PROFILE'] == 'production' and engine.dialect.name == 'sqlite':
+        event.listen(engine.sync_engine, 'connect', sqlite_pragma_listener(app.config['SQLITE_PRAGMAS']))
+    return engine
+
+
+def offload(call, *args):
+    """Run a blocking call in the default executor, yielding to the event loop until it returns"""
+    return await_only(asyncio.get_running_loop().run_in_executor(None, partial(call, *args)))
+
+
+class WebhookSession(SingleDatabase, Session):
+    """Sync facade of the webhook's AsyncSession, with the helpers handlers use on db.session()"""
+
+
+class SMSWebhook:
+    """ASGI application serving the /sms webhook on an async database driver.
+
+    Each callback runs the unchanged SMSProcessor command logic through
+    AsyncSession.run_sync: the handlers' ORM calls go through the async driver
+    and yield to the event loop while waiting on the database, so one process
+    keeps many gateway callbacks in flight. Calls that block outside the
+    database, such as Redis round trips and a full outbox, run in threads.
+    """
+
+    def __init__(self):
+        self.engine = None
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self.lifespan(receive, send)
+            return
+        if scope['type'] != 'http':
+            return
+
+        if scope['path'] != '/sms':
+            await respond(send, 404, {"status": "error", "message": "Not found"})
+            return
+        if scope['method'] != 'POST':
+            await respond(send, 405, {"status": "error", "message": "Method not allowed"})
+            return
+
+        try:
+            data = json.loads(await read_body(receive))
+        except ValueError:
+            data = None
+        if not isinstance(data, dict):
+            await respond(send, 400, {"status": "error", "message": "Expected a JSON object"})
+            return
+
+        body, status = await self.process(data.get("from"), data.get("text"), data.get("id"))
+        await respond(send, status, body)
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                self.start()
+                if app.config['COMPACTION_ENABLED']:
+                    compactor.start()
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                compactor.stop()
+                if self.engine is not None:
+                    await self.engine.dispose()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    def start(self):
+        if self.engine is None:
+            self.engine = make_async_engine()
+
+    async def process(self, phone_number, message, message_id=None):
+        self.start()
+        async with AsyncSession(self.engine, sync_session_class=WebhookSession) as session:
+            return await session.run_sync(self.run_processor, phone_number, message, message_id)
+
+    def run_processor(self, session, phone_number, message, message_id=None):
+        """Run SMSProcessor with db.session bound to the async session's sync facade"""
+        with app.app_context():
+            db.session.registry.set(session)
+            session.info['offload'] = offload
+            return SMSProcessor().process(phone_number, message, message_id)
+
+
+async def read_body(receive):
+    chunks = []
+    while True:
+        message = await receive()
+        chunks.append(message.get('body', b''))
+        if not message.get('more_body'):
+            return b''.join(chunks)
+
+
+async def respond(send, status, body):
+    payload = json.dumps(body).encode()
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [(b'content-type', b'application/json'), (b'content-length', str(len(payload)).encode())],
+    })
+    await send({'type': 'http.response.body', 'body': payload})
+
+
+application = SMSWebhook()
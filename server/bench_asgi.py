@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+
+# Standard library imports
+import argparse
+import asyncio
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from random import Random
+
+# Local imports
+from app import app
+from asgi import SMSWebhook
+from models import db, User
+from seed import seed_users
+
+
+def workload(requests, seed=None):
+    """A read-heavy mix of match, NEXT, profile and DESCRIBE messages from seeded users"""
+    rng = Random(seed)
+    with app.app_context():
+        users = User.query.with_entities(User.phone_number, User.town).limit(5000).all()
+
+    messages = []
+    for _ in range(requests):
+        sender, town = rng.choice(users)
+        requested, _ = rng.choice(users)
+        age = rng.randint(18, 40)
+        messages.append((sender, rng.choice([
+            f'match#{age}-{age + 5}#{town}',
+            'next',
+            requested,
+            f'describe {requested}',
+        ])))
+    return messages
+
+
+def run_wsgi(messages, concurrency):
+    def post(item):
+        sender, text = item
+        return app.test_client().post('/sms', json={'from': sender, 'text': text}).status_code
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(post, messages))
+    return time.perf_counter() - start
+
+
+def run_asgi(messages, concurrency):
+    webhook = SMSWebhook()
+
+    async def post(limit, sender, text):
+        body = json.dumps({'from': sender, 'text': text}).encode()
+        received = [{'type': 'http.request', 'body': body, 'more_body': False}]
+        sent = []
+
+        async def receive():
+            return received.pop()
+
+        async def send(message):
+            sent.append(message)
+
+        async with limit:
+            await webhook({'type': 'http', 'path': '/sms', 'method': 'POST'}, receive, send)
+        return sent[0]['status']
+
+    async def main():
+        limit = asyncio.Semaphore(concurrency)
+        start = time.perf_counter()
+        await asyncio.gather(*(post(limit, sender, text) for sender, text in messages))
+        elapsed = time.perf_counter() - start
+        await webhook.engine.dispose()
+        return elapsed
+
+    return asyncio.run(main())
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compare /sms requests/sec on the WSGI and ASGI front ends')
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--seed-users', type=int, default=5000, help='seed users first if the database is empty')
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args()
+
+    with app.app_context():
+        db.create_all()
+        if not User.query.first():
+            seed_users(args.seed_users, seed=args.seed)
+
+    messages = workload(args.requests, seed=args.seed)
+    for name, run in (('wsgi', run_wsgi), ('asgi', run_asgi)):
+        elapsed = run(messages, args.concurrency)
+        print(f"{name}: {len(messages) / elapsed:,.1f} requests/sec "
+              f"({len(messages)} requests, concurrency {args.concurrency})")
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+
+# Standard library imports
+import argparse
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Remote library imports
+from sqlalchemy import create_engine, event, insert
+from sqlalchemy.exc import OperationalError
+
+# Local imports
+from config import app, db, engine_options, sqlite_pragma_listener
+from models import Message
+
+
+def make_engine(path, profile):
+    config = dict(app.config, DB_PROFILE=profile)
+    engine = create_engine(f'sqlite:///{path}', **engine_options(config))
+    if profile == 'production':
+        event.listen(engine, 'connect', sqlite_pragma_listener(config['SQLITE_PRAGMAS']))
+    return engine
+
+
+def writer(engine, commits):
+    """Commit one message insert per transaction, counting lock errors"""
+    locked = 0
+    for i in range(commits):
+        try:
+            with engine.begin() as connection:
+                connection.execute(insert(Message.__table__).values(
+                    sender_id=1, recipient_id=2, phone_number='0722010203', content=f'load {i}'
+                ))
+        except OperationalError:
+            locked += 1
+    return locked
+
+
+def run(profile, threads, commits):
+    with tempfile.TemporaryDirectory() as directory:
+        engine = make_engine(os.path.join(directory, 'load.db'), profile)
+        db.metadata.create_all(engine)
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            locked = sum(pool.map(lambda _: writer(engine, commits), range(threads)))
+        elapsed = time.perf_counter() - start
+
+        engine.dispose()
+    committed = threads * commits - locked
+    return committed, locked, elapsed
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compare SQLite commit throughput with and without the production profile')
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--commits', type=int, default=250, help='commits per thread')
+    args = parser.parse_args()
+
+    for profile in ('default', 'production'):
+        committed, locked, elapsed = run(profile, args.threads, args.commits)
+        print(f"{profile:>10}: {committed / elapsed:,.0f} commits/sec, {locked} locked errors ({elapsed:.2f}s)")
@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+
+# Standard library imports
+import argparse
+import time
+
+# Local imports
+import app  # registers the SMSProcessor commands
+from commands import lookup, ParseError
+
+SAMPLE_MESSAGES = [
+    'start#jane#25#female#nairobi#westlands',
+    'details#degree#teacher#single#christian#luhya',
+    'myself calm, funny and loves hiking',
+    'match#23-30#nairobi',
+    'next',
+    '0722010203',
+    'describe 0722010203',
+    'yes',
+    'match#abc#nairobi',
+    'hello there',
+]
+
+
+def dispatch(message):
+    """Dispatch and parse one message the way SMSProcessor.post does, without handlers"""
+    message = message.strip().lower()
+    entry = lookup(message)
+    if entry is None:
+        return None
+    try:
+        return entry.parse(message)
+    except ParseError as e:
+        return e.template
+
+
+def run(iterations):
+    messages = SAMPLE_MESSAGES * iterations
+    start = time.perf_counter()
+    for message in messages:
+        dispatch(message)
+    elapsed = time.perf_counter() - start
+    return len(messages), elapsed
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Micro-benchmark SMS command dispatch and parsing')
+    parser.add_argument('--iterations', type=int, default=100000)
+    args = parser.parse_args()
+
+    count, elapsed = run(args.iterations)
+    print(f"{count} messages in {elapsed:.3f}s: {count / elapsed:,.0f} messages/sec")
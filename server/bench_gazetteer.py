@@ -0,0 +1,35 @@
+#!/usr/bin/env python3
+
+# Standard library imports
+import argparse
+import time
+
+# Local imports
+from gazetteer import towns
+
+# Exact names, aliases, suffixed names, typos and unknown places, as typed in match# messages
+SAMPLE_TOWNS = [
+    'nairobi', 'westlands', 'nbi', 'msa', 'kisumu city', 'nairobi cbd', 'nyeri town',
+    'nakru', 'mombassa', 'eldorett', 'kitengala', 'rongai', 'athi-river', 'timbuktu',
+]
+
+
+def run(iterations, cached):
+    places = SAMPLE_TOWNS * iterations
+    start = time.perf_counter()
+    for place in places:
+        if not cached:
+            towns.cache.clear()
+        towns.lookup(place)
+    elapsed = time.perf_counter() - start
+    return len(places), elapsed
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Micro-benchmark town lookups per message')
+    parser.add_argument('--iterations', type=int, default=20000)
+    args = parser.parse_args()
+
+    for label, cached in (('uncached', False), ('cached', True)):
+        count, elapsed = run(args.iterations, cached)
+        print(f"{label}: {count} lookups in {elapsed:.3f}s, {elapsed / count * 1e6:.2f}us per lookup")
@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+
+# Standard library imports
+import argparse
+import time
+from datetime import datetime, timedelta
+from random import Random
+
+# Local imports
+from models import UserDetail
+from ranking import EDUCATION_LEVELS, MARITAL_SCORES, COMPLETENESS_SCORES, Ranker
+from seed import ETHNICITIES, RELIGIONS
+
+SIZES = [10, 100, 1000, 10000, 100000]
+
+
+def candidates(count, seed=None):
+    """Synthetic candidate rows shaped like SMSProcessor.rank_matches' query"""
+    rng = Random(seed)
+    now = datetime.now()
+    return [
+        (
+            user_id,
+            rng.randint(18, 60),
+            rng.choice(list(COMPLETENESS_SCORES)),
+            now - timedelta(days=rng.uniform(0, 365)),
+            rng.choice(EDUCATION_LEVELS + [None]),
+            rng.choice(list(RELIGIONS) + [None]),
+            rng.choice(list(MARITAL_SCORES) + [None]),
+            rng.choice(list(ETHNICITIES) + [None]),
+        )
+        for user_id in range(1, count + 1)
+    ]
+
+
+def run(ranker, detail, rows, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        ranker.rank(detail, rows)
+    return (time.perf_counter() - start) / repeat
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Micro-benchmark match ranking over candidate sets of increasing size')
+    parser.add_argument('--sizes', type=int, nargs='+', default=SIZES)
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args()
+
+    ranker = Ranker()
+    detail = UserDetail(education_level='Degree', religion='Christian', marital_status='single', ethnicity='Luhya')
+    for size in args.sizes:
+        rows = candidates(size, seed=args.seed)
+        elapsed = run(ranker, detail, rows, repeat=max(1, 100000 // size))
+        print(f"{size:>7} candidates: {elapsed * 1000:.3f}ms per ranking, {size / elapsed:,.0f} candidates/sec")
@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+
+# Standard library imports
+import argparse
+import os
+import re
+import subprocess
+import sys
+
+THROUGHPUT = re.compile(r'([\d,.]+) messages/sec')
+
+
+def run_loadtest(shards, args):
+    """Run loadtest.py in a fresh process over `shards` sqlite shards (0 for unsharded); return messages/sec"""
+    env = dict(os.environ)
+    if shards:
+        env['SHARDS'] = ','.join(f'sqlite:///bench_shard{shards}_{i}.db' for i in range(shards))
+        env['SHARD_MAP_FILE'] = f'bench_shard{shards}_map.json'
+    else:
+        env.pop('SHARDS', None)
+
+    command = [
+        sys.executable, 'loadtest.py', '--reset',
+        '--seed-users', str(args.seed_users),
+        '--conversations', str(args.conversations),
+        '--concurrency', str(args.concurrency),
+        '--seed', str(args.seed),
+    ]
+    output = subprocess.run(
+        command, env=env, cwd=os.path.dirname(os.path.abspath(__file__)),
+        capture_output=True, text=True, check=True
+    ).stdout
+    return float(THROUGHPUT.search(output).group(1).replace(',', ''))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compare loadtest throughput unsharded and over 1, 2 and 4 shards')
+    parser.add_argument('--shards', type=int, nargs='+', default=[0, 1, 2, 4], help='shard counts; 0 is unsharded')
+    parser.add_argument('--seed-users', type=int, default=20000)
+    parser.add_argument('--conversations', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    print(f"{'shards':>8} {'msg/s':>10}")
+    for shards in args.shards:
+        print(f"{shards or 'none':>8} {run_loadtest(shards, args):>10,.1f}")
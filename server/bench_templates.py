@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+
+# Standard library imports
+import argparse
+import time
+from types import SimpleNamespace
+
+# Local imports
+from config import SMS_MESSAGES
+from locales import SWAHILI
+from templates import LocaleCatalog, render, reply
+
+MATCHES = [
+    SimpleNamespace(name=f'Lady{i}', age=24 + i, phone_number=f'07000000{10 + i}')
+    for i in range(3)
+]
+PROFILE = dict(
+    name='Lady0', age=24, county='Nairobi', town='Westlands', education='Degree', profession='Doctor',
+    marital='single', religion='Christian', ethnicity='Luo', phone='0700000010'
+)
+
+
+def match_reply_format():
+    """The match reply as it was built before: str.format and += per match"""
+    response = SMS_MESSAGES['MATCH_SUCCESS'].format(count=8, gender_term='ladies') + "\n\n"
+    for match_user in MATCHES:
+        response += f"{match_user.name} aged {match_user.age}, {match_user.phone_number}. "
+    response += "\n\n" + SMS_MESSAGES['MATCH_NEXT_PROMPT'].format(remaining=5, gender_term='ladies')
+    return response
+
+
+def match_reply_compiled():
+    parts = [render('MATCH_SUCCESS', count=8, gender_term='ladies'), ' '.join([
+        render('MATCH_PROFILE', name=match_user.name, age=match_user.age, phone=match_user.phone_number)
+        for match_user in MATCHES
+    ]), render('MATCH_NEXT_PROMPT', remaining=5, gender_term='ladies')]
+    return '\n\n'.join(parts)
+
+
+def profile_reply_format():
+    return SMS_MESSAGES['PROFILE_DETAILS'].format(**PROFILE)
+
+
+def profile_reply_compiled():
+    return render('PROFILE_DETAILS', **PROFILE)
+
+
+def with_reply(build):
+    """A build followed by the segment limit every reply now goes through"""
+    return lambda: reply(build())
+
+
+def build_catalog(count):
+    """Seconds to compile English plus `count` copies of the Swahili catalog, as at startup"""
+    start = time.perf_counter()
+    LocaleCatalog('en', SMS_MESSAGES, {f'x{i}': SWAHILI for i in range(count)})
+    return time.perf_counter() - start
+
+
+def run(build, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        build()
+    return (time.perf_counter() - start) / iterations
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Micro-benchmark rendering the match and profile replies')
+    parser.add_argument('--iterations', type=int, default=200000)
+    parser.add_argument('--locales', type=int, default=50, help='languages in the catalog build timing')
+    args = parser.parse_args()
+
+    print(f"catalog of {args.locales + 1} languages built in {build_catalog(args.locales) * 1000:.1f}ms")
+
+    for label, build in (
+        ('match, format', match_reply_format),
+        ('match, compiled', match_reply_compiled),
+        ('match, + segments', with_reply(match_reply_compiled)),
+        ('profile, format', profile_reply_format),
+        ('profile, compiled', profile_reply_compiled),
+        ('profile, + segments', with_reply(profile_reply_compiled)),
+    ):
+        print(f"{label:>20}: {run(build, args.iterations) * 1e6:.2f}us per reply")
@@ -0,0 +1,312 @@
+#!/usr/bin/env python3
+
+# Standard library imports
+import argparse
+import csv
+import json
+import sys
+import time
+from contextlib import nullcontext
+
+# Remote library imports
+from sqlalchemy import Enum, String, select
+from sqlalchemy.exc import IntegrityError
+
+# Local imports
+from app import app
+from models import db, User, UserDetail
+from gazetteer import normalize_town, normalize_county
+from commit_hooks import UserWrite, users_written
+from templates import locales, render
+
+USER_FIELDS = ('phone_number', 'name', 'age', 'gender', 'county', 'town', 'language')
+DETAIL_FIELDS = ('education_level', 'profession', 'marital_status', 'religion', 'ethnicity')
+FIELDS = USER_FIELDS + DETAIL_FIELDS + ('self_description',)
+
+users, details = User.__table__, UserDetail.__table__
+# Longest value each free-text column takes; enum columns are checked against their choices instead
+LENGTHS = {
+    column.name: column.type.length for table in (users, details) for column in table.c
+    if isinstance(column.type, String) and not isinstance(column.type, Enum) and column.type.length
+}
+
+
+class RowError(Exception):
+    """A row that cannot be imported, with the reason"""
+
+
+def read_rows(stream, format):
+    """Yield (line number, row dict) from a CSV file with a header row or a JSON Lines file"""
+    if format == 'csv':
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row
+        return
+
+    for line_number, line in enumerate(stream, 1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as e:
+            yield line_number, RowError(f'invalid JSON: {e}')
+            continue
+        yield line_number, row if isinstance(row, dict) else RowError('expected a JSON object')
+
+
+def text(row, field):
+    """A stripped string field, None when blank, rejected when longer than its column"""
+    value = row.get(field)
+    if value is None:
+        return None
+    value = str(value).strip()
+    length = LENGTHS.get(field)
+    if length and len(value) > length:
+        raise RowError(f'{field} is longer than {length} characters')
+    return value or None
+
+
+def validate(row):
+    """(user row, detail row or None) for an import row, checked as the start#, details# and MYSELF handlers do"""
+    phone_number, name = text(row, 'phone_number'), text(row, 'name')
+    if not phone_number or not name:
+        raise RowError('phone_number and name are required')
+
+    try:
+        age = int(row.get('age'))
+    except (TypeError, ValueError):
+        raise RowError(render('REGISTRATION_INVALID_AGE_FORMAT'))
+    if age < 18 or age > 80:
+        raise RowError(render('REGISTRATION_INVALID_AGE'))
+
+    gender = (text(row, 'gender') or '').lower()
+    if gender not in ['male', 'female']:
+        raise RowError(render('REGISTRATION_INVALID_GENDER'))
+
+    language = (text(row, 'language') or locales.default_language).lower()
+    if language not in locales.languages:
+        raise RowError(render('LANGUAGE_UNSUPPORTED', language=language, languages=', '.join(locales.languages)))
+
+    county, town = text(row, 'county'), text(row, 'town')
+    if not county or not town:
+        raise RowError(render('REGISTRATION_INVALID_FORMAT'))
+
+    user = dict(
+        phone_number=phone_number,
+        name=name.title(),
+        age=age,
+        gender=gender,
+        county=normalize_county(county, fuzzy=False),
+        town=normalize_town(town, fuzzy=False),
+        language=language,
+        registration_level='basic',
+    )
+
+    values = {field: text(row, field) for field in DETAIL_FIELDS}
+    description = text(row, 'self_description')
+    if not any(values.values()):
+        if description:
+            raise RowError('self_description needs the details fields')
+        return user, None
+    if not all(values.values()):
+        raise RowError(render('DETAILS_INVALID_FORMAT'))
+
+    marital = values['marital_status'].lower()
+    if marital not in ['single', 'married', 'divorced']:
+        raise RowError(render('DETAILS_INVALID_MARITAL'))
+    if description is not None and len(description) < 10:
+        raise RowError(render('SELF_DESCRIPTION_TOO_SHORT'))
+
+    detail = dict(
+        education_level=values['education_level'].title(),
+        profession=values['profession'].title(),
+        marital_status=marital,
+        religion=values['religion'].title(),
+        ethnicity=values['ethnicity'].title(),
+        self_description=description,
+    )
+    user['registration_level'] = 'completed' if description else 'details'
+    return user, detail
+
+
+def insert_chunk(user_rows, detail_rows):
+    """Bulk insert user and detail row dicts, each user's rows on its shard, and clear the lists"""
+    db.session().bulk_insert(User, user_rows, 'id')
+    db.session().bulk_insert(UserDetail, detail_rows, 'user_id')
+    user_rows.clear()
+    detail_rows.clear()
+
+
+def stage_hooks(user_rows):
+    """Run the user write hooks for a chunk: the Core inserts skip the flush they listen on"""
+    users_written(db.session(), [
+        UserWrite(user['id'], user['phone_number'], user['gender'], user['town'], user['age']) for user in user_rows
+    ])
+
+
+def registered(phone_numbers):
+    """Those of phone_numbers that already belong to a user"""
+    statement = select(users.c.phone_number).where(users.c.phone_number.in_(phone_numbers))
+    return {phone_number for phone_number, in db.session().gather(statement)}
+
+
+class Importer:
+    """Validates import rows and writes them a chunk at a time, one transaction per chunk.
+
+    Each committed chunk runs the same cache invalidation and match index hooks
+    as a registration in this process. Other processes only see the new users
+    once their caches expire; a server with MATCH_INDEX_ENABLED must be
+    restarted, as its index is never reloaded.
+
+    Only the current chunk is held in memory. Phone numbers are checked against
+    the database once per chunk; rows of earlier chunks are committed by then,
+    so a phone number repeated anywhere in the file is caught too. Rejected rows
+    are passed to `report` with their line number and reason.
+    """
+
+    def __init__(self, report, chunk_size=1000):
+        self.report = report
+        self.chunk_size = chunk_size
+        self.imported = 0
+        self.rejected = 0
+        self.chunk = []
+
+    def add(self, line_number, row):
+        try:
+            if isinstance(row, RowError):
+                raise row
+            self.chunk.append((line_number, *validate(row)))
+        except RowError as e:
+            self.reject(line_number, e)
+        if len(self.chunk) >= self.chunk_size:
+            self.flush()
+
+    def reject(self, line_number, error):
+        self.rejected += 1
+        self.report(line_number, str(error))
+
+    def flush(self):
+        if not self.chunk:
+            return
+        taken = registered([user['phone_number'] for line_number, user, detail in self.chunk])
+        rows = []
+        for line_number, user, detail in self.chunk:
+            if user['phone_number'] in taken:
+                self.reject(line_number, f"phone number {user['phone_number']} is already registered")
+                continue
+            taken.add(user['phone_number'])
+            rows.append((line_number, user, detail))
+        self.chunk.clear()
+
+        try:
+            self.write(rows)
+        except IntegrityError:
+            # Someone registered one of these numbers since the check; find it a row at a time
+            db.session.rollback()
+            for row in rows:
+                try:
+                    self.write([row])
+                except IntegrityError as e:
+                    db.session.rollback()
+                    self.reject(row[0], e.orig)
+
+    def write(self, rows):
+        user_rows, detail_rows = [], []
+        user_ids = db.session().new_user_ids([user['phone_number'] for line_number, user, detail in rows])
+        for user_id, (line_number, user, detail) in zip(user_ids, rows):
+            user_rows.append({**user, 'id': user_id})
+            if detail:
+                detail_rows.append({**detail, 'user_id': user_id})
+        stage_hooks(user_rows)
+        insert_chunk(user_rows, detail_rows)
+        db.session.commit()
+        self.imported += len(rows)
+
+
+def import_users(stream, format, report, chunk_size=1000):
+    """Import every row of stream; return the Importer with its counts"""
+    importer = Importer(report, chunk_size)
+    for line_number, row in read_rows(stream, format):
+        importer.add(line_number, row)
+    importer.flush()
+    return importer
+
+
+def export_rows(chunk_size=1000):
+    """Yield a row dict per user, with their details, in id order, reading one keyset page at a time"""
+    columns = [users.c[field] for field in USER_FIELDS] + [details.c[field] for field in FIELDS[len(USER_FIELDS):]]
+    page = select(users.c.id, *columns).outerjoin(details, details.c.user_id == users.c.id).order_by(users.c.id)
+    last_id = 0
+    while True:
+        statement = page.where(users.c.id > last_id).limit(chunk_size)
+        # Sharded, each shard's next page is merged; only the first chunk_size rows are certain to be next
+        rows = db.session().gather(statement, key=lambda row: row.id)[:chunk_size]
+        if not rows:
+            return
+        for row in rows:
+            yield {field: value for field, value in zip(FIELDS, row[1:])}
+        last_id = rows[-1].id
+        db.session.rollback()
+
+
+def export_users(stream, format, chunk_size=1000):
+    """Write every user to stream; return how many were written"""
+    if format == 'csv':
+        writer = csv.DictWriter(stream, FIELDS)
+        writer.writeheader()
+        write = writer.writerow
+    else:
+        write = lambda row: stream.write(json.dumps(row, ensure_ascii=False) + '\n')
+
+    count = 0
+    for row in export_rows(chunk_size):
+        write(row)
+        count += 1
+    return count
+
+
+def file_format(path, format):
+    if format:
+        return format
+    if path.endswith('.csv'):
+        return 'csv'
+    if path.endswith(('.jsonl', '.ndjson')):
+        return 'jsonl'
+    raise SystemExit(f'cannot tell the format of {path}; pass --format csv or --format jsonl')
+
+
+def open_file(path, mode):
+    if path == '-':
+        return nullcontext(sys.stdin if mode == 'r' else sys.stdout)
+    return open(path, mode, newline='', encoding='utf-8')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Import users from or export them to CSV or JSON Lines')
+    parser.add_argument('action', choices=['import', 'export'])
+    parser.add_argument('path', help="file to read or write, '-' for stdin/stdout")
+    parser.add_argument('--format', choices=['csv', 'jsonl'], help='defaults to the file extension')
+    parser.add_argument('--chunk-size', type=int, default=1000, help='rows per insert and per transaction')
+    parser.add_argument('--errors', help='write rejected rows here instead of stderr')
+    args = parser.parse_args()
+    format = file_format(args.path, args.format)
+
+    with app.app_context():
+        start = time.perf_counter()
+        if args.action == 'export':
+            with open_file(args.path, 'w') as stream:
+                count = export_users(stream, format, args.chunk_size)
+            print(f'Exported {count} users in {time.perf_counter() - start:.1f}s', file=sys.stderr)
+        else:
+            with open_file(args.path, 'r') as stream, \
+                    open(args.errors, 'w', encoding='utf-8') if args.errors else nullcontext(sys.stderr) as errors:
+                importer = import_users(
+                    stream, format, lambda line_number, error: print(f'line {line_number}: {error}', file=errors),
+                    args.chunk_size
+                )
+            elapsed = time.perf_counter() - start
+            print(f'Imported {importer.imported} users, rejected {importer.rejected} rows '
+                  f'in {elapsed:.1f}s ({importer.imported / max(elapsed, 1e-9):.0f} users/s)', file=sys.stderr)
+            if importer.imported and app.config['MATCH_INDEX_ENABLED']:
+                print('Restart running servers: their match index does not include the imported users',
+                      file=sys.stderr)
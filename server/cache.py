@@ -0,0 +1,81 @@
+# Standard library imports
+import time
+from collections import OrderedDict
+from threading import Lock
+
+
+class LRUCache:
+    """Bounded, thread-safe least-recently-used cache with hit/miss counters.
+
+    With a `ttl` in seconds, entries older than that are treated as misses.
+    With a `weigh(key, value)` function, `maxsize` bounds the total weight of
+    the entries, such as their size in bytes, instead of their number.
+    """
+
+    def __init__(self, maxsize=1024, ttl=None, weigh=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.weigh = weigh
+        self.weight = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                value, expires, weight = self._entries[key]
+            except KeyError:
+                self.misses += 1
+                return default
+            if expires is not None and expires <= time.monotonic():
+                self._remove(key)
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        expires = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            self._store(key, value, expires)
+
+    def add(self, key, value):
+        """Set `key` only if it holds no live entry; return True when it was set"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and (entry[1] is None or entry[1] > now):
+                return False
+            self._store(key, value, now + self.ttl if self.ttl else None)
+            return True
+
+    def delete(self, key):
+        with self._lock:
+            self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.weight = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        return {'size': len(self._entries), 'weight': self.weight, 'hits': self.hits, 'misses': self.misses}
+
+    def _store(self, key, value, expires):
+        self._remove(key)
+        weight = self.weigh(key, value) if self.weigh else 1
+        self._entries[key] = value, expires, weight
+        self.weight += weight
+        while self.weight > self.maxsize:
+            self.weight -= self._entries.popitem(last=False)[1][2]
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.weight -= entry[2]
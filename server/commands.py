@@ -0,0 +1,210 @@
+# Standard library imports
+import re
+from dataclasses import dataclass
+
+
+class ParseError(Exception):
+    """Raised by a command parser with the SMS_MESSAGES key of the reply"""
+
+    def __init__(self, template):
+        super().__init__(template)
+        self.template = template
+
+
+@dataclass(frozen=True)
+class Registration:
+    name: str
+    age: int
+    gender: str
+    county: str
+    town: str
+
+
+@dataclass(frozen=True)
+class Details:
+    education: str
+    profession: str
+    marital: str
+    religion: str
+    ethnicity: str
+
+
+@dataclass(frozen=True)
+class SelfDescription:
+    description: str
+
+
+@dataclass(frozen=True)
+class MatchQuery:
+    age_start: int
+    age_end: int
+    town: str
+
+
+@dataclass(frozen=True)
+class NextPage:
+    pass
+
+
+@dataclass(frozen=True)
+class ProfileLookup:
+    phone_number: str
+
+
+@dataclass(frozen=True)
+class Describe:
+    phone_number: str
+
+
+@dataclass(frozen=True)
+class Confirmation:
+    pass
+
+
+@dataclass(frozen=True)
+class LanguageChoice:
+    language: str
+
+
+@dataclass(frozen=True)
+class Command:
+    name: str
+    handler: str
+    parse: object
+    requires_user: bool
+    label: str
+    prefix: bool
+
+
+# Command keyword -> Command, filled in by the @command decorator
+COMMANDS = {}
+
+# Matches the keyword at the start of a word for every prefix command, longest first
+PREFIX = None
+
+# Keyword of the bare 10 digit phone number lookup; '#' keeps it from matching a typed word
+PHONE = '#phone'
+
+KEYWORD = re.compile(r'[a-z]+|\d+')
+REGISTRATION = re.compile(r'start#([^#]*)#([^#]*)#([^#]*)#([^#]*)#([^#]*)')
+DETAILS = re.compile(r'details#([^#]*)#([^#]*)#([^#]*)#([^#]*)#([^#]*)')
+MATCH = re.compile(r'match#([^#]*)#([^#]*)')
+AGE_RANGE = re.compile(r'([^-]*)(?:-([^-]*))?')
+LANGUAGE = re.compile(r'(?:language|lugha)#([a-z]+)')
+
+
+def command(name, parse, requires_user=True, label=None, prefix=False):
+    """Register the decorated SMSProcessor method as the handler for a command keyword.
+
+    `label` names the command in metrics and defaults to the keyword. A `prefix`
+    command also matches words that start with its keyword, such as 'yesplease'.
+    """
+    def register(handler):
+        global PREFIX
+        COMMANDS[name] = Command(name, handler.__name__, parse, requires_user, label or name, prefix)
+        if prefix:
+            keywords = sorted((entry.name for entry in COMMANDS.values() if entry.prefix), key=len, reverse=True)
+            PREFIX = re.compile('|'.join(map(re.escape, keywords)))
+        return handler
+    return register
+
+
+def keyword(message):
+    """Return the command keyword of a normalized message: its leading word, or PHONE"""
+    match = KEYWORD.match(message)
+    if match is None:
+        return None
+
+    token = match.group()
+    if token.isdigit():
+        return PHONE if len(token) == 10 and len(message) == 10 else None
+    if token in COMMANDS or PREFIX is None:
+        return token
+    match = PREFIX.match(token)
+    return match.group() if match else token
+
+
+def lookup(message):
+    """Return the registered Command for a normalized message, or None"""
+    return COMMANDS.get(keyword(message))
+
+
+def parse_registration(message):
+    """start#name#age#gender#county#town"""
+    match = REGISTRATION.fullmatch(message)
+    if match is None:
+        raise ParseError('REGISTRATION_INVALID_FORMAT')
+
+    name, age, gender, county, town = match.groups()
+    if not (name.strip() and county.strip() and town.strip()):
+        raise ParseError('REGISTRATION_INVALID_FORMAT')
+    try:
+        age = int(age)
+    except ValueError:
+        raise ParseError('REGISTRATION_INVALID_AGE_FORMAT')
+
+    return Registration(name, age, gender, county, town)
+
+
+def parse_details(message):
+    """details#education#profession#marital#religion#ethnicity"""
+    match = DETAILS.fullmatch(message)
+    if match is None:
+        raise ParseError('DETAILS_INVALID_FORMAT')
+
+    return Details(*match.groups())
+
+
+def parse_self_description(message):
+    """MYSELF description"""
+    return SelfDescription(message[6:].strip())
+
+
+def parse_match(message):
+    """match#age#town or match#age-range#town"""
+    match = MATCH.fullmatch(message)
+    if match is None:
+        raise ParseError('MATCH_INVALID_FORMAT')
+
+    age_part, town = match.groups()
+    age_range = AGE_RANGE.fullmatch(age_part)
+    try:
+        age_start = int(age_range.group(1))
+        age_end = int(age_range.group(2)) if age_range.group(2) is not None else age_start
+    except (AttributeError, ValueError):
+        raise ParseError('MATCH_INVALID_AGE_FORMAT')
+
+    return MatchQuery(age_start, age_end, town)
+
+
+def parse_next(message):
+    """NEXT"""
+    return NextPage()
+
+
+def parse_profile_lookup(message):
+    """A 10 digit phone number"""
+    return ProfileLookup(message)
+
+
+def parse_describe(message):
+    """DESCRIBE phone_number"""
+    parts = message.split()
+    if len(parts) != 2:
+        raise ParseError('DESCRIBE_INVALID_FORMAT')
+
+    return Describe(parts[1])
+
+
+def parse_confirmation(message):
+    """YES"""
+    return Confirmation()
+
+
+def parse_language(message):
+    """language#code or lugha#code"""
+    match = LANGUAGE.fullmatch(message)
+    if match is None:
+        raise ParseError('LANGUAGE_INVALID_FORMAT')
+
+    return LanguageChoice(match.group(1))
@@ -0,0 +1,117 @@
+# Standard library imports
+from dataclasses import dataclass
+
+# Remote library imports
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+# Local imports
+from models import User, UserDetail
+
+# User columns whose old values a write reports, for the caches keyed on them
+TRACKED = ('gender', 'town', 'age')
+
+# Every Staged, and every user write listener, in the order they were created
+registry = []
+listeners = []
+
+
+class Staged:
+    """Work a session stages until its transaction ends.
+
+    Items are kept per savepoint. When the transaction commits every item is
+    passed to `apply(session, items)`; the items of a rolled back savepoint or
+    transaction are passed to `discard(session, items)` instead, if given.
+    """
+
+    def __init__(self, apply, discard=None):
+        self.apply = apply
+        self.discard = discard
+        registry.append(self)
+
+    def add(self, session, *items):
+        """Stage items in the session's innermost transaction"""
+        session.info.setdefault(self, {}).setdefault(session.get_nested_transaction(), []).extend(items)
+
+    def committed(self, session):
+        items = [item for items in session.info.pop(self, {}).values() for item in items]
+        if items:
+            self.apply(session, items)
+
+    def rolled_back(self, session, transaction=None):
+        if transaction is None:
+            items = [item for items in session.info.pop(self, {}).values() for item in items]
+        else:
+            items = session.info.get(self, {}).pop(transaction, [])
+        if items and self.discard:
+            self.discard(session, items)
+
+
+@dataclass(frozen=True)
+class UserWrite:
+    """A user's values after a write, and their old TRACKED values unless the user is new"""
+    id: int
+    phone_number: str
+    gender: str
+    town: str
+    age: int
+    old: tuple = None
+    deleted: bool = False
+
+
+def on_user_write(listener):
+    """Register `listener(session, write)` for every user written, directly or through their details"""
+    listeners.append(listener)
+    return listener
+
+
+def users_written(session, writes):
+    """Run the user write listeners for users written outside the ORM, such as by a bulk insert"""
+    for write in writes:
+        for listener in listeners:
+            listener(session, write)
+
+
+def old_value(state, key):
+    history = state.attrs[key].history
+    if history.deleted:
+        return history.deleted[0]
+    return history.unchanged[0] if history.unchanged else getattr(state.obj(), key)
+
+
+def flushed_writes(session):
+    """A UserWrite for every user the flush wrote, or whose details it wrote"""
+    users = {}
+    for instance in (*session.new, *session.dirty, *session.deleted):
+        user = instance.user if isinstance(instance, UserDetail) else instance
+        if isinstance(user, User):
+            users[user] = None
+    for user in users:
+        state = inspect(user)
+        old = None if user in session.new else tuple(old_value(state, key) for key in TRACKED)
+        yield UserWrite(user.id, user.phone_number, user.gender, user.town, user.age, old, user in session.deleted)
+
+
+@event.listens_for(Session, 'after_flush')
+def run_user_write_listeners(session, flush_context):
+    users_written(session, flushed_writes(session))
+
+
+@event.listens_for(Session, 'after_commit')
+def apply_staged(session):
+    for staged in registry:
+        staged.committed(session)
+
+
+@event.listens_for(Session, 'after_soft_rollback')
+def discard_savepoint(session, previous_transaction):
+    if previous_transaction.nested:
+        for staged in registry:
+            staged.rolled_back(session, previous_transaction)
+
+
+@event.listens_for(Session, 'after_transaction_end')
+def discard_uncommitted(session, transaction):
+    if transaction.parent is None:
+        for staged in registry:
+            staged.rolled_back(session)
@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+
+# Standard library imports
+import argparse
+import logging
+import time
+from datetime import datetime, timedelta
+from threading import Event, Lock, Thread
+
+# Remote library imports
+from sqlalchemy import delete, exists, insert, select, update
+from sqlalchemy.orm import aliased
+
+# Local imports
+from config import app, db
+from models import MatchRequest, Message, MessageArchive, ProfileMatch
+
+logger = logging.getLogger(__name__)
+
+STEPS = ('deactivated', 'purged', 'archived')
+
+
+class Compactor:
+    """Trims the tables the NEXT and notification paths read, in small rate-limited batches.
+
+    A pass deactivates match requests superseded by a newer one from the same
+    user, deletes the ProfileMatch rows of inactive requests, and moves messages
+    older than the retention period into messages_archive. Every batch is its
+    own short transaction, and batches are spaced so the job writes at most
+    `rows_per_second` rows, leaving the database to live traffic in between.
+    """
+
+    def __init__(self, app, batch_size=500, rows_per_second=2000, retention_days=90, interval=300):
+        self.app = app
+        self.batch_size = batch_size
+        self.rows_per_second = rows_per_second
+        self.retention_days = retention_days
+        self.interval = interval
+
+        self._stop = Event()
+        self._thread = None
+        self._lock = Lock()
+        self._rows = dict.fromkeys(STEPS, 0)
+        self._batches = 0
+        self._passes = 0
+        self._seconds_total = 0.0
+        self._last_run = None
+
+    def start(self):
+        """Run a pass every `interval` seconds in a background thread"""
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._stop.clear()
+            self._thread = Thread(target=self.run_forever, name='compaction', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._stop.set()
+            thread.join()
+
+    def run_once(self):
+        """Run every step until it runs out of rows; return the rows handled per step"""
+        started = time.perf_counter()
+        handled = {
+            'deactivated': self._drain('deactivated', self.deactivate_superseded),
+            'purged': self._drain('purged', self.purge_profile_matches),
+            'archived': self._drain('archived', self.archive_messages),
+        }
+        with self._lock:
+            self._passes += 1
+            self._seconds_total += time.perf_counter() - started
+            self._last_run = time.time()
+        return handled
+
+    def deactivate_superseded(self):
+        """Deactivate one batch of active match requests that have a newer request from the same user"""
+        newer = aliased(MatchRequest)
+        ids = db.session.scalars(
+            select(MatchRequest.match_request_id).where(
+                MatchRequest.is_active == True,
+                exists().where(
+                    newer.user_id == MatchRequest.user_id,
+                    newer.match_request_id > MatchRequest.match_request_id
+                )
+            ).limit(self.batch_size)
+        ).all()
+        if ids:
+            db.session.execute(
+                update(MatchRequest).where(MatchRequest.match_request_id.in_(ids)).values(is_active=False)
+            )
+        return len(ids)
+
+    def purge_profile_matches(self):
+        """Delete one batch of ProfileMatch rows belonging to inactive match requests"""
+        ids = db.session.scalars(
+            select(ProfileMatch.id).join(MatchRequest).where(MatchRequest.is_active == False).limit(self.batch_size)
+        ).all()
+        if ids:
+            db.session.execute(delete(ProfileMatch).where(ProfileMatch.id.in_(ids)))
+        return len(ids)
+
+    def archive_messages(self):
+        """Move one batch of messages older than the retention period into messages_archive"""
+        cutoff = datetime.now() - timedelta(days=self.retention_days)
+        rows = db.session.execute(
+            select(
+                Message.id, Message.sender_id, Message.recipient_id,
+                Message.phone_number, Message.content, Message.timestamp
+            ).where(Message.timestamp < cutoff).order_by(Message.id).limit(self.batch_size)
+        ).mappings().all()
+        if rows:
+            db.session.execute(insert(MessageArchive.__table__), [dict(row) for row in rows])
+            db.session.execute(delete(Message).where(Message.id.in_([row['id'] for row in rows])))
+        return len(rows)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'rows': dict(self._rows),
+                'batches': self._batches,
+                'passes': self._passes,
+                'seconds_total': self._seconds_total,
+                'last_run': self._last_run,
+            }
+
+    def _drain(self, step, run_batch):
+        # Every step only touches rows of one user, so each shard is compacted on its own
+        with self.app.app_context():
+            shards = db.session().shard_ids()
+        return sum(self._drain_shard(step, run_batch, shard) for shard in shards)
+
+    def _drain_shard(self, step, run_batch, shard):
+        total = 0
+        while not self._stop.is_set():
+            started = time.perf_counter()
+            with self.app.app_context(), db.session().home(shard):
+                try:
+                    count = run_batch()
+                    db.session.commit()
+                except Exception:
+                    db.session.rollback()
+                    raise
+
+            total += count
+            with self._lock:
+                self._rows[step] += count
+                self._batches += 1
+            if count < self.batch_size:
+                return total
+
+            # Space batches out so the job stays under rows_per_second
+            if self.rows_per_second:
+                self._stop.wait(max(count / self.rows_per_second - (time.perf_counter() - started), 0))
+        return total
+
+    def run_forever(self):
+        """Run a pass every `interval` seconds until stopped"""
+        while not self._stop.is_set():
+            try:
+                self.run_once()
+            except Exception:
+                logger.exception('Compaction pass failed')
+            self._stop.wait(self.interval)
+
+
+compactor = Compactor(
+    app,
+    batch_size=app.config['COMPACTION_BATCH_SIZE'],
+    rows_per_second=app.config['COMPACTION_ROWS_PER_SECOND'],
+    retention_days=app.config['MESSAGE_RETENTION_DAYS'],
+    interval=app.config['COMPACTION_INTERVAL'],
+)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Deactivate superseded match requests, purge their matches and archive old messages')
+    parser.add_argument('--batch-size', type=int, default=compactor.batch_size)
+    parser.add_argument('--rows-per-second', type=int, default=compactor.rows_per_second,
+                        help='upper bound on rows written per second; 0 for no limit')
+    parser.add_argument('--retention-days', type=int, default=compactor.retention_days,
+                        help='archive messages older than this')
+    parser.add_argument('--loop', action='store_true', help='keep running a pass every --interval seconds')
+    parser.add_argument('--interval', type=int, default=compactor.interval)
+    args = parser.parse_args()
+
+    compactor.batch_size = args.batch_size
+    compactor.rows_per_second = args.rows_per_second
+    compactor.retention_days = args.retention_days
+    compactor.interval = args.interval
+
+    if args.loop:
+        try:
+            compactor.run_forever()
+        except KeyboardInterrupt:
+            pass
+    else:
+        handled = compactor.run_once()
+        stats = compactor.stats()
+        print(f"{handled['deactivated']} match requests deactivated, {handled['purged']} profile matches deleted, "
+              f"{handled['archived']} messages archived in {stats['batches']} batches ({stats['seconds_total']:.2f}s)")
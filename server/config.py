@@ -1,4 +1,5 @@
 # Standard library imports
+import os
 
 # Remote library imports
 from flask import Flask
@@ -6,24 +7,170 @@ from flask_cors import CORS
 from flask_migrate import Migrate
 from flask_restful import Api
 from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy import MetaData
+from sqlalchemy import MetaData, event
 
 # Local imports
+from sharding import RoutingSession, SingleSession, configure_shards
 
 # Instantiate app, set attributes
 app = Flask(__name__)
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///app.db'
+app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URI', 'sqlite:///app.db')
+# 'production' applies the SQLite pragmas and pool settings below, 'default' leaves the engine as is
+app.config['DB_PROFILE'] = os.environ.get('DB_PROFILE', 'default')
+app.config['DB_POOL_SIZE'] = int(os.environ.get('DB_POOL_SIZE', 10))
+app.config['DB_POOL_RECYCLE'] = int(os.environ.get('DB_POOL_RECYCLE', 3600))
+# Async driver URI for the ASGI front end; derived from SQLALCHEMY_DATABASE_URI when unset
+app.config['ASYNC_DATABASE_URI'] = os.environ.get('ASYNC_DATABASE_URI')
+# Comma-separated database URIs to shard users across by a hash of their phone number;
+# unset keeps everything in SQLALCHEMY_DATABASE_URI. Slots are the unit rebalancing moves,
+# and SHARD_MAP_FILE holds the slot -> shard routing map, written on first start; see rebalance.py.
+app.config['SHARDS'] = [uri for uri in os.environ.get('SHARDS', '').split(',') if uri]
+app.config['SHARD_SLOTS'] = int(os.environ.get('SHARD_SLOTS', 256))
+app.config['SHARD_MAP_FILE'] = os.environ.get('SHARD_MAP_FILE', 'shard_map.json')
+app.config['SQLITE_PRAGMAS'] = {
+    'journal_mode': os.environ.get('SQLITE_JOURNAL_MODE', 'WAL'),
+    'synchronous': os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL'),
+    'busy_timeout': int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', 5000)),
+    'mmap_size': int(os.environ.get('SQLITE_MMAP_SIZE', 256 * 1024 * 1024)),
+    'cache_size': int(os.environ.get('SQLITE_CACHE_SIZE', -64000)),
+}
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+# 'eager' stores every match as a ProfileMatch row, 'lazy' stores only the criteria
+app.config['MATCH_MODE'] = 'eager'
+# Answer lazy match counts and pages from the in-memory match index instead of SQL,
+# checking a sampled fraction of queries against SQL
+app.config['MATCH_INDEX_ENABLED'] = False
+app.config['MATCH_INDEX_VERIFY_RATE'] = 0.0
+# Order eager matches by a score over the candidates' details instead of (age, id);
+# missing weights fall back to ranking.DEFAULT_WEIGHTS
+app.config['MATCH_RANKING_ENABLED'] = True
+app.config['MATCH_RANKING_WEIGHTS'] = {}
+app.config['MATCH_RANKING_HALF_LIFE_DAYS'] = 30
+# Share match query results between requests for MATCH_CACHE_TTL seconds; 'memory' is
+# per process, up to MATCH_CACHE_ROWS candidate rows in all, 'redis' shares one cache between
+# workers at MATCH_CACHE_URL
+app.config['MATCH_CACHE_ENABLED'] = True
+app.config['MATCH_CACHE_BACKEND'] = os.environ.get('MATCH_CACHE_BACKEND', 'memory')
+app.config['MATCH_CACHE_URL'] = os.environ.get('MATCH_CACHE_URL', 'redis://localhost:6379/0')
+app.config['MATCH_CACHE_ROWS'] = 200000
+app.config['MATCH_CACHE_TTL'] = 60
+# Number of phone number to user resolutions kept in memory; writes in this process drop
+# a user at once, USER_CACHE_TTL bounds staleness across workers
+app.config['USER_CACHE_SIZE'] = 10000
+app.config['USER_CACHE_TTL'] = 30
+# Rendered phone number lookup and DESCRIBE replies kept in memory, up to about PROFILE_CACHE_BYTES;
+# writes in this process drop a user's entries at once, PROFILE_CACHE_TTL bounds staleness across workers
+app.config['PROFILE_CACHE_ENABLED'] = True
+app.config['PROFILE_CACHE_BYTES'] = 16 * 1024 * 1024
+app.config['PROFILE_CACHE_TTL'] = 300
+# Gateway retries that repeat a message id within SMS_DEDUP_WINDOW seconds replay the first
+# response; 'memory' is per process, 'redis' shares the window between workers at SMS_DEDUP_URL
+app.config['SMS_DEDUP_BACKEND'] = os.environ.get('SMS_DEDUP_BACKEND', 'memory')
+app.config['SMS_DEDUP_URL'] = os.environ.get('SMS_DEDUP_URL', 'redis://localhost:6379/0')
+app.config['SMS_DEDUP_SIZE'] = 100000
+app.config['SMS_DEDUP_WINDOW'] = 3600
+# Token buckets per sender and command: (burst, messages per minute). Scans and
+# notifications (match, phone lookups, yes) get the tightest budgets. 'memory' is per
+# process, 'redis' shares the buckets between workers at RATE_LIMIT_URL
+app.config['RATE_LIMIT_ENABLED'] = True
+app.config['RATE_LIMIT_BACKEND'] = os.environ.get('RATE_LIMIT_BACKEND', 'memory')
+app.config['RATE_LIMIT_URL'] = os.environ.get('RATE_LIMIT_URL', 'redis://localhost:6379/0')
+app.config['RATE_LIMIT_SENDERS'] = 100000
+app.config['RATE_LIMITS'] = {
+    'start': (5, 2),
+    'details': (5, 2),
+    'myself': (5, 2),
+    'match': (5, 2),
+    '#phone': (10, 4),
+    'yes': (10, 4),
+    'next': (20, 10),
+    'describe': (20, 10),
+    'default': (20, 10),
+}
+# Language of users who have not chosen one, and of replies to unregistered numbers;
+# the other languages are in locales.py
+app.config['DEFAULT_LANGUAGE'] = 'en'
+# Replies longer than this many SMS parts (153 GSM-7 or 67 UCS-2 characters each) are cut short
+app.config['SMS_MAX_SEGMENTS'] = 3
+# Largest /sms/batch request accepted, and how many messages it commits at a time
+app.config['SMS_BATCH_MAX_SIZE'] = 1000
+app.config['SMS_BATCH_COMMIT_SIZE'] = 100
+# Outbound notifications are queued and written by background workers when enabled
+app.config['OUTBOX_ENABLED'] = True
+app.config['OUTBOX_SENDER'] = 'loopback'
+app.config['OUTBOX_FILE'] = 'outbox.jsonl'
+app.config['OUTBOX_MAX_SIZE'] = 10000
+app.config['OUTBOX_BATCH_SIZE'] = 100
+app.config['OUTBOX_WORKERS'] = 2
+# Background compaction: deactivate superseded match requests, delete their ProfileMatch
+# rows and archive messages older than MESSAGE_RETENTION_DAYS, at most ROWS_PER_SECOND
+app.config['COMPACTION_ENABLED'] = False
+app.config['COMPACTION_INTERVAL'] = 300
+app.config['COMPACTION_BATCH_SIZE'] = 500
+app.config['COMPACTION_ROWS_PER_SECOND'] = 2000
+app.config['MESSAGE_RETENTION_DAYS'] = 90
+# SMS slower than this are logged with their SQL; None turns the log off
+app.config['SLOW_REQUEST_SECONDS'] = None
 app.json.compact = False
 
+
+def engine_options(config):
+    """Engine keyword arguments for the configured DB_PROFILE"""
+    if config['DB_PROFILE'] != 'production':
+        return {}
+    return {
+        'pool_size': config['DB_POOL_SIZE'],
+        'pool_recycle': config['DB_POOL_RECYCLE'],
+        'pool_pre_ping': True,
+    }
+
+
+def blocking(session, call, *args):
+    """Make a call that may block on a lock, queue or network round trip.
+
+    The ASGI app sets session.info['offload'] so such calls run in a thread
+    instead of stalling its event loop; elsewhere they run inline.
+    """
+    offload = session.info.get('offload')
+    return offload(call, *args) if offload else call(*args)
+
+
+def sqlite_pragma_listener(pragmas):
+    """Return a connect listener that applies the given SQLite pragmas"""
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name}={value}')
+        cursor.close()
+    return set_pragmas
+
+
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app.config)
+
 # Define metadata, instantiate db
 metadata = MetaData(naming_convention={
     "fk": "fk_%(table_name)s_%(column_0_name)s_%(referred_table_name)s",
 })
-db = SQLAlchemy(metadata=metadata)
+db = SQLAlchemy(metadata=metadata, session_options={'class_': RoutingSession if app.config['SHARDS'] else SingleSession})
 migrate = Migrate(app, db)
 db.init_app(app)
 
+if app.config['DB_PROFILE'] == 'production':
+    with app.app_context():
+        if db.engine.dialect.name == 'sqlite':
+            event.listen(db.engine, 'connect', sqlite_pragma_listener(app.config['SQLITE_PRAGMAS']))
+
+if app.config['SHARDS']:
+    configure_shards(
+        app,
+        app.config['SHARDS'],
+        app.config['SHARD_SLOTS'],
+        app.config['SHARD_MAP_FILE'],
+        engine_options=engine_options(app.config),
+        on_connect=sqlite_pragma_listener(app.config['SQLITE_PRAGMAS'])
+        if app.config['DB_PROFILE'] == 'production' else None
+    )
+
 api = Api(app)
 
 CORS(app)
@@ -57,18 +204,30 @@ SMS_MESSAGES = {
     'MATCH_INVALID_AGE_FORMAT': "Invalid age format. Use numbers only.",
     'MATCH_FAILED': "Match request failed: {error}",
     'MATCH_NEXT_PROMPT': "Send NEXT to 22141 to receive details of the remaining {remaining} {gender_term}",
+    'MATCH_PROFILE': "{name} aged {age}, {phone}.",
+    'GENDER_TERM_MEN': "gentlemen",
+    'GENDER_TERM_WOMEN': "ladies",
+
+    # Next page messages
+    'NEXT_NO_ACTIVE_REQUEST': "You have no active match request. Send match#age#town to 22141 to find matches.",
+    'NEXT_NO_MORE_MATCHES': "There are no more matches for your request. Send match#age#town to 22141 to search again.",
+    'NEXT_FAILED': "Failed to get more matches: {error}",
 
     # Profile request messages
     'PROFILE_DETAILS': "{name} aged {age}, {county} County, {town} town, {education}, {profession}, {marital}, {religion}, {ethnicity}. Send DESCRIBE {phone} to get more details about {name}.",
+    'PROFILE_BASIC': "{name} aged {age}, {county} County, {town} town. Send DESCRIBE {phone} to get more details about {name}.",
     'PROFILE_NOT_FOUND': "Profile not found. Please check the phone number.",
     'PROFILE_FAILED': "Failed to get profile: {error}",
+    'PROFILE_NOT_GIVEN': "N/A",
 
     # Describe request messages
     'DESCRIBE_INVALID_FORMAT': "Invalid format. Use: DESCRIBE phone_number",
     'DESCRIBE_NOT_FOUND': "Profile not found.",
     'DESCRIBE_NO_DESCRIPTION': "{name} has not provided a self description yet.",
-    'DESCRIBE_SUCCESS': "{name} describes themselves as {description}",
+    'DESCRIBE_SUCCESS': "{name} describes {pronoun} as {description}",
     'DESCRIBE_FAILED': "Failed to get description: {error}",
+    'PRONOUN_HIMSELF': "himself",
+    'PRONOUN_HERSELF': "herself",
     
     # Interest notification messages
     'INTEREST_NOTIFICATION': "Hi {name}, a {gender} called {interested_name} {phone_number} is interested in you and requested your details. "
@@ -76,5 +235,19 @@ SMS_MESSAGES = {
     'INTEREST_CONFIRMATION_SUCCESS': "{name} aged {age}, {county} County, {town} town, {education}, {profession}, {marital}, {religion}, {ethnicity}. Send DESCRIBE {phone} to get more details about {name}.",
     'INTEREST_NO_NOTIFICATIONS': "No pending interest notifications found.",
     'INTEREST_CONFIRMATION_FAILED': "Failed to process confirmation: {error}",
+    'GENDER_MAN': "man",
+    'GENDER_WOMAN': "woman",
+    'PRONOUN_HE': "he",
+    'PRONOUN_SHE': "she",
+    'PRONOUN_HIM': "him",
+    'PRONOUN_HER': "her",
+
+    # Language messages
+    'LANGUAGE_CHANGED': "We will reply in English from now on. Send lugha#sw for replies in Swahili.",
+    'LANGUAGE_UNSUPPORTED': "Language '{language}' is not available. Choose one of: {languages}",
+    'LANGUAGE_INVALID_FORMAT': "Invalid format. Use: language#en or lugha#sw",
+
+    # Rate limiting
+    'RATE_LIMITED': "You have sent too many {command} requests. Please wait {seconds} seconds and try again.",
 
     }
\ No newline at end of file
@@ -0,0 +1,97 @@
+# Standard library imports
+from threading import Lock
+
+# Local imports
+from cache import LRUCache
+from commit_hooks import Staged
+from config import app, blocking
+from redis_store import RedisStore, connect
+
+# Held for a message id from its first delivery until its response is stored
+PENDING = 'pending'
+
+
+class MemoryBackend:
+    """Per-process window of message ids, bounded in size and age"""
+
+    def __init__(self, maxsize, window):
+        self.entries = LRUCache(maxsize, ttl=window)
+
+    def add(self, key, value):
+        return self.entries.add(key, value)
+
+    def get(self, key):
+        return self.entries.get(key)
+
+    def set(self, key, value):
+        self.entries.set(key, value)
+
+    def delete(self, key):
+        self.entries.delete(key)
+
+
+class DedupStore:
+    """Responses to recently seen gateway messages, keyed by sender and message id.
+
+    The first delivery of a message id claims it; its response is stored once
+    the SMS's writes have committed, and later deliveries replay it without
+    touching the database. A retry that arrives while the first delivery is
+    still being processed is told so, and a failed delivery or commit releases
+    its claim so a retry runs it again.
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.counts = dict.fromkeys(('new', 'replayed', 'in_flight'), 0)
+        self._lock = Lock()
+
+    def key(self, phone_number, message_id):
+        return f'{phone_number}|{message_id}'
+
+    def claim(self, phone_number, message_id):
+        """Return None if this delivery should be processed, else the stored response or PENDING"""
+        key = self.key(phone_number, message_id)
+        if self.backend.add(key, PENDING):
+            self._count('new')
+            return None
+        # The entry may have expired or been released since add() failed; PENDING is the safe answer
+        response = self.backend.get(key) or PENDING
+        self._count('in_flight' if response == PENDING else 'replayed')
+        return response
+
+    def complete(self, phone_number, message_id, response):
+        self.backend.set(self.key(phone_number, message_id), response)
+
+    def release(self, phone_number, message_id):
+        self.backend.delete(self.key(phone_number, message_id))
+
+    def stats(self):
+        with self._lock:
+            return dict(self.counts)
+
+    def _count(self, result):
+        with self._lock:
+            self.counts[result] += 1
+
+
+def make_backend(config):
+    if config['SMS_DEDUP_BACKEND'] == 'redis':
+        return RedisStore(connect(config['SMS_DEDUP_URL']), 'penzi:dedup:', config['SMS_DEDUP_WINDOW'])
+    return MemoryBackend(config['SMS_DEDUP_SIZE'], config['SMS_DEDUP_WINDOW'])
+
+
+dedup = DedupStore(make_backend(app.config))
+
+
+def store_responses(session, responses):
+    for phone_number, message_id, response in responses:
+        blocking(session, dedup.complete, phone_number, message_id, response)
+
+
+def release_claims(session, responses):
+    for phone_number, message_id, response in responses:
+        blocking(session, dedup.release, phone_number, message_id)
+
+
+# Responses of batched messages, stored once the chunk holding their writes commits
+batched_responses = Staged(store_responses, release_claims)
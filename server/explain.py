@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+
+# Standard library imports
+import sys
+
+# Remote library imports
+from sqlalchemy import text
+from sqlalchemy.orm import joinedload
+
+# Local imports
+from config import app, db
+from models import User, UserDetail, MatchRequest, ProfileMatch, Message, Interest
+
+
+def handler_queries():
+    """Representative statements for every query the SMS handlers run"""
+    return [
+        ('user by phone number',
+            User.query.filter_by(phone_number='0722010203')),
+        ('user details by user',
+            UserDetail.query.filter_by(user_id=1)),
+        ('find matches',
+            User.query.filter(
+                User.gender == 'female',
+                User.age >= 23,
+                User.age <= 25,
+                User.town == 'Nairobi',
+                User.id != 1
+            ).order_by(User.age, User.id)),
+        ('lazy match page',
+            MatchRequest(
+                user_id=1, matched_gender='female', age_range_start=23,
+                age_range_end=25, town='Nairobi', matches_per_page=3,
+                cursor_age=24, cursor_user_id=40
+            ).next_page()),
+        ('active match request',
+            MatchRequest.query.filter_by(user_id=1, is_active=True)
+            .order_by(MatchRequest.created_at.desc()).limit(1)),
+        ('next page of matches',
+            ProfileMatch.query.options(joinedload(ProfileMatch.matched_user))
+            .filter(ProfileMatch.match_request_id == 1, ProfileMatch.position >= 3)
+            .order_by(ProfileMatch.position).limit(3)),
+        ('messages for recipient',
+            Message.query.filter_by(recipient_id=1)),
+        ('latest pending interest with requester',
+            Interest.query.options(joinedload(Interest.requester).joinedload(User.details))
+            .filter(Interest.requested_id == 1, Interest.status == 'pending')
+            .order_by(Interest.created_at.desc(), Interest.id.desc()).limit(1)),
+    ]
+
+
+def explain(query):
+    """Return the EXPLAIN QUERY PLAN detail lines for a query"""
+    compiled = query.statement.compile(
+        dialect=db.engine.dialect,
+        compile_kwargs={'literal_binds': True}
+    )
+    rows = db.session.execute(text(f'EXPLAIN QUERY PLAN {compiled}')).fetchall()
+    return [row[-1] for row in rows]
+
+
+def uses_index(plan):
+    """A plan is indexed when no step is a bare table scan"""
+    return not any(
+        step.startswith('SCAN') and 'INDEX' not in step
+        for step in plan
+    )
+
+
+if __name__ == '__main__':
+    with app.app_context():
+        db.create_all()
+        unindexed = 0
+
+        for name, query in handler_queries():
+            plan = explain(query)
+            indexed = uses_index(plan)
+            unindexed += not indexed
+
+            print(f"{name}: {'ok' if indexed else 'FULL SCAN'}")
+            for step in plan:
+                print(f"    {step}")
+
+        sys.exit(1 if unindexed else 0)
@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+
+# Standard library imports
+import argparse
+import re
+from collections import Counter
+
+# Local imports
+from cache import LRUCache
+
+COUNTIES = [
+    'Mombasa', 'Kwale', 'Kilifi', 'Tana River', 'Lamu', 'Taita Taveta', 'Garissa', 'Wajir',
+    'Mandera', 'Marsabit', 'Isiolo', 'Meru', 'Tharaka Nithi', 'Embu', 'Kitui', 'Machakos',
+    'Makueni', 'Nyandarua', 'Nyeri', 'Kirinyaga', "Murang'a", 'Kiambu', 'Turkana', 'West Pokot',
+    'Samburu', 'Trans Nzoia', 'Uasin Gishu', 'Elgeyo Marakwet', 'Nandi', 'Baringo', 'Laikipia',
+    'Nakuru', 'Narok', 'Kajiado', 'Kericho', 'Bomet', 'Kakamega', 'Vihiga', 'Bungoma', 'Busia',
+    'Siaya', 'Kisumu', 'Homa Bay', 'Migori', 'Kisii', 'Nyamira', 'Nairobi',
+]
+
+# Canonical town -> county
+TOWNS = {
+    'Nairobi': 'Nairobi', 'Westlands': 'Nairobi', 'Kasarani': 'Nairobi', 'Embakasi': 'Nairobi',
+    'Langata': 'Nairobi', 'Karen': 'Nairobi', 'Kibra': 'Nairobi', 'Ruaraka': 'Nairobi',
+    'Mombasa': 'Mombasa', 'Nyali': 'Mombasa', 'Likoni': 'Mombasa', 'Changamwe': 'Mombasa',
+    'Kisumu': 'Kisumu', 'Maseno': 'Kisumu', 'Ahero': 'Kisumu',
+    'Nakuru': 'Nakuru', 'Naivasha': 'Nakuru', 'Molo': 'Nakuru', 'Gilgil': 'Nakuru',
+    'Eldoret': 'Uasin Gishu', 'Thika': 'Kiambu', 'Ruiru': 'Kiambu', 'Kikuyu': 'Kiambu',
+    'Kiambu': 'Kiambu', 'Juja': 'Kiambu', 'Limuru': 'Kiambu', 'Machakos': 'Machakos',
+    'Athi River': 'Machakos', 'Syokimau': 'Machakos', 'Kitengela': 'Kajiado', 'Ngong': 'Kajiado',
+    'Kajiado': 'Kajiado', 'Ongata Rongai': 'Kajiado', 'Malindi': 'Kilifi', 'Kilifi': 'Kilifi',
+    'Watamu': 'Kilifi', 'Kakamega': 'Kakamega', 'Mumias': 'Kakamega', 'Nyeri': 'Nyeri',
+    'Karatina': 'Nyeri', 'Meru': 'Meru', 'Embu': 'Embu', 'Kisii': 'Kisii', 'Kericho': 'Kericho',
+    'Bungoma': 'Bungoma', 'Webuye': 'Bungoma', 'Busia': 'Busia', 'Garissa': 'Garissa',
+    'Lamu': 'Lamu', 'Nanyuki': 'Laikipia', 'Nyahururu': 'Laikipia', 'Voi': 'Taita Taveta',
+    'Kitui': 'Kitui', 'Narok': 'Narok', 'Homa Bay': 'Homa Bay', 'Migori': 'Migori',
+    'Kitale': 'Trans Nzoia', 'Isiolo': 'Isiolo', 'Wajir': 'Wajir', 'Mandera': 'Mandera',
+    'Marsabit': 'Marsabit', 'Lodwar': 'Turkana', 'Kapenguria': 'West Pokot', 'Iten': 'Elgeyo Marakwet',
+    'Kapsabet': 'Nandi', 'Kabarnet': 'Baringo', 'Bomet': 'Bomet', 'Kerugoya': 'Kirinyaga',
+    "Murang'a": "Murang'a", 'Siaya': 'Siaya', 'Nyamira': 'Nyamira', 'Vihiga': 'Vihiga',
+    'Wote': 'Makueni', 'Ol Kalou': 'Nyandarua', 'Maralal': 'Samburu', 'Kwale': 'Kwale',
+    'Ukunda': 'Kwale', 'Hola': 'Tana River', 'Chuka': 'Tharaka Nithi',
+}
+
+# Common abbreviations and local names that no spelling similarity would find
+TOWN_ALIASES = {
+    'nbi': 'Nairobi', 'nrb': 'Nairobi', 'nai': 'Nairobi', 'nairobbery': 'Nairobi',
+    'msa': 'Mombasa', 'mombasa island': 'Mombasa', 'ksm': 'Kisumu', 'nku': 'Nakuru',
+    'eld': 'Eldoret', 'eldy': 'Eldoret', 'rongai': 'Ongata Rongai', 'athi': 'Athi River',
+    'mlolongo': 'Athi River', 'kibera': 'Kibra', 'langata': 'Langata', 'muranga': "Murang'a",
+}
+
+COUNTY_ALIASES = {
+    'nbi': 'Nairobi', 'nrb': 'Nairobi', 'msa': 'Mombasa', 'ksm': 'Kisumu', 'nku': 'Nakuru',
+    'muranga': "Murang'a", 'uasin': 'Uasin Gishu', 'taita': 'Taita Taveta', 'tharaka': 'Tharaka Nithi',
+    'elgeyo': 'Elgeyo Marakwet', 'pokot': 'West Pokot', 'trans-nzoia': 'Trans Nzoia',
+}
+
+# Trailing words people add to a place name ("Kisumu City", "Nairobi CBD")
+PLACE_SUFFIXES = {'city', 'town', 'cbd', 'county', 'centre', 'center', 'municipality', 'township'}
+
+NON_WORD = re.compile(r"[^a-z0-9' ]+")
+SPACES = re.compile(r'\s+')
+
+
+def normalize(text):
+    """Lowercase, drop punctuation and collapse whitespace"""
+    return SPACES.sub(' ', NON_WORD.sub(' ', text.lower().replace('-', ' '))).strip()
+
+
+def strip_suffixes(key):
+    words = key.split(' ')
+    while len(words) > 1 and words[-1] in PLACE_SUFFIXES:
+        words.pop()
+    return ' '.join(words)
+
+
+def trigrams(key):
+    padded = f'  {key} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class Gazetteer:
+    """Canonical place names with an alias map and a trigram index for fuzzy lookup.
+
+    Exact names, aliases and suffix-stripped names resolve with one dict lookup.
+    Anything else is scored against the names sharing at least one trigram. The
+    best match wins only at or above `threshold` Jaccard similarity and at least
+    `margin` ahead of the best match naming a different place, so a guess between
+    two plausible places is a miss. Results, including misses, are cached.
+    """
+
+    def __init__(self, names, aliases=None, threshold=0.6, margin=0.2, cache_size=10000):
+        self.threshold = threshold
+        self.margin = margin
+        self.exact = {normalize(name): name for name in names}
+        self.exact.update({normalize(alias): name for alias, name in (aliases or {}).items()})
+
+        self.grams = {}
+        self.postings = {}
+        for key in self.exact:
+            grams = trigrams(key)
+            self.grams[key] = len(grams)
+            for gram in grams:
+                self.postings.setdefault(gram, []).append(key)
+
+        self.cache = LRUCache(cache_size)
+
+    def lookup(self, text, fuzzy=True):
+        """Return the canonical name for `text`, or None if nothing is close enough.
+
+        With fuzzy=False only exact names, aliases and suffix-stripped names match.
+        """
+        key = normalize(text)
+        canonical = self.exact.get(key) or self.exact.get(strip_suffixes(key))
+        if canonical or not fuzzy:
+            return canonical
+
+        cached = self.cache.get(key, self)
+        if cached is not self:
+            return cached
+
+        canonical = self.fuzzy(strip_suffixes(key))
+        self.cache.set(key, canonical)
+        return canonical
+
+    def fuzzy(self, key):
+        if not key:
+            return None
+        grams = trigrams(key)
+        shared = Counter(candidate for gram in grams for candidate in self.postings.get(gram, ()))
+
+        # Best score per canonical place, since aliases share their place's name
+        scores = {}
+        for candidate, count in shared.items():
+            score = count / (len(grams) + self.grams[candidate] - count)
+            name = self.exact[candidate]
+            scores[name] = max(score, scores.get(name, 0))
+
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+        if not ranked or ranked[0][1] < self.threshold:
+            return None
+        if len(ranked) > 1 and ranked[0][1] - ranked[1][1] < self.margin:
+            return None
+        return ranked[0][0]
+
+
+towns = Gazetteer(TOWNS, TOWN_ALIASES)
+counties = Gazetteer(COUNTIES, COUNTY_ALIASES)
+
+
+def normalize_town(text, fuzzy=True):
+    """Canonical town name, falling back to the title-cased input for unknown places.
+
+    Pass fuzzy=False for names that get stored, so a misspelling is kept as typed
+    rather than replaced by a guess.
+    """
+    return towns.lookup(text, fuzzy) or text.strip().title()
+
+
+def normalize_county(text, fuzzy=True):
+    """Canonical county name, falling back to the title-cased input for unknown places"""
+    return counties.lookup(text, fuzzy) or text.strip().title()
+
+
+def normalize_existing_users(chunk_size=1000):
+    """Rewrite stored towns and counties to their canonical names; return how many users changed"""
+    from config import db
+    from models import User
+
+    changed = 0
+    last_id = 0
+    while True:
+        users = User.query.filter(User.id > last_id).order_by(User.id).limit(chunk_size).all()
+        if not users:
+            return changed
+        for user in users:
+            town, county = normalize_town(user.town or '', fuzzy=False), normalize_county(user.county or '', fuzzy=False)
+            if user.town and town != user.town or user.county and county != user.county:
+                user.town, user.county = town or user.town, county or user.county
+                changed += 1
+        last_id = users[-1].id
+        db.session.commit()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Normalize town and county names')
+    parser.add_argument('places', nargs='*', help='names to look up')
+    parser.add_argument('--normalize-existing', action='store_true',
+                        help='rewrite stored user towns and counties to canonical names')
+    args = parser.parse_args()
+
+    for place in args.places:
+        print(f'{place!r}: town {towns.lookup(place)!r}, county {counties.lookup(place)!r}')
+
+    if args.normalize_existing:
+        from config import app
+        with app.app_context():
+            print(f'{normalize_existing_users()} users updated')
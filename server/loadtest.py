@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+
+# Standard library imports
+import argparse
+import re
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from random import Random
+
+# Remote library imports
+from sqlalchemy import func, select
+
+# Local imports
+from app import app
+from commands import keyword
+from models import db, User
+from seed import seed_users, random_age, random_location, generate_users
+
+PHONE_NUMBER = re.compile(r'\b07\d{8}\b')
+
+
+def percentile(samples, fraction):
+    """Nearest-rank percentile of already sorted samples"""
+    if not samples:
+        return 0.0
+    return samples[min(len(samples) - 1, int(fraction * len(samples)))]
+
+
+def conversation(rng, profile):
+    """Yield one conversation's messages, stopping after NEXT if it lists nobody; the generator receives each reply"""
+    user, detail = profile
+    reply = yield (
+        f"start#{user['name']}#{user['age']}#{user['gender']}#{user['county']}#{user['town']}"
+    )
+    reply = yield (
+        f"details#{detail['education_level']}#{detail['profession']}#{detail['marital_status']}"
+        f"#{detail['religion']}#{detail['ethnicity']}"
+    )
+    reply = yield f"myself {detail['self_description']}"
+
+    county, town = random_location(rng)
+    age = random_age(rng)
+    reply = yield f"match#{age}-{age + rng.randint(2, 8)}#{town}"
+    reply = yield "next"
+
+    matched = PHONE_NUMBER.findall(reply or '')
+    if not matched:
+        # No candidates to look up; looking up our own number would time a path real users never take
+        return
+    requested = rng.choice(matched)
+    reply = yield requested
+    yield f"describe {requested}"
+
+
+class LoadDriver:
+    """Replays full SMS conversations against the app through the Flask test client"""
+
+    def __init__(self, concurrency, seed=None, phone_offset=0):
+        self.concurrency = concurrency
+        self.seed = seed
+        # Conversation phone numbers start here, so reruns register new users
+        self.phone_offset = phone_offset
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+
+    def run(self, conversations):
+        profiles = list(generate_users(conversations, seed=self.seed))
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            results = pool.map(self.replay, range(len(profiles)), profiles)
+            for latencies, errors in results:
+                for command, samples in latencies.items():
+                    self.latencies[command].extend(samples)
+                for command, count in errors.items():
+                    self.errors[command] += count
+        return time.perf_counter() - start
+
+    def replay(self, index, profile):
+        rng = Random(None if self.seed is None else self.seed + index)
+        user, detail = profile
+        detail = detail or dict(
+            education_level='Diploma', profession='Driver', marital_status='single',
+            religion='Christian', ethnicity='Luo', self_description=None,
+        )
+        detail['self_description'] = detail['self_description'] or 'calm, funny and loves hiking'
+        phone_number = f"08{self.phone_offset + index:08d}"
+
+        latencies = defaultdict(list)
+        errors = defaultdict(int)
+        client = app.test_client()
+        messages = conversation(rng, (user, detail))
+        reply = None
+
+        try:
+            while True:
+                message = messages.send(reply)
+                command = keyword(message.lower())
+
+                started = time.perf_counter()
+                response = client.post('/sms', json={'from': phone_number, 'text': message})
+                latencies[command].append(time.perf_counter() - started)
+
+                body = response.get_json() or {}
+                if response.status_code != 200:
+                    errors[command] += 1
+                reply = body.get('response')
+        except StopIteration:
+            pass
+        return latencies, errors
+
+    def report(self, elapsed):
+        total = sum(len(samples) for samples in self.latencies.values())
+        print(f"{total} messages in {elapsed:.2f}s: {total / elapsed:,.1f} messages/sec "
+              f"at concurrency {self.concurrency}")
+        print(f"{'command':>10} {'count':>7} {'errors':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+        for command, samples in self.latencies.items():
+            samples.sort()
+            print(f"{command:>10} {len(samples):>7} {self.errors[command]:>7} "
+                  f"{percentile(samples, 0.50) * 1000:>8.2f} "
+                  f"{percentile(samples, 0.95) * 1000:>8.2f} "
+                  f"{percentile(samples, 0.99) * 1000:>8.2f}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Replay full SMS conversations against the app')
+    parser.add_argument('--conversations', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--seed-users', type=int, default=0, help='seed this many users before the run')
+    parser.add_argument('--seed', type=int, default=None, help='random seed for a reproducible run')
+    parser.add_argument('--reset', action='store_true', help='drop and recreate all tables first')
+    args = parser.parse_args()
+
+    with app.app_context():
+        if args.reset:
+            db.session().drop_all(db.metadata)
+        db.session().create_all(db.metadata)
+        if args.seed_users:
+            seed_users(args.seed_users, seed=args.seed)
+        user_count = sum(count for count, in db.session().gather(select(func.count(User.id))))
+        print(f"{user_count} users in the database")
+
+    driver = LoadDriver(args.concurrency, seed=args.seed, phone_offset=user_count)
+    driver.report(driver.run(args.conversations))
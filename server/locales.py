@@ -0,0 +1,84 @@
+# Reply templates per language, keyed like SMS_MESSAGES (the 'en' catalog in config.py).
+# Keys missing from a language fall back to English and are reported at startup. Command
+# keywords and the values parsers accept (MATCH, NEXT, single, married...) stay in English.
+
+SWAHILI = {
+    # Registration messages
+    'REGISTRATION_SUCCESS': "Wasifu wako umeundwa {name}. Tuma details#kiwangoChaElimu#kazi#haliYaNdoa#dini#kabila kwa 22141. Mfano details#diploma#dereva#single#christian#mijikenda",
+    'REGISTRATION_INVALID_FORMAT': "Muundo si sahihi. Tumia: start#jina#umri#jinsia#kaunti#mji",
+    'REGISTRATION_INVALID_AGE': "Umri lazima uwe kati ya miaka 18 na 80",
+    'REGISTRATION_INVALID_GENDER': "Jinsia lazima iwe 'male' au 'female'",
+    'REGISTRATION_ALREADY_EXISTS': "Tayari umesajiliwa kama {name}. Tuma match#umri#mji kutafuta wapenzi.",
+    'REGISTRATION_FAILED': "Usajili haukufaulu: {error}",
+    'REGISTRATION_INVALID_AGE_FORMAT': "Umri si sahihi. Tafadhali weka nambari halali.",
+
+    # Details registration messages
+    'DETAILS_PROMPT': "Hii ni hatua ya mwisho ya usajili. Tuma maelezo mafupi kukuhusu kwa 22141 ukianza na neno MYSELF. Mfano, MYSELF mrembo, mcheshi, mpole n.k.",
+    'DETAILS_INVALID_FORMAT': "Muundo si sahihi. Tumia: details#elimu#kazi#haliYaNdoa#dini#kabila",
+    'DETAILS_INVALID_MARITAL': "Hali ya ndoa lazima iwe 'single', 'married' au 'divorced'",
+    'DETAILS_REGISTRATION_FAILED': "Usajili wa maelezo haukufaulu: {error}",
+    'DETAILS_SKIP_OPTION': "Umesajiliwa kwa maelezo yako ya awali. Kutafuta MPENZI, tuma match#umri#mji kwa 22141 ukutane na mtu wa ndoto zako. Mfano, match#23-25#Nairobi",
+
+    # Self description messages
+    'SELF_DESCRIPTION_SUCCESS': "Sasa umesajiliwa. Kutafuta MPENZI, tuma match#umri#mji kwa 22141 ukutane na mtu wa ndoto zako. Mfano, match#23-25#Kisumu",
+    'SELF_DESCRIPTION_TOO_SHORT': "Tafadhali toa maelezo marefu zaidi kukuhusu (angalau herufi 10)",
+    'SELF_DESCRIPTION_FAILED': "Maelezo binafsi hayakuhifadhiwa: {error}",
+
+    # Match request messages
+    'MATCH_SUCCESS': "Tuna {gender_term} {count} wanaolingana na chaguo lako! Tutakutumia maelezo ya 3 kati yao sasa hivi. Kupata maelezo zaidi kuhusu mtu, tuma nambari yake mfano 0722010203 kwa 22141",
+    'MATCH_NO_RESULTS': "Samahani, hakuna wanaolingana na vigezo vyako katika {town}. Jaribu umri au mji tofauti.",
+    'MATCH_INVALID_FORMAT': "Muundo si sahihi. Tumia: match#umri#mji au match#umri-umri#mji",
+    'MATCH_INVALID_AGE_FORMAT': "Umri si sahihi. Tumia nambari pekee.",
+    'MATCH_FAILED': "Utafutaji haukufaulu: {error}",
+    'MATCH_NEXT_PROMPT': "Tuma NEXT kwa 22141 kupokea maelezo ya {gender_term} {remaining} waliobaki",
+    'MATCH_PROFILE': "{name} umri {age}, {phone}.",
+    'GENDER_TERM_MEN': "wanaume",
+    'GENDER_TERM_WOMEN': "wanawake",
+
+    # Next page messages
+    'NEXT_NO_ACTIVE_REQUEST': "Huna utafutaji unaoendelea. Tuma match#umri#mji kwa 22141 kutafuta wapenzi.",
+    'NEXT_NO_MORE_MATCHES': "Hakuna wengine wanaolingana na utafutaji wako. Tuma match#umri#mji kwa 22141 kutafuta tena.",
+    'NEXT_FAILED': "Imeshindwa kupata wengine: {error}",
+
+    # Profile request messages
+    'PROFILE_DETAILS': "{name} umri {age}, Kaunti ya {county}, mji wa {town}, {education}, {profession}, {marital}, {religion}, {ethnicity}. Tuma DESCRIBE {phone} kupata maelezo zaidi kuhusu {name}.",
+    'PROFILE_BASIC': "{name} umri {age}, Kaunti ya {county}, mji wa {town}. Tuma DESCRIBE {phone} kupata maelezo zaidi kuhusu {name}.",
+    'PROFILE_NOT_FOUND': "Wasifu haukupatikana. Tafadhali hakikisha nambari ya simu.",
+    'PROFILE_FAILED': "Imeshindwa kupata wasifu: {error}",
+    'PROFILE_NOT_GIVEN': "Haijatajwa",
+
+    # Describe request messages
+    'DESCRIBE_INVALID_FORMAT': "Muundo si sahihi. Tumia: DESCRIBE nambari_ya_simu",
+    'DESCRIBE_NOT_FOUND': "Wasifu haukupatikana.",
+    'DESCRIBE_NO_DESCRIPTION': "{name} bado hajatoa maelezo binafsi.",
+    'DESCRIBE_SUCCESS': "{name} anajieleza kama {description}",
+    'DESCRIBE_FAILED': "Imeshindwa kupata maelezo: {error}",
+    'PRONOUN_HIMSELF': "mwenyewe",
+    'PRONOUN_HERSELF': "mwenyewe",
+
+    # Interest notification messages
+    'INTEREST_NOTIFICATION': "Habari {name}, {gender} anayeitwa {interested_name} {phone_number} amevutiwa nawe na ameomba maelezo yako. "
+    "Ana umri wa miaka {age} na anaishi {county}. Ungependa kumjua zaidi? Tuma YES kwa 22141",
+    'INTEREST_CONFIRMATION_SUCCESS': "{name} umri {age}, Kaunti ya {county}, mji wa {town}, {education}, {profession}, {marital}, {religion}, {ethnicity}. Tuma DESCRIBE {phone} kupata maelezo zaidi kuhusu {name}.",
+    'INTEREST_NO_NOTIFICATIONS': "Hakuna arifa zinazosubiri.",
+    'INTEREST_CONFIRMATION_FAILED': "Imeshindwa kushughulikia jibu lako: {error}",
+    'GENDER_MAN': "mwanaume",
+    'GENDER_WOMAN': "mwanamke",
+    'PRONOUN_HE': "yeye",
+    'PRONOUN_SHE': "yeye",
+    'PRONOUN_HIM': "yeye",
+    'PRONOUN_HER': "yeye",
+
+    # Language messages
+    'LANGUAGE_CHANGED': "Sasa tutakujibu kwa Kiswahili. Tuma language#en kupata majibu kwa Kiingereza.",
+    'LANGUAGE_UNSUPPORTED': "Lugha '{language}' haipatikani. Chagua mojawapo ya: {languages}",
+    'LANGUAGE_INVALID_FORMAT': "Muundo si sahihi. Tumia: lugha#sw au language#en",
+
+    # Rate limiting
+    'RATE_LIMITED': "Umetuma maombi mengi mno ya {command}. Tafadhali subiri sekunde {seconds} kisha ujaribu tena.",
+}
+
+# Language code -> templates, besides English
+LOCALES = {
+    'sw': SWAHILI,
+}
@@ -0,0 +1,136 @@
+# Standard library imports
+from threading import Lock
+
+# Local imports
+from cache import LRUCache
+from commit_hooks import Staged, on_user_write
+from config import app
+from redis_store import RedisStore, connect
+
+
+def weigh(key, rows):
+    # An empty result still takes an entry
+    return max(len(rows), 1)
+
+
+class MemoryBackend:
+    """Per-process LRU of match results with a TTL, and per-bucket generation counters.
+
+    `max_rows` bounds the candidate rows held across all entries, not the
+    number of entries, as one bucket's result can run to many thousands of rows.
+    """
+
+    def __init__(self, max_rows, ttl):
+        self.entries = LRUCache(max_rows, ttl=ttl, weigh=weigh)
+        self.generations = {}
+        self._lock = Lock()
+
+    def get(self, key):
+        return self.entries.get(key)
+
+    def set(self, key, value):
+        self.entries.set(key, value)
+
+    def generation(self, bucket):
+        return self.generations.get(bucket, 0)
+
+    def bump(self, bucket):
+        with self._lock:
+            self.generations[bucket] = self.generations.get(bucket, 0) + 1
+
+    def size(self):
+        return len(self.entries)
+
+
+class RedisBackend(RedisStore):
+    """Match results shared by every worker, with the generation counters beside them"""
+
+    def __init__(self, client, ttl):
+        super().__init__(client, 'penzi:match:', ttl)
+
+    def generation(self, bucket):
+        return int(self.client.get(self.generation_key(bucket)) or 0)
+
+    def bump(self, bucket):
+        self.client.incr(self.generation_key(bucket))
+
+    def generation_key(self, bucket):
+        return f"{self.prefix}generation:{'|'.join(bucket)}"
+
+    def size(self):
+        return None
+
+
+class MatchCache:
+    """Candidate rows of match queries, keyed on (gender, town, age range).
+
+    Every key carries the generation of its (gender, town) bucket. A committed
+    write to a user in the bucket bumps the generation, so every cached age
+    range of that bucket is missed from then on and ages out of the backend.
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._lock = Lock()
+
+    def key(self, gender, town, age_start, age_end):
+        generation = self.backend.generation((gender, town))
+        return f'{gender}|{town}|{age_start}|{age_end}|{generation}'
+
+    def get_or_load(self, gender, town, age_start, age_end, load):
+        """Return the cached rows for a query, calling `load` and caching its result on a miss"""
+        key = self.key(gender, town, age_start, age_end)
+        rows = self.backend.get(key)
+        with self._lock:
+            if rows is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        if rows is None:
+            rows = load()
+            self.backend.set(key, rows)
+        return rows
+
+    def invalidate(self, gender, town):
+        self.backend.bump((gender, town))
+        with self._lock:
+            self.invalidations += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': self.backend.size(),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': self.hits / lookups if lookups else 0.0,
+                'invalidations': self.invalidations,
+            }
+
+
+def make_backend(config):
+    if config['MATCH_CACHE_BACKEND'] == 'redis':
+        return RedisBackend(connect(config['MATCH_CACHE_URL']), config['MATCH_CACHE_TTL'])
+    return MemoryBackend(config['MATCH_CACHE_ROWS'], config['MATCH_CACHE_TTL'])
+
+
+match_cache = MatchCache(make_backend(app.config))
+
+
+def invalidate_buckets(session, buckets):
+    for gender, town in set(buckets):
+        match_cache.invalidate(gender, town)
+
+
+stale_buckets = Staged(invalidate_buckets)
+
+
+@on_user_write
+def collect_stale_buckets(session, write):
+    """Invalidate the (gender, town) buckets a user was in and is now in, once the write commits"""
+    stale_buckets.add(session, (write.gender, write.town))
+    if write.old:
+        stale_buckets.add(session, write.old[:2])
@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+
+# Standard library imports
+import argparse
+import logging
+import random
+from array import array
+from bisect import bisect_left, bisect_right, insort
+from threading import RLock
+
+# Local imports
+from commit_hooks import Staged, on_user_write
+from config import app, db
+from models import User
+
+logger = logging.getLogger(__name__)
+
+ID_BITS = 32
+ID_MASK = (1 << ID_BITS) - 1
+
+
+def index_key(age, user_id):
+    """Pack (age, id) into one integer that sorts like the tuple"""
+    return (age << ID_BITS) | user_id
+
+
+class MatchIndex:
+    """In-process index of user ids bucketed by (gender, town), each bucket an age-sorted array.
+
+    Keys are (age, id) pairs packed into a signed 64-bit array, so a bucket of a
+    million users costs 8MB and count and page queries are two bisects. Results
+    follow the same (age, id) order as find_matches. The index is built from the
+    database on first use and then kept current from committed User writes.
+    """
+
+    def __init__(self, verify_rate=0.0):
+        self.verify_rate = verify_rate
+        self.mismatches = 0
+        self.verified = 0
+        self._buckets = None
+        self._lock = RLock()
+
+    @property
+    def built(self):
+        return self._buckets is not None
+
+    def build(self):
+        """(Re)build every bucket from the users table"""
+        rows = db.session.query(User.gender, User.town, User.age, User.id).order_by(
+            User.gender, User.town, User.age, User.id
+        )
+        buckets = {}
+        for gender, town, age, user_id in rows:
+            buckets.setdefault((gender, town), array('q')).append(index_key(age, user_id))
+        # Sharded reads come back one shard after another; each bucket must still be sorted
+        buckets = {bucket: array('q', sorted(keys)) for bucket, keys in buckets.items()}
+        with self._lock:
+            self._buckets = buckets
+
+    def ensure_built(self):
+        if self._buckets is None:
+            with self._lock:
+                if self._buckets is None:
+                    self.build()
+
+    def add(self, gender, town, age, user_id):
+        with self._lock:
+            if self._buckets is not None:
+                insort(self._buckets.setdefault((gender, town), array('q')), index_key(age, user_id))
+
+    def remove(self, gender, town, age, user_id):
+        with self._lock:
+            if self._buckets is None:
+                return
+            bucket = self._buckets.get((gender, town))
+            key = index_key(age, user_id)
+            if bucket:
+                i = bisect_left(bucket, key)
+                if i < len(bucket) and bucket[i] == key:
+                    del bucket[i]
+
+    def _range(self, bucket, age_start, age_end):
+        return bisect_left(bucket, index_key(age_start, 0)), bisect_right(bucket, index_key(age_end, ID_MASK))
+
+    def count(self, gender, town, age_start, age_end):
+        self.ensure_built()
+        with self._lock:
+            bucket = self._buckets.get((gender, town))
+            if not bucket:
+                return 0
+            start, end = self._range(bucket, age_start, age_end)
+            return max(0, end - start)
+
+    def page(self, gender, town, age_start, age_end, after=None, limit=3):
+        """Return up to `limit` user ids in (age, id) order, after an optional (age, id) cursor"""
+        self.ensure_built()
+        with self._lock:
+            bucket = self._buckets.get((gender, town))
+            if not bucket:
+                return []
+            start, end = self._range(bucket, age_start, age_end)
+            if after is not None:
+                start = max(start, bisect_right(bucket, index_key(*after)))
+            return [key & ID_MASK for key in bucket[start:min(end, start + limit)]]
+
+    def ids(self, gender, town, age_start, age_end):
+        return self.page(gender, town, age_start, age_end, limit=self.count(gender, town, age_start, age_end))
+
+    def verify(self, gender, town, age_start, age_end):
+        """Compare one query against SQL; return True when the index agrees"""
+        expected = [user_id for age, user_id in sorted(db.session.query(User.age, User.id).filter(
+            User.gender == gender,
+            User.town == town,
+            User.age >= age_start,
+            User.age <= age_end
+        ))]
+        agrees = expected == self.ids(gender, town, age_start, age_end)
+
+        with self._lock:
+            self.verified += 1
+            if not agrees:
+                self.mismatches += 1
+        if not agrees:
+            logger.error('Match index disagrees with SQL for %s %s %d-%d', gender, town, age_start, age_end)
+        return agrees
+
+    def maybe_verify(self, gender, town, age_start, age_end):
+        """Verify a sampled fraction of live queries, set by verify_rate"""
+        if self.verify_rate and random.random() < self.verify_rate:
+            self.verify(gender, town, age_start, age_end)
+
+    def verify_all(self):
+        """Compare every bucket against the users table; return the mismatched bucket keys"""
+        self.ensure_built()
+        expected = {}
+        for gender, town, age, user_id in db.session.query(User.gender, User.town, User.age, User.id).order_by(
+            User.gender, User.town, User.age, User.id
+        ):
+            expected.setdefault((gender, town), []).append(index_key(age, user_id))
+        for keys in expected.values():
+            keys.sort()
+
+        with self._lock:
+            keys = set(expected) | {key for key, bucket in self._buckets.items() if bucket}
+            return sorted(
+                (key for key in keys if expected.get(key, []) != list(self._buckets.get(key, []))),
+                key=str
+            )
+
+    def stats(self):
+        with self._lock:
+            buckets = self._buckets or {}
+            return {
+                'buckets': len(buckets),
+                'users': sum(len(bucket) for bucket in buckets.values()),
+                'verified': self.verified,
+                'mismatches': self.mismatches,
+            }
+
+
+def load_users(user_ids):
+    """Load users by id, keeping the order of `user_ids`"""
+    users = {user.id: user for user in User.query.filter(User.id.in_(user_ids))}
+    return [users[user_id] for user_id in user_ids if user_id in users]
+
+
+match_index = MatchIndex(verify_rate=app.config['MATCH_INDEX_VERIFY_RATE'])
+
+
+def apply_changes(session, changes):
+    for action, *change in changes:
+        getattr(match_index, action)(*change)
+
+
+index_changes = Staged(apply_changes)
+
+
+@on_user_write
+def collect_user_changes(session, write):
+    """Remember how a write moves a user in a built index until the transaction commits"""
+    if not match_index.built:
+        return
+    current = (write.gender, write.town, write.age)
+    if write.old is not None and (write.deleted or write.old != current):
+        index_changes.add(session, ('remove', *write.old, write.id))
+    if not write.deleted and write.old != current:
+        index_changes.add(session, ('add', *current, write.id))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Build the match index and check it against the database')
+    parser.parse_args()
+
+    with app.app_context():
+        match_index.build()
+        stats = match_index.stats()
+        mismatched = match_index.verify_all()
+
+    print(f"{stats['users']} users in {stats['buckets']} (gender, town) buckets")
+    print(f"{len(mismatched)} buckets disagree with SQL" if mismatched else "Index matches SQL")
@@ -0,0 +1,161 @@
+# Standard library imports
+import logging
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from threading import Lock
+
+# Remote library imports
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Local imports
+from config import app
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+# Statements kept per request for the slow request log
+MAX_LOGGED_STATEMENTS = 50
+
+
+class Tracker:
+    """Wall time and SQL activity of the SMS being processed in the current context"""
+
+    def __init__(self, command):
+        self.command = command
+        self.started = time.perf_counter()
+        self.sql_statements = 0
+        self.sql_seconds = 0.0
+        self.commits = 0
+        self.statements = []
+
+
+class Metrics:
+    """Per-command request metrics, rendered in the Prometheus text format"""
+
+    def __init__(self, slow_request_seconds=None):
+        self.slow_request_seconds = slow_request_seconds
+        # A context variable rather than a thread local, so concurrent asyncio requests stay apart
+        self._current = ContextVar('tracker', default=None)
+        self._lock = Lock()
+        self._requests = defaultdict(int)
+        self._seconds = defaultdict(float)
+        self._buckets = defaultdict(lambda: [0] * len(LATENCY_BUCKETS))
+        self._sql_statements = defaultdict(int)
+        self._sql_seconds = defaultdict(float)
+        self._commits = defaultdict(int)
+        self._collectors = []
+
+    @contextmanager
+    def track(self, command):
+        """Attribute the wall time and SQL run inside the block to a command"""
+        tracker = Tracker(command)
+        token = self._current.set(tracker)
+        try:
+            yield tracker
+        finally:
+            self._current.reset(token)
+            self.observe(tracker, time.perf_counter() - tracker.started)
+
+    def observe(self, tracker, seconds):
+        command = tracker.command
+        with self._lock:
+            self._requests[command] += 1
+            self._seconds[command] += seconds
+            buckets = self._buckets[command]
+            for i, bound in enumerate(LATENCY_BUCKETS):
+                if seconds <= bound:
+                    buckets[i] += 1
+            self._sql_statements[command] += tracker.sql_statements
+            self._sql_seconds[command] += tracker.sql_seconds
+            self._commits[command] += tracker.commits
+
+        if self.slow_request_seconds is not None and seconds >= self.slow_request_seconds:
+            logger.warning(
+                'Slow %s request: %.3fs, %d SQL statements in %.3fs\n%s',
+                command, seconds, tracker.sql_statements, tracker.sql_seconds,
+                '\n'.join(tracker.statements)
+            )
+
+    def before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if self._current.get() is not None:
+            conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+    def after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        tracker = self._current.get()
+        if tracker is None or not conn.info.get('query_started'):
+            return
+        elapsed = time.perf_counter() - conn.info['query_started'].pop()
+        tracker.sql_statements += 1
+        tracker.sql_seconds += elapsed
+        if len(tracker.statements) < MAX_LOGGED_STATEMENTS:
+            tracker.statements.append(f'  [{elapsed * 1000:.2f}ms] {statement}')
+
+    def commit(self, conn):
+        tracker = self._current.get()
+        if tracker is not None:
+            tracker.commits += 1
+
+    def register_collector(self, collector):
+        """Add a callable returning extra rendered metric lines; usable as a decorator"""
+        self._collectors.append(collector)
+        return collector
+
+    def render(self):
+        with self._lock:
+            commands = sorted(self._requests)
+            lines = family(
+                'penzi_sms_requests_total', 'counter', 'SMS messages handled, by command',
+                [({'command': c}, self._requests[c]) for c in commands]
+            )
+            lines += histogram_header('penzi_sms_request_seconds', 'Wall time handling an SMS, by command')
+            for c in commands:
+                for bound, count in zip(LATENCY_BUCKETS, self._buckets[c]):
+                    lines.append(sample('penzi_sms_request_seconds_bucket', {'command': c, 'le': bound}, count))
+                lines.append(sample('penzi_sms_request_seconds_bucket', {'command': c, 'le': '+Inf'}, self._requests[c]))
+                lines.append(sample('penzi_sms_request_seconds_sum', {'command': c}, self._seconds[c]))
+                lines.append(sample('penzi_sms_request_seconds_count', {'command': c}, self._requests[c]))
+            lines += family(
+                'penzi_sms_sql_statements_total', 'counter', 'SQL statements run while handling SMS, by command',
+                [({'command': c}, self._sql_statements[c]) for c in commands]
+            )
+            lines += family(
+                'penzi_sms_sql_seconds_total', 'counter', 'Time spent in SQL while handling SMS, by command',
+                [({'command': c}, self._sql_seconds[c]) for c in commands]
+            )
+            lines += family(
+                'penzi_sms_commits_total', 'counter', 'Database commits while handling SMS, by command',
+                [({'command': c}, self._commits[c]) for c in commands]
+            )
+
+        for collector in self._collectors:
+            lines += collector()
+        return '\n'.join(lines) + '\n'
+
+
+def sample(name, labels, value):
+    if labels:
+        rendered = ','.join(f'{key}="{label}"' for key, label in labels.items())
+        return f'{name}{{{rendered}}} {value}'
+    return f'{name} {value}'
+
+
+def family(name, kind, help_text, samples):
+    """Render a metric family from (labels, value) pairs"""
+    lines = [f'# HELP {name} {help_text}', f'# TYPE {name} {kind}']
+    lines += [sample(name, labels, value) for labels, value in samples]
+    return lines
+
+
+def histogram_header(name, help_text):
+    return [f'# HELP {name} {help_text}', f'# TYPE {name} histogram']
+
+
+metrics = Metrics(slow_request_seconds=app.config['SLOW_REQUEST_SECONDS'])
+
+event.listen(Engine, 'before_cursor_execute', metrics.before_cursor_execute)
+event.listen(Engine, 'after_cursor_execute', metrics.after_cursor_execute)
+event.listen(Engine, 'commit', metrics.commit)
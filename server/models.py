@@ -1,10 +1,13 @@
 from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy import Enum
+from sqlalchemy import DDL, Enum, event, tuple_
 from datetime import datetime
 from config import db
 
 class User(db.Model):
     __tablename__ = 'users'
+    __table_args__ = (
+        db.Index('ix_users_gender_town_age', 'gender', 'town', 'age'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(50), nullable=False)
@@ -17,6 +20,7 @@ class User(db.Model):
         Enum('basic', 'details', 'completed', name='registration_stage'),
         default='basic'
     )
+    language = db.Column(db.String(5), nullable=False, default='en', server_default='en')
     created_at = db.Column(db.DateTime, default=datetime.now)
     updated_at = db.Column(db.DateTime, default=datetime.now, onupdate=datetime.now)
 
@@ -50,15 +54,22 @@ class UserDetail(db.Model):
 
 class MatchRequest(db.Model):
     __tablename__ = 'match_requests'
+    __table_args__ = (
+        db.Index('ix_match_requests_user_id_is_active_created_at', 'user_id', 'is_active', 'created_at'),
+    )
 
     match_request_id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    mode = db.Column(Enum('eager', 'lazy', name='match_mode'), default='eager')
+    matched_gender = db.Column(Enum('male', 'female', name='gender_status'))
     age_range_start = db.Column(db.Integer)
     age_range_end = db.Column(db.Integer)
     town = db.Column(db.String(50))
     total_matches = db.Column(db.Integer, default=0)
     current_offset = db.Column(db.Integer, default=0)
     matches_per_page = db.Column(db.Integer, default=3)
+    cursor_age = db.Column(db.Integer)
+    cursor_user_id = db.Column(db.Integer)
     is_active = db.Column(db.Boolean, default=True)
     created_at = db.Column(db.DateTime, default=datetime.now)
     updated_at = db.Column(db.DateTime, default=datetime.now, onupdate=datetime.now)
@@ -68,9 +79,26 @@ class MatchRequest(db.Model):
     def has_more_matches(self):
         return self.current_offset < self.total_matches
 
-    def advance_pagination(self):
+    def advance_pagination(self, last_match=None):
         self.current_offset += self.matches_per_page
-        db.session.commit()
+        if last_match is not None:
+            self.cursor_age = last_match.age
+            self.cursor_user_id = last_match.id
+
+    def next_page(self):
+        """Query the page after the cursor from the stored criteria, in (age, id) order"""
+        query = User.query.filter(
+            User.gender == self.matched_gender,
+            User.age >= self.age_range_start,
+            User.age <= self.age_range_end,
+            User.town == self.town,
+            User.id != self.user_id
+        )
+        if self.cursor_user_id is not None:
+            query = query.filter(
+                tuple_(User.age, User.id) > tuple_(self.cursor_age, self.cursor_user_id)
+            )
+        return query.order_by(User.age, User.id).limit(self.matches_per_page)
 
     def __repr__(self):
         return f'<MatchRequest {self.match_request_id} by User {self.user_id}>'
@@ -78,6 +106,9 @@ class MatchRequest(db.Model):
 
 class ProfileMatch(db.Model):
     __tablename__ = 'profile_match'
+    __table_args__ = (
+        db.Index('ix_profile_match_match_request_id_position', 'match_request_id', 'position'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     match_request_id = db.Column(db.Integer, db.ForeignKey('match_requests.match_request_id'), nullable=False)
@@ -94,6 +125,9 @@ class ProfileMatch(db.Model):
 
 class Message(db.Model):
     __tablename__ = 'messages'
+    __table_args__ = (
+        db.Index('ix_messages_recipient_id', 'recipient_id'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     sender_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
@@ -104,3 +138,51 @@ class Message(db.Model):
 
     def __repr__(self):
         return f'<Message {self.id} from {self.sender_id} to {self.recipient_id}>'
+
+
+class Interest(db.Model):
+    __tablename__ = 'interests'
+    __table_args__ = (
+        db.Index('ix_interests_requested_id_status_created_at', 'requested_id', 'status', 'created_at', 'id'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    requester_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    requested_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    status = db.Column(Enum('pending', 'confirmed', name='interest_status'), nullable=False, default='pending')
+    created_at = db.Column(db.DateTime, default=datetime.now)
+
+    requester = db.relationship('User', foreign_keys=[requester_id])
+
+    def __repr__(self):
+        return f'<Interest {self.id} of User {self.requester_id} in User {self.requested_id} - {self.status}>'
+
+
+class MessageArchive(db.Model):
+    __tablename__ = 'messages_archive'
+    __table_args__ = (
+        db.Index('ix_messages_archive_recipient_id', 'recipient_id'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    sender_id = db.Column(db.Integer, nullable=False)
+    recipient_id = db.Column(db.Integer, nullable=False)
+    phone_number = db.Column(db.String(15))
+    content = db.Column(db.Text)
+    timestamp = db.Column(db.DateTime)
+    archived_at = db.Column(db.DateTime, default=datetime.now)
+
+    def __repr__(self):
+        return f'<MessageArchive {self.id} from {self.sender_id} to {self.recipient_id}>'
+
+
+class UserIdSequence(db.Model):
+    """The last user id sequence number handed out on this database, in its one row"""
+    __tablename__ = 'user_id_sequence'
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    last = db.Column(db.Integer, nullable=False)
+
+
+# A new database counts from zero; the migration adding the table counts from the existing users
+event.listen(UserIdSequence.__table__, 'after_create', DDL('INSERT INTO user_id_sequence (id, last) VALUES (1, 0)'))
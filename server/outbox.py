@@ -0,0 +1,217 @@
+# Standard library imports
+import json
+import logging
+import queue
+import time
+from collections import deque
+from threading import Lock, Thread
+
+# Local imports
+from commit_hooks import Staged
+from config import app, blocking, db
+from models import Message
+
+logger = logging.getLogger(__name__)
+
+
+class LoopbackSender:
+    """Keeps sent notifications in memory, for tests and local runs"""
+
+    def __init__(self, maxlen=10000):
+        self.sent = deque(maxlen=maxlen)
+
+    def send(self, notifications):
+        self.sent.extend(notifications)
+
+
+class FileSender:
+    """Appends sent notifications to a JSON lines file"""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = Lock()
+
+    def send(self, notifications):
+        lines = ''.join(json.dumps(notification) + '\n' for notification in notifications)
+        with self._lock, open(self.path, 'a') as f:
+            f.write(lines)
+
+
+class Outbox:
+    """Bounded queue of outbound notifications, flushed in batches by a worker pool.
+
+    Each batch is written to `messages` in one bulk insert and then handed to the
+    sender. Both steps are retried with exponential backoff. When the queue is
+    full, enqueue blocks for at most `enqueue_timeout` seconds and then returns
+    False, so the caller can fall back to writing the message itself.
+
+    Handlers stage notifications on their session; they are enqueued only once
+    that transaction commits, so a rolled back request sends nothing.
+    """
+
+    def __init__(self, app, sender, maxsize=10000, batch_size=100, workers=2,
+                 flush_interval=0.05, max_retries=3, retry_backoff=0.1, enqueue_timeout=0.5):
+        self.app = app
+        self.sender = sender
+        self.batch_size = batch_size
+        self.workers = workers
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.enqueue_timeout = enqueue_timeout
+
+        self._queue = queue.Queue(maxsize=maxsize)
+        self._threads = []
+        self._lock = Lock()
+        self._counters = {
+            'enqueued': 0, 'rejected': 0, 'flushed': 0,
+            'failed': 0, 'retries': 0, 'batches': 0,
+        }
+        self._flush_seconds_total = 0.0
+        self._flush_seconds_max = 0.0
+
+    def start(self):
+        with self._lock:
+            if self._threads:
+                return
+            for i in range(self.workers):
+                thread = Thread(target=self._run, name=f'outbox-{i}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def stop(self):
+        """Flush what is queued and stop the workers"""
+        with self._lock:
+            threads, self._threads = self._threads, []
+        for _ in threads:
+            self._queue.put(None)
+        for thread in threads:
+            thread.join()
+
+    def stage(self, notification):
+        """Enqueue a notification when the current transaction commits"""
+        staged_notifications.add(db.session(), notification)
+
+    def enqueue(self, notification):
+        """Queue a notification dict with sender_id, recipient_id, phone_number and content"""
+        self.start()
+        try:
+            self._queue.put(notification, timeout=self.enqueue_timeout)
+        except queue.Full:
+            self._count('rejected')
+            return False
+        self._count('enqueued')
+        return True
+
+    def enqueue_nowait(self, notification):
+        """Queue a notification only if there is room right now; return False otherwise"""
+        self.start()
+        try:
+            self._queue.put_nowait(notification)
+        except queue.Full:
+            return False
+        self._count('enqueued')
+        return True
+
+    def deliver(self, notification):
+        """Queue a notification, or under backpressure write and send it in this thread"""
+        if not self.enqueue(notification):
+            self._flush([notification])
+
+    def join(self):
+        """Block until every queued notification has been flushed or dropped"""
+        self._queue.join()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+            stats['depth'] = self._queue.qsize()
+            stats['flush_seconds_total'] = self._flush_seconds_total
+            stats['flush_seconds_max'] = self._flush_seconds_max
+        return stats
+
+    def _count(self, counter, amount=1):
+        with self._lock:
+            self._counters[counter] += amount
+
+    def _run(self):
+        running = True
+        while running:
+            batch = []
+            try:
+                item = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                continue
+
+            while True:
+                if item is None:
+                    running = False
+                else:
+                    batch.append(item)
+                if not running or len(batch) >= self.batch_size:
+                    break
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+
+            if batch:
+                self._flush(batch)
+            for _ in range(len(batch) + (not running)):
+                self._queue.task_done()
+
+    def _flush(self, batch):
+        started = time.perf_counter()
+        delivered = self._retry(self._write, batch) and self._retry(self.sender.send, batch)
+        elapsed = time.perf_counter() - started
+
+        with self._lock:
+            self._counters['batches'] += 1
+            self._counters['flushed' if delivered else 'failed'] += len(batch)
+            self._flush_seconds_total += elapsed
+            self._flush_seconds_max = max(self._flush_seconds_max, elapsed)
+
+    def _write(self, batch):
+        with self.app.app_context():
+            try:
+                db.session().bulk_insert(Message, batch, 'recipient_id')
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                raise
+
+    def _retry(self, step, batch):
+        for attempt in range(self.max_retries + 1):
+            try:
+                step(batch)
+                return True
+            except Exception:
+                if attempt == self.max_retries:
+                    logger.exception('Outbox dropped %d notifications', len(batch))
+                    return False
+                self._count('retries')
+                time.sleep(self.retry_backoff * 2 ** attempt)
+
+
+def make_sender(config):
+    if config['OUTBOX_SENDER'] == 'file':
+        return FileSender(config['OUTBOX_FILE'])
+    return LoopbackSender()
+
+
+outbox = Outbox(
+    app,
+    make_sender(app.config),
+    maxsize=app.config['OUTBOX_MAX_SIZE'],
+    batch_size=app.config['OUTBOX_BATCH_SIZE'],
+    workers=app.config['OUTBOX_WORKERS'],
+)
+
+
+def enqueue_notifications(session, notifications):
+    for notification in notifications:
+        if not outbox.enqueue_nowait(notification):
+            blocking(session, outbox.deliver, notification)
+
+
+staged_notifications = Staged(enqueue_notifications)
@@ -0,0 +1,91 @@
+# Standard library imports
+import sys
+from dataclasses import dataclass
+from threading import Lock
+
+# Local imports
+from cache import LRUCache
+from commit_hooks import Staged, on_user_write
+from config import app
+from templates import current_language, locales
+
+# Replies cached per profile: the phone number lookup and DESCRIBE
+VIEWS = ('profile', 'describe')
+
+# Rough bytes per entry besides its strings: the LRU node, key and entry tuples, and the Subject
+ENTRY_OVERHEAD = 400
+
+
+@dataclass(frozen=True)
+class Subject:
+    """The columns of a viewed user that the interest notification needs"""
+    id: int
+    name: str
+    phone_number: str
+    language: str
+
+
+def weigh(key, value):
+    reply, subject = value
+    return ENTRY_OVERHEAD + sys.getsizeof(reply) + sys.getsizeof(subject.name) + sys.getsizeof(key[0])
+
+
+class ProfileCache:
+    """Rendered profile and DESCRIBE replies, keyed by phone number, view and reply language.
+
+    Each entry holds the reply as its handler rendered it, with the Subject the
+    interest notification is addressed to, so a hit needs neither the user nor
+    their details. Entries are evicted least recently used first once their
+    approximate size passes `max_bytes`, and are dropped when the user or
+    their details are written.
+    """
+
+    def __init__(self, max_bytes, ttl=None):
+        self.cache = LRUCache(max_bytes, ttl=ttl, weigh=weigh)
+        self.invalidations = 0
+        self._lock = Lock()
+
+    def get(self, phone_number, view):
+        """(reply, Subject) for the phone number in the current language, or None"""
+        return self.cache.get((phone_number, view, current_language.get()))
+
+    def set(self, phone_number, view, reply, user):
+        """Cache a reply rendered for user in the current language; return its Subject"""
+        subject = Subject(user.id, user.name, user.phone_number, user.language)
+        self.cache.set((phone_number, view, current_language.get()), (reply, subject))
+        return subject
+
+    def invalidate(self, phone_number):
+        # Replies rendered outside speaking() are keyed under None
+        for view in VIEWS:
+            for language in (None, *locales.languages):
+                self.cache.delete((phone_number, view, language))
+        with self._lock:
+            self.invalidations += 1
+
+    def stats(self):
+        stats = self.cache.stats()
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_ratio'] = stats['hits'] / lookups if lookups else 0.0
+        with self._lock:
+            stats['invalidations'] = self.invalidations
+        return stats
+
+
+profile_cache = ProfileCache(app.config['PROFILE_CACHE_BYTES'], ttl=app.config['PROFILE_CACHE_TTL'])
+
+
+def drop_profiles(session, phone_numbers):
+    for phone_number in phone_numbers:
+        profile_cache.invalidate(phone_number)
+
+
+# A lookup between the flush and the end of the transaction may have cached uncommitted values
+stale_profiles = Staged(drop_profiles, drop_profiles)
+
+
+@on_user_write
+def drop_written_profile(session, write):
+    """Drop a written user's profiles now, and again once their transaction ends"""
+    profile_cache.invalidate(write.phone_number)
+    stale_profiles.add(session, write.phone_number)
@@ -0,0 +1,98 @@
+# Standard library imports
+from datetime import datetime
+
+# Local imports
+from config import app
+
+# Education levels from lowest to highest, as stored by handle_details
+EDUCATION_LEVELS = ['Primary', 'Secondary', 'Certificate', 'Diploma', 'Degree', 'Masters', 'Phd']
+
+MARITAL_SCORES = {'single': 1.0, 'divorced': 0.6, 'married': 0.0}
+COMPLETENESS_SCORES = {'basic': 0.0, 'details': 0.5, 'completed': 1.0}
+
+# Sort key layout: score (to 1e-4) above an 8-bit age above a 32-bit id
+SCORE_SCALE = 10000
+ID_BITS = 32
+ID_MASK = (1 << ID_BITS) - 1
+SCORE_SHIFT = ID_BITS + 8
+
+DEFAULT_WEIGHTS = {
+    'education': 3.0,
+    'religion': 3.0,
+    'marital': 2.0,
+    'completeness': 2.0,
+    'ethnicity': 1.0,
+    'recency': 1.0,
+}
+
+
+class Ranker:
+    """Scores match candidates against the requester's details and orders them best first.
+
+    Candidates are plain column rows, so ranking never builds ORM objects. Every
+    attribute score is turned into a lookup table for the requester up front and
+    recency is computed once per distinct day, leaving one pass of dict lookups
+    and an integer sort per ranking. Ties keep the (age, id) order of unranked
+    matches.
+    """
+
+    def __init__(self, weights=None, recency_half_life_days=30):
+        self.weights = {**DEFAULT_WEIGHTS, **(weights or {})}
+        self.half_life_days = recency_half_life_days
+
+    def tables(self, detail):
+        """Per-value score tables for one requester, weights already applied"""
+        w = self.weights
+        education = religion = ethnicity = {}
+        if detail is not None:
+            level = (detail.education_level or '').title()
+            if level in EDUCATION_LEVELS:
+                rank, steps = EDUCATION_LEVELS.index(level), len(EDUCATION_LEVELS) - 1
+                education = {
+                    other: w['education'] * (1 - abs(rank - i) / steps)
+                    for i, other in enumerate(EDUCATION_LEVELS)
+                }
+            if detail.religion:
+                religion = {detail.religion.title(): w['religion']}
+            if detail.ethnicity:
+                ethnicity = {detail.ethnicity.title(): w['ethnicity']}
+        marital = {status: w['marital'] * score for status, score in MARITAL_SCORES.items()}
+        completeness = {level: w['completeness'] * score for level, score in COMPLETENESS_SCORES.items()}
+        return education, religion, ethnicity, marital, completeness
+
+    def rank(self, detail, rows, now=None):
+        """Return candidate ids best first.
+
+        `rows` are (id, age, registration_level, updated_at, education_level,
+        religion, marital_status, ethnicity) tuples and `detail` is the
+        requester's UserDetail, or None.
+        """
+        education, religion, ethnicity, marital, completeness = self.tables(detail)
+        today = (now or datetime.now()).toordinal()
+        recency = {}
+
+        # One packed int per candidate sorts like (-score, age, id) at a fraction of a tuple sort
+        keys = []
+        for user_id, age, level, updated_at, edu, rel, status, eth in rows:
+            score = (
+                education.get(edu, 0.0) + religion.get(rel, 0.0) + ethnicity.get(eth, 0.0)
+                + marital.get(status, 0.0) + completeness.get(level, 0.0)
+            )
+            if updated_at is not None:
+                day = updated_at.toordinal()
+                if day not in recency:
+                    recency[day] = self.recency(today - day)
+                score += recency[day]
+            keys.append((-int(score * SCORE_SCALE) << SCORE_SHIFT) | (age << ID_BITS) | user_id)
+
+        keys.sort()
+        return [key & ID_MASK for key in keys]
+
+    def recency(self, days):
+        """Weighted score for a profile last updated `days` ago, halving every half-life"""
+        return self.weights['recency'] * 0.5 ** (max(days, 0) / self.half_life_days)
+
+ranker = Ranker(
+    weights=app.config['MATCH_RANKING_WEIGHTS'],
+    recency_half_life_days=app.config['MATCH_RANKING_HALF_LIFE_DAYS']
+)
@@ -0,0 +1,95 @@
+# Standard library imports
+import math
+import time
+from threading import Lock
+
+# Local imports
+from cache import LRUCache
+from config import app
+from redis_store import RedisStore, connect
+
+# Refill a bucket for the time since it was last touched, then take one token if there is one.
+# Returns {allowed, seconds until the next token}.
+TAKE_SCRIPT = """
+local capacity, rate, now = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3])
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'at')
+local tokens = math.min(capacity, (tonumber(bucket[1]) or capacity) + (now - (tonumber(bucket[2]) or now)) * rate)
+local allowed = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+    allowed = 1
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'at', now)
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+return {allowed, tostring((1 - math.min(tokens, 1)) / rate)}
+"""
+
+
+class MemoryBackend:
+    """Per-process token buckets, least recently used senders evicted past `maxsize`"""
+
+    def __init__(self, maxsize):
+        self.buckets = LRUCache(maxsize)
+        self._lock = Lock()
+
+    def take(self, key, capacity, rate, now):
+        with self._lock:
+            tokens, at = self.buckets.get(key) or (capacity, now)
+            tokens = min(capacity, tokens + (now - at) * rate)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            self.buckets.set(key, (tokens, now))
+        return allowed, (1 - min(tokens, 1)) / rate
+
+
+class RedisBackend(RedisStore):
+    """Token buckets shared by every worker, updated atomically by a server-side script"""
+
+    def __init__(self, client):
+        super().__init__(client, 'penzi:rate:')
+        self.script = self.client.register_script(TAKE_SCRIPT)
+
+    def take(self, key, capacity, rate, now):
+        allowed, wait = self.script(keys=[self.prefix + key], args=[capacity, rate, now])
+        return bool(allowed), float(wait)
+
+
+class RateLimiter:
+    """Token buckets per sender and command keyword.
+
+    Each command has a budget of (burst, messages per minute): a sender may
+    send `burst` messages of that command at once, then one more every
+    60 / per_minute seconds. Commands without a budget use the 'default' one.
+    """
+
+    def __init__(self, backend, budgets):
+        self.backend = backend
+        self.budgets = budgets
+        self.allowed = 0
+        self.throttled = {}
+        self._lock = Lock()
+
+    def check(self, phone_number, command):
+        """Take a token for one message; return 0 if it may run, else whole seconds until it may"""
+        burst, per_minute = self.budgets.get(command) or self.budgets['default']
+        allowed, wait = self.backend.take(f'{command}|{phone_number}', burst, per_minute / 60, time.time())
+        with self._lock:
+            if allowed:
+                self.allowed += 1
+            else:
+                self.throttled[command] = self.throttled.get(command, 0) + 1
+        return 0 if allowed else max(math.ceil(wait), 1)
+
+    def stats(self):
+        with self._lock:
+            return {'allowed': self.allowed, 'throttled': dict(self.throttled)}
+
+
+def make_backend(config):
+    if config['RATE_LIMIT_BACKEND'] == 'redis':
+        return RedisBackend(connect(config['RATE_LIMIT_URL']))
+    return MemoryBackend(config['RATE_LIMIT_SENDERS'])
+
+
+rate_limiter = RateLimiter(make_backend(app.config), app.config['RATE_LIMITS'])
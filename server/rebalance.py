@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+
+# Standard library imports
+import argparse
+from collections import Counter
+
+# Remote library imports
+from sqlalchemy import delete, func, insert, select
+
+# Local imports
+from config import app, db
+from models import Interest, MatchRequest, Message, MessageArchive, ProfileMatch, User, UserDetail
+from sharding import advance_sequence, routing
+
+users = User.__table__
+details = UserDetail.__table__
+requests = MatchRequest.__table__
+profile_matches = ProfileMatch.__table__
+messages = Message.__table__
+archive = MessageArchive.__table__
+interests = Interest.__table__
+
+
+def plan(routes, moves=None):
+    """The new slot -> shard map: the given moves, or the fewest moves that even out every shard"""
+    new_routes = list(routes)
+    if not moves:
+        counts = Counter({shard: 0 for shard in routing.names})
+        counts.update(routes)
+        # The first `extra` shards take one slot more than the rest
+        base, extra = divmod(len(routes), len(routing.names))
+        quota = {shard: base + (i < extra) for i, shard in enumerate(routing.names)}
+        under = [shard for shard in routing.names for _ in range(max(quota[shard] - counts[shard], 0))]
+        for slot, shard in enumerate(routes):
+            if under and counts[shard] > quota[shard]:
+                counts[shard] -= 1
+                new_routes[slot] = under.pop()
+        return new_routes
+    for slot, shard in moves:
+        if shard not in routing.names:
+            raise SystemExit(f'Unknown shard {shard}; shards are {", ".join(routing.names)}')
+        new_routes[slot] = shard
+    return new_routes
+
+
+def move_slot(slot, source, target):
+    """Copy every row owned by a slot's users from source to target, then delete it from source.
+
+    Users keep their ids, which encode the slot. Everything else gets a new id
+    on the target, with ProfileMatch rows following their match request. The
+    copy commits before the delete, so a failure in between leaves the rows on
+    both shards and the map unchanged; nothing should write to the slot while
+    it moves.
+    """
+    with routing.engines[source].connect() as src, routing.engines[target].begin() as dst:
+        moved_users = src.execute(select(users).where(users.c.id % routing.slots == slot)).mappings().all()
+        if not moved_users:
+            return 0
+        ids = [row['id'] for row in moved_users]
+
+        def owned(table, column):
+            return [
+                {key: value for key, value in row.items() if key != 'id'}
+                for row in src.execute(select(table).where(table.c[column].in_(ids))).mappings()
+            ]
+
+        dst.execute(insert(users), [dict(row) for row in moved_users])
+        # New users of the slot now count on the target, so it must count past the ones moved in
+        advance_sequence(dst, max(ids) // routing.slots)
+        if rows := owned(details, 'user_id'):
+            dst.execute(insert(details), rows)
+        if rows := owned(messages, 'recipient_id'):
+            dst.execute(insert(messages), rows)
+        if rows := owned(interests, 'requested_id'):
+            dst.execute(insert(interests), rows)
+
+        # Archive ids are copied from messages, so make room above the target's largest
+        if rows := owned(archive, 'recipient_id'):
+            next_id = (dst.execute(select(func.max(archive.c.id))).scalar() or 0) + 1
+            dst.execute(insert(archive), [dict(row, id=next_id + i) for i, row in enumerate(rows)])
+
+        request_ids = {}
+        for row in src.execute(select(requests).where(requests.c.user_id.in_(ids))).mappings():
+            values = {key: value for key, value in row.items() if key != 'match_request_id'}
+            request_ids[row['match_request_id']] = dst.execute(insert(requests), values).inserted_primary_key[0]
+        if request_ids:
+            rows = [
+                dict({key: value for key, value in row.items() if key != 'id'},
+                     match_request_id=request_ids[row['match_request_id']])
+                for row in src.execute(
+                    select(profile_matches).where(profile_matches.c.match_request_id.in_(list(request_ids)))
+                ).mappings()
+            ]
+            if rows:
+                dst.execute(insert(profile_matches), rows)
+
+    with routing.engines[source].begin() as src:
+        if request_ids:
+            src.execute(delete(profile_matches).where(profile_matches.c.match_request_id.in_(list(request_ids))))
+        src.execute(delete(requests).where(requests.c.user_id.in_(ids)))
+        src.execute(delete(archive).where(archive.c.recipient_id.in_(ids)))
+        src.execute(delete(messages).where(messages.c.recipient_id.in_(ids)))
+        src.execute(delete(interests).where(interests.c.requested_id.in_(ids)))
+        src.execute(delete(details).where(details.c.user_id.in_(ids)))
+        src.execute(delete(users).where(users.c.id.in_(ids)))
+    return len(ids)
+
+
+def rebalance(new_routes, dry_run=False):
+    """Move every slot whose shard changes and save the new map; return the users moved"""
+    moves = [(slot, old, new) for slot, (old, new) in enumerate(zip(routing.routes, new_routes)) if old != new]
+    print(f'{len(moves)} of {routing.slots} slots move')
+    if dry_run:
+        for (source, target), count in sorted(Counter((old, new) for _, old, new in moves).items()):
+            print(f'  {source} -> {target}: {count} slots')
+        return 0
+
+    moved = 0
+    for done, (slot, source, target) in enumerate(moves, 1):
+        moved += move_slot(slot, source, target)
+        # Save as we go, so the map always matches where the moved slots now live
+        routing.save_map(routing.routes[:slot] + [target] + routing.routes[slot + 1:])
+        if done % 16 == 0 or done == len(moves):
+            print(f'  {done}/{len(moves)} slots, {moved} users moved')
+    return moved
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Move user slots between SHARDS and rewrite the shard map')
+    parser.add_argument('--move', nargs=2, action='append', metavar=('SLOT', 'SHARD'),
+                        help='move one slot to a shard (shard0, shard1, ...); may be repeated. '
+                             'Without --move, just enough slots move to even out every shard')
+    parser.add_argument('--dry-run', action='store_true', help='print the moves without making them')
+    args = parser.parse_args()
+
+    if routing is None:
+        raise SystemExit('Set SHARDS to the shard database URIs to rebalance')
+    moves = [(int(slot) % routing.slots, shard) for slot, shard in args.move or []]
+    with app.app_context():
+        routing.create_all(db.metadata)
+        moved = rebalance(plan(routing.routes, moves), dry_run=args.dry_run)
+    if moved:
+        print(f'Restart the app so every process routes with {routing.map_file}')
@@ -0,0 +1,38 @@
+# Standard library imports
+import pickle
+
+# Remote library imports
+import redis
+
+
+def connect(url):
+    """A client for the Redis-compatible server at url"""
+    return redis.Redis.from_url(url)
+
+
+class RedisStore:
+    """Pickled values shared by every worker through a Redis-compatible server.
+
+    Keys live under `prefix` and expire `ttl` seconds after they are set, if
+    given; eviction is left to the server's maxmemory policy (allkeys-lru).
+    The dedup window, match cache and rate limiter backends all build on it.
+    """
+
+    def __init__(self, client, prefix, ttl=None):
+        self.client = client
+        self.prefix = prefix
+        self.ttl = ttl
+
+    def get(self, key):
+        value = self.client.get(self.prefix + key)
+        return pickle.loads(value) if value is not None else None
+
+    def set(self, key, value):
+        self.client.set(self.prefix + key, pickle.dumps(value), ex=self.ttl)
+
+    def add(self, key, value):
+        """Set `key` only if it holds no value; return True when it was set"""
+        return bool(self.client.set(self.prefix + key, pickle.dumps(value), ex=self.ttl, nx=True))
+
+    def delete(self, key):
+        self.client.delete(self.prefix + key)
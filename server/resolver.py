@@ -0,0 +1,106 @@
+# Remote library imports
+from sqlalchemy import inspect
+from sqlalchemy.orm import joinedload, make_transient_to_detached
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlalchemy.orm.util import identity_key
+
+# Local imports
+from cache import LRUCache
+from commit_hooks import Staged, on_user_write
+from config import app, db
+from models import User, UserDetail
+
+
+def snapshot(instance):
+    """Copy the column values of a loaded instance"""
+    return {attr.key: getattr(instance, attr.key) for attr in inspect(instance).mapper.column_attrs}
+
+
+class UserResolver:
+    """Resolves phone numbers to users with their details, through an in-process LRU cache.
+
+    The cache holds plain column snapshots rather than ORM instances, so nothing
+    leaks between sessions. A hit is re-attached to the current session as a
+    persistent object without touching the database. Writes in this process drop
+    entries at once; the TTL bounds how long another worker's writes go unseen.
+    """
+
+    def __init__(self, maxsize=1024, ttl=None):
+        self.cache = LRUCache(maxsize, ttl=ttl)
+
+    def resolve(self, phone_number):
+        """Return the registered user for a phone number, or None"""
+        cached = self.cache.get(phone_number)
+        if cached is not None:
+            return self.attach(*cached)
+
+        user = User.query.options(joinedload(User.details)).filter_by(phone_number=phone_number).first()
+        if user:
+            self.cache.set(phone_number, (snapshot(user), user.details and snapshot(user.details)))
+        return user
+
+    def resolve_many(self, phone_numbers):
+        """Return {phone_number: user} for the registered phone numbers, with one IN query for misses"""
+        users = {}
+        misses = []
+        for phone_number in phone_numbers:
+            cached = self.cache.get(phone_number)
+            if cached is not None:
+                users[phone_number] = self.attach(*cached)
+            else:
+                misses.append(phone_number)
+
+        if misses:
+            for user in User.query.options(joinedload(User.details)).filter(User.phone_number.in_(misses)):
+                self.cache.set(user.phone_number, (snapshot(user), user.details and snapshot(user.details)))
+                users[user.phone_number] = user
+        return users
+
+    def invalidate(self, phone_number):
+        self.cache.delete(phone_number)
+
+    def attach(self, user_values, detail_values):
+        """Rebuild a cached user in the current session without a query"""
+        # Sharded identities also carry the shard the row was loaded from
+        shard = db.session().user_shard(user_values['id'])
+        user_key = identity_key(User, user_values['id'], identity_token=shard)
+        existing = db.session.identity_map.get(user_key)
+        if existing is not None:
+            return existing
+
+        user = User(**user_values)
+        make_transient_to_detached(user)
+        inspect(user).key = user_key
+
+        details = None
+        if detail_values is not None:
+            detail_key = identity_key(UserDetail, detail_values['id'], identity_token=shard)
+            details = db.session.identity_map.get(detail_key)
+            if details is None:
+                details = UserDetail(**detail_values)
+                make_transient_to_detached(details)
+                inspect(details).key = detail_key
+                set_committed_value(details, 'user', user)
+        set_committed_value(user, 'details', details)
+
+        db.session.add(user)
+        return user
+
+
+user_resolver = UserResolver(maxsize=app.config['USER_CACHE_SIZE'], ttl=app.config['USER_CACHE_TTL'])
+
+
+def drop_users(session, phone_numbers):
+    for phone_number in phone_numbers:
+        user_resolver.invalidate(phone_number)
+
+
+# A resolve between the flush and the end of the transaction may have cached uncommitted values
+stale_users = Staged(drop_users, drop_users)
+
+
+@on_user_write
+def drop_written_user(session, write):
+    """Drop a written user now, and again once their transaction ends"""
+    user_resolver.invalidate(write.phone_number)
+    stale_users.add(session, write.phone_number)
@@ -1,4 +1,139 @@
 #!/usr/bin/env python3
 
 # Standard library imports
-from random import randint, choice as rc
+import argparse
+from random import Random
+
+# Remote library imports
+from faker import Faker
+
+# Local imports
+from app import app
+from bulk import insert_chunk
+from models import db
+
+# County -> (population weight, {town: weight})
+COUNTIES = {
+    'Nairobi': (44, {'Nairobi': 40, 'Westlands': 15, 'Kasarani': 15, 'Embakasi': 20, 'Langata': 10}),
+    'Mombasa': (12, {'Mombasa': 60, 'Nyali': 20, 'Likoni': 20}),
+    'Kiambu': (12, {'Thika': 40, 'Ruiru': 30, 'Kikuyu': 15, 'Kiambu': 15}),
+    'Nakuru': (10, {'Nakuru': 70, 'Naivasha': 30}),
+    'Kisumu': (8, {'Kisumu': 85, 'Maseno': 15}),
+    'Uasin Gishu': (6, {'Eldoret': 100}),
+    'Machakos': (5, {'Machakos': 60, 'Athi River': 40}),
+    'Kajiado': (5, {'Kitengela': 50, 'Ngong': 35, 'Kajiado': 15}),
+    'Kilifi': (4, {'Malindi': 50, 'Kilifi': 50}),
+    'Kakamega': (4, {'Kakamega': 100}),
+    'Nyeri': (3, {'Nyeri': 100}),
+    'Meru': (3, {'Meru': 100}),
+}
+
+EDUCATION_LEVELS = {'Primary': 10, 'Secondary': 30, 'Certificate': 15, 'Diploma': 20, 'Degree': 20, 'Masters': 5}
+PROFESSIONS = [
+    'Teacher', 'Driver', 'Nurse', 'Farmer', 'Accountant', 'Engineer', 'Trader', 'Mechanic',
+    'Doctor', 'Lawyer', 'Chef', 'Tailor', 'Banker', 'Police Officer', 'Developer', 'Student',
+]
+MARITAL_STATUSES = {'single': 75, 'divorced': 20, 'married': 5}
+RELIGIONS = {'Christian': 80, 'Muslim': 12, 'Hindu': 2, 'Traditional': 3, 'None': 3}
+ETHNICITIES = {
+    'Kikuyu': 17, 'Luhya': 14, 'Kalenjin': 13, 'Luo': 11, 'Kamba': 10, 'Kisii': 6,
+    'Mijikenda': 5, 'Meru': 4, 'Maasai': 2, 'Turkana': 2, 'Embu': 1, 'Taita': 1,
+}
+
+# Share of users who stopped after start#, after details#, or completed MYSELF
+REGISTRATION_LEVELS = {'basic': 20, 'details': 25, 'completed': 55}
+
+
+def weighted(rng, weights):
+    return rng.choices(list(weights), weights=list(weights.values()))[0]
+
+
+def random_location(rng):
+    """Pick a county by population, then a town within it"""
+    county = rng.choices(list(COUNTIES), weights=[weight for weight, towns in COUNTIES.values()])[0]
+    return county, weighted(rng, COUNTIES[county][1])
+
+
+def random_age(rng):
+    """Ages skew young, peaking in the mid twenties"""
+    return max(18, min(80, round(rng.triangular(18, 65, 25))))
+
+
+def generate_users(count, first_id=1, seed=None):
+    """Yield (user row, detail row or None) dicts for `count` users with consecutive ids"""
+    rng = Random(seed)
+    fake = Faker('en_KE')
+    fake.seed_instance(seed)
+    phone_numbers = rng.sample(range(10 ** 8), count)
+
+    for offset, phone_suffix in enumerate(phone_numbers):
+        user_id = first_id + offset
+        gender = rng.choice(['male', 'female'])
+        county, town = random_location(rng)
+        level = weighted(rng, REGISTRATION_LEVELS)
+        name = fake.first_name_male() if gender == 'male' else fake.first_name_female()
+
+        user = dict(
+            id=user_id,
+            name=name,
+            phone_number=f'07{phone_suffix:08d}',
+            age=random_age(rng),
+            gender=gender,
+            county=county,
+            town=town,
+            registration_level=level,
+        )
+
+        detail = None
+        if level != 'basic':
+            detail = dict(
+                user_id=user_id,
+                education_level=weighted(rng, EDUCATION_LEVELS),
+                profession=rng.choice(PROFESSIONS),
+                marital_status=weighted(rng, MARITAL_STATUSES),
+                religion=weighted(rng, RELIGIONS),
+                ethnicity=weighted(rng, ETHNICITIES),
+                self_description=fake.sentence(nb_words=8) if level == 'completed' else None,
+            )
+        yield user, detail
+
+
+def insert_generated(chunk):
+    """Give a chunk of generated (user, detail) rows newly reserved user ids, insert it and clear it"""
+    users, details = [], []
+    user_ids = db.session().new_user_ids([user['phone_number'] for user, detail in chunk])
+    for user_id, (user, detail) in zip(user_ids, chunk):
+        users.append(dict(user, id=user_id))
+        if detail:
+            details.append(dict(detail, user_id=user_id))
+    insert_chunk(users, details)
+    chunk.clear()
+
+
+def seed_users(count, seed=None, chunk_size=1000):
+    """Insert `count` generated users and their details in chunked bulk inserts"""
+    chunk = []
+    for user, detail in generate_users(count, seed=seed):
+        chunk.append((user, detail))
+        if len(chunk) >= chunk_size:
+            insert_generated(chunk)
+
+    insert_generated(chunk)
+    db.session.commit()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Seed the database with realistic users')
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--seed', type=int, default=None, help='random seed for a reproducible dataset')
+    parser.add_argument('--reset', action='store_true', help='drop and recreate all tables first')
+    args = parser.parse_args()
+
+    with app.app_context():
+        if args.reset:
+            db.session().drop_all(db.metadata)
+        db.session().create_all(db.metadata)
+
+        print("Starting seed...")
+        seed_users(args.users, seed=args.seed)
+        print(f"Seeded {args.users} users")
@@ -0,0 +1,396 @@
+# Standard library imports
+import json
+import os
+import zlib
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar, copy_context
+from heapq import merge
+
+# Remote library imports
+from flask_sqlalchemy.session import Session
+from sqlalchemy import Column, column, create_engine, event, insert, select, table, update
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.horizontal_shard import ShardedSession
+from sqlalchemy.orm import Mapper, joinedload, selectinload
+from sqlalchemy.sql import operators, visitors
+from sqlalchemy.sql.elements import BinaryExpression, BindParameter
+
+# (table, column) -> what a value of the column locates: a phone number or a user id
+ROUTING_COLUMNS = {
+    ('users', 'phone_number'): 'phone',
+    ('users', 'id'): 'user',
+    ('user_details', 'user_id'): 'user',
+    ('match_requests', 'user_id'): 'user',
+    ('messages', 'recipient_id'): 'user',
+    ('messages_archive', 'recipient_id'): 'user',
+    ('interests', 'requested_id'): 'user',
+}
+
+# Table -> column holding the id of the user whose shard a new row belongs on
+OWNER_COLUMNS = {
+    'user_details': 'user_id',
+    'match_requests': 'user_id',
+    'messages': 'recipient_id',
+    'messages_archive': 'recipient_id',
+    'interests': 'requested_id',
+}
+
+# Reads touching only these tables are match queries over every user, so they scatter to all shards
+USER_TABLES = {'users', 'user_details'}
+
+# The counter row of every database's user_id_sequence table
+sequences = table('user_id_sequence', column('id'), column('last'))
+
+
+def slot_for_phone(phone_number, slots):
+    return zlib.crc32(phone_number.encode()) % slots
+
+
+def reserve_sequence(connection, count):
+    """Reserve `count` user id sequence numbers on a connection's database; return the first.
+
+    The UPDATE holds the counter row's lock until the transaction ends, so a
+    concurrent reservation waits for it and then counts on past these numbers.
+    """
+    connection.execute(update(sequences).values(last=sequences.c.last + count))
+    return connection.execute(select(sequences.c.last)).scalar() - count + 1
+
+
+def advance_sequence(connection, sequence):
+    """Make a database's counter hand out only sequence numbers above `sequence`"""
+    connection.execute(update(sequences).where(sequences.c.last < sequence).values(last=sequence))
+
+
+class ShardRouting:
+    """Routes each user, and the rows they own, to one of several databases.
+
+    Phone numbers hash to one of `slots` slots and the routing map assigns every
+    slot to a shard; rebalancing moves whole slots. User ids are allocated as
+    sequence * slots + slot, so an id alone locates its user's shard and stays
+    unique across shards; each shard counts its own sequence numbers. User details, match requests and their ProfileMatch
+    rows live with their user; messages and interests live with their recipient.
+
+    Statements are routed by a phone number or user id in their WHERE clause.
+    Reads over users alone scatter to every shard, and anything else goes to the
+    home shard of the SMS being handled.
+    """
+
+    def __init__(self, engines, slots, map_file=None):
+        self.engines = engines
+        self.names = list(engines)
+        self.slots = slots
+        self.map_file = map_file
+        self.routes = self.load_map()
+        self._home = ContextVar('home_shard', default=None)
+        self._pool = ThreadPoolExecutor(max_workers=len(engines), thread_name_prefix='shard')
+
+    def load_map(self):
+        """The slot -> shard map from map_file, written on first start with slots dealt round-robin.
+
+        Keeping the map means adding a shard later reroutes nothing until a
+        rebalance moves slots onto it.
+        """
+        if not self.map_file:
+            return self.default_map()
+        if not os.path.exists(self.map_file):
+            routes = self.default_map()
+            with open(self.map_file, 'w') as f:
+                json.dump(routes, f)
+            return routes
+        with open(self.map_file) as f:
+            routes = json.load(f)
+        if len(routes) != self.slots or not set(routes) <= set(self.names):
+            raise ValueError(f'{self.map_file} does not map {self.slots} slots onto {", ".join(self.names)}')
+        return routes
+
+    def default_map(self):
+        return [self.names[slot % len(self.names)] for slot in range(self.slots)]
+
+    def save_map(self, routes):
+        with open(self.map_file, 'w') as f:
+            json.dump(routes, f)
+        self.routes = routes
+
+    def for_phone(self, phone_number):
+        return self.routes[slot_for_phone(phone_number, self.slots)]
+
+    def for_user_id(self, user_id):
+        return self.routes[user_id % self.slots]
+
+    def user_id(self, sequence, phone_number):
+        """The id of the `sequence`th user id in a phone number's slot"""
+        return sequence * self.slots + slot_for_phone(phone_number, self.slots)
+
+    @contextmanager
+    def home(self, shard):
+        """Send writes and non-user reads in the block to `shard`"""
+        token = self._home.set(shard)
+        try:
+            yield shard
+        finally:
+            self._home.reset(token)
+
+    def home_shard(self):
+        shard = self._home.get()
+        if shard is None:
+            raise RuntimeError('No home shard to route this statement to; use ShardRouting.home()')
+        return shard
+
+    def shard_chooser(self, mapper, instance, clause=None, **kw):
+        """Shard of a new instance: its phone number or owning user, else the home shard"""
+        if mapper is not None and instance is not None:
+            table = mapper.local_table.name
+            if table == 'users' and instance.phone_number:
+                return self.for_phone(instance.phone_number)
+            owner = OWNER_COLUMNS.get(table)
+            user_id = owner and getattr(instance, owner)
+            if user_id is not None:
+                return self.for_user_id(user_id)
+        return self.home_shard()
+
+    def identity_chooser(self, mapper, primary_key, *, lazy_loaded_from, execution_options, bind_arguments, **kw):
+        """Shards that may hold a primary key: exact for users, else the parent's or home shard"""
+        if mapper.local_table.name == 'users':
+            return [self.for_user_id(primary_key[0])]
+        if lazy_loaded_from is not None:
+            return [lazy_loaded_from.identity_token]
+        home = self._home.get()
+        return [home] if home is not None else self.names
+
+    def execute_chooser(self, context):
+        """Shards a statement runs on"""
+        if context.is_select and context.lazy_loaded_from is not None:
+            return [context.lazy_loaded_from.identity_token]
+
+        shards = self.criteria_shards(getattr(context.statement, 'whereclause', None), context.parameters)
+        if shards:
+            return shards
+
+        tables = {mapper.local_table.name for mapper in context.all_mappers}
+        if context.is_select and tables <= USER_TABLES:
+            return self.names
+        home = self._home.get()
+        if home is not None:
+            return [home]
+        if context.is_select:
+            return self.names
+        raise RuntimeError(f'No shard to write {", ".join(sorted(tables))} to; use ShardRouting.home()')
+
+    def criteria_shards(self, whereclause, parameters=None):
+        """Shards named by the first `column == value` or `column IN values` test on a routing column.
+
+        Values bound at execution, such as the ids of a selectin load, are read from `parameters`.
+        """
+        if whereclause is None:
+            return None
+        for element in visitors.iterate(whereclause):
+            if not isinstance(element, BinaryExpression) or element.operator not in (operators.eq, operators.in_op):
+                continue
+            column, value = element.left, element.right
+            if not isinstance(column, Column) or not isinstance(value, BindParameter) or column.table is None:
+                continue
+            route = ROUTING_COLUMNS.get((column.table.name, column.name))
+            values = value.effective_value
+            if values is None and isinstance(parameters, dict):
+                values = parameters.get(value.key)
+            if route is None or values is None:
+                continue
+            locate = self.for_phone if route == 'phone' else self.for_user_id
+            shards = {locate(v) for v in (values if isinstance(values, (list, tuple)) else [values])}
+            if shards:
+                return sorted(shards)
+        return None
+
+    def gather(self, statement, key=None):
+        """Run a read on every shard in parallel; return the rows, merged in `key` order when given"""
+        def fetch(engine):
+            with engine.connect() as connection:
+                return connection.execute(statement).all()
+
+        futures = [self._pool.submit(copy_context().run, fetch, engine) for engine in self.engines.values()]
+        results = [future.result() for future in futures]
+        if key is not None:
+            return list(merge(*results, key=key))
+        return [row for rows in results for row in rows]
+
+    def partition(self, rows, user_key):
+        """Group row dicts by the shard of the user id in `user_key`"""
+        shards = {}
+        for row in rows:
+            shards.setdefault(self.for_user_id(row[user_key]), []).append(row)
+        return shards.items()
+
+    def bulk_insert(self, session, model, rows, user_key=None):
+        """Insert row dicts on the shards of their users, or the home shard, one executemany per shard.
+
+        ShardedSession cannot route ORM bulk inserts, so these run as Core
+        inserts on the session's connection to each shard.
+        """
+        if not rows:
+            return
+        groups = self.partition(rows, user_key) if user_key else [(self.home_shard(), rows)]
+        for shard, shard_rows in groups:
+            session.connection(bind_arguments={'shard_id': shard}).execute(insert(model.__table__), shard_rows)
+
+    def new_user_ids(self, session, phone_numbers):
+        """Reserve an id for each phone number on its shard, one reservation per shard"""
+        next_sequence = {
+            shard: reserve_sequence(session.connection(bind_arguments={'shard_id': shard}), count)
+            for shard, count in Counter(self.for_phone(phone_number) for phone_number in phone_numbers).items()
+        }
+        user_ids = []
+        for phone_number in phone_numbers:
+            shard = self.for_phone(phone_number)
+            user_ids.append(self.user_id(next_sequence[shard], phone_number))
+            next_sequence[shard] += 1
+        return user_ids
+
+    def create_all(self, metadata):
+        for engine in self.engines.values():
+            metadata.create_all(engine)
+
+    def drop_all(self, metadata):
+        for engine in self.engines.values():
+            metadata.drop_all(engine)
+
+
+class SingleDatabase:
+    """Session helpers for one database.
+
+    RoutingSession has the same helpers, so code written against db.session()
+    runs unchanged whether or not users are sharded.
+    """
+
+    def shard_ids(self):
+        """Every shard, for jobs that work through them one at a time"""
+        return [None]
+
+    def home(self, shard):
+        """Send writes and non-user reads in the block to `shard`"""
+        return nullcontext(shard)
+
+    def home_for_phone(self, phone_number):
+        """Send writes and non-user reads in the block to a phone number's shard"""
+        return nullcontext()
+
+    def user_shard(self, user_id):
+        """Identity token of a user's rows"""
+        return None
+
+    def new_user_ids(self, phone_numbers):
+        """Reserve a new user id for each phone number, in order"""
+        if not phone_numbers:
+            return []
+        first = reserve_sequence(self.connection(), len(phone_numbers))
+        return list(range(first, first + len(phone_numbers)))
+
+    def gather(self, statement, key=None):
+        """Run a read over every user; return the rows, in `key` order when the statement orders by it"""
+        return self.execute(statement).all()
+
+    def bulk_insert(self, model, rows, user_key=None):
+        """Insert row dicts in one executemany.
+
+        Core inserts: the ORM would split the rows wherever one has a None the
+        next does not.
+        """
+        if rows:
+            self.execute(insert(model.__table__), rows)
+
+    def load_related(self, relationship):
+        """Loader option for a relationship to users: joined in, with everything on one database"""
+        return joinedload(relationship)
+
+    def create_all(self, metadata):
+        metadata.create_all(self.get_bind())
+
+    def drop_all(self, metadata):
+        metadata.drop_all(self.get_bind())
+
+
+class SingleSession(SingleDatabase, Session):
+    """db.session class for one database"""
+
+
+class RoutingSession(ShardedSession):
+    """db.session class that routes every statement through the configured ShardRouting"""
+
+    def __init__(self, db, **kwargs):
+        super().__init__(
+            shard_chooser=routing.shard_chooser,
+            identity_chooser=routing.identity_chooser,
+            execute_chooser=routing.execute_chooser,
+            shards=routing.engines,
+            **kwargs
+        )
+
+    def shard_ids(self):
+        return routing.names
+
+    def home(self, shard):
+        return routing.home(shard)
+
+    def home_for_phone(self, phone_number):
+        return routing.home(routing.for_phone(phone_number))
+
+    def user_shard(self, user_id):
+        return routing.for_user_id(user_id)
+
+    def new_user_ids(self, phone_numbers):
+        # Sharded ids carry the slot of the user's phone number and count on the shard it routes to
+        return routing.new_user_ids(self, phone_numbers)
+
+    def gather(self, statement, key=None):
+        # Scatter to every shard in parallel; each shard's rows are in order, so a merge restores it
+        return routing.gather(statement, key)
+
+    def bulk_insert(self, model, rows, user_key=None):
+        """Insert row dicts on the shards of the users in `user_key`, or the home shard"""
+        routing.bulk_insert(self, model, rows, user_key)
+
+    def load_related(self, relationship):
+        # Users may live on another shard, so they are loaded by id in a second query routed there
+        return selectinload(relationship)
+
+    def create_all(self, metadata):
+        routing.create_all(metadata)
+
+    def drop_all(self, metadata):
+        routing.drop_all(metadata)
+
+
+# The configured ShardRouting, or None when the app uses a single database
+routing = None
+
+
+@event.listens_for(Mapper, 'before_insert')
+def allocate_user_id(mapper, connection, target):
+    """Give a new user the next sequence number reserved on its database, as its shard's id when sharded"""
+    if mapper.local_table.name != 'users' or target.id is not None:
+        return
+    sequence = reserve_sequence(connection, 1)
+    target.id = routing.user_id(sequence, target.phone_number) if routing else sequence
+
+
+def configure_shards(app, uris, slots, map_file, engine_options=None, on_connect=None):
+    """Create an engine per shard URI and route db.session through them"""
+    global routing
+
+    def instance_relative(path):
+        return path if os.path.isabs(path) else os.path.join(app.instance_path, path)
+
+    os.makedirs(app.instance_path, exist_ok=True)
+    engines = {}
+    for i, uri in enumerate(uris):
+        url = make_url(uri)
+        if url.get_backend_name() == 'sqlite' and url.database and url.database != ':memory:':
+            url = url.set(database=instance_relative(url.database))
+        engine = create_engine(url, **(engine_options or {}))
+        if on_connect is not None and engine.dialect.name == 'sqlite':
+            event.listen(engine, 'connect', on_connect)
+        engines[f'shard{i}'] = engine
+
+    routing = ShardRouting(engines, slots, instance_relative(map_file))
+    return routing
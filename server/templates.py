@@ -0,0 +1,179 @@
+# Standard library imports
+import keyword
+import logging
+import re
+from contextlib import contextmanager
+from contextvars import ContextVar
+from string import Formatter
+
+# Local imports
+from config import app, SMS_MESSAGES
+from locales import LOCALES
+
+logger = logging.getLogger(__name__)
+
+# GSM 03.38 default alphabet, one septet each, and the extension table, two septets each
+GSM_BASIC = frozenset(
+    "@£$¥èéùìòÇ\nØø\rÅåΔ_ΦΓΛΩΠΨΣΘΞÆæßÉ !\"#¤%&'()*+,-./0123456789:;<=>?"
+    "¡ABCDEFGHIJKLMNOPQRSTUVWXYZÄÖÑÜ§¿abcdefghijklmnopqrstuvwxyzäöñüà"
+)
+GSM_EXTENDED = frozenset("^{}\\[~]|€\f")
+GSM = GSM_BASIC | GSM_EXTENDED
+# ASCII characters that are either outside the GSM alphabet or in its extension table
+ASCII_SPECIAL = re.compile(r'[\x00-\x09\x0b-\x0c\x0e-\x1f`\x7f^{}\\\[~\]|]')
+
+# (characters in a single-part SMS, characters per part of a concatenated SMS)
+GSM_LIMITS = (160, 153)
+UCS2_LIMITS = (70, 67)
+
+ELLIPSIS = '...'
+
+
+class Template:
+    """One SMS_MESSAGES entry compiled to a function that fills it in with a single f-string.
+
+    Placeholders must be plain names; conversions, format specs and positional
+    fields are rejected when the template is compiled, so a bad template fails
+    at startup instead of on the first SMS that uses it. The compiled function
+    takes a dict of values; values the template does not use are ignored and a
+    missing one raises KeyError.
+    """
+
+    def __init__(self, key, text):
+        self.key = key
+        self.text = text
+        self.fields = []
+        body = []
+        for literal, field, spec, conversion in Formatter().parse(text):
+            body.append(literal.replace('{', '{{').replace('}', '}}'))
+            if field is None:
+                continue
+            if spec or conversion or not field.isidentifier() or keyword.iskeyword(field):
+                raise ValueError(f'{key}: unsupported placeholder {{{field}{"!" + conversion if conversion else ""}'
+                                 f'{":" + spec if spec else ""}}}; use a plain name')
+            if field not in self.fields:
+                self.fields.append(field)
+            body.append(f'{{{field}}}')
+
+        if not self.fields:
+            self.render = lambda values: text
+            return
+        lines = [f'    {field} = values[{field!r}]\n' for field in self.fields]
+        source = f"def render(values):\n{''.join(lines)}    return f{''.join(body)!r}\n"
+        namespace = {}
+        exec(compile(source, f'<template {key}>', 'exec'), namespace)
+        self.render = namespace['render']
+
+    def __repr__(self):
+        return f'<Template {self.key}>'
+
+
+class Catalog:
+    """Every template of a message dict, compiled once"""
+
+    def __init__(self, messages):
+        self.templates = {key: Template(key, text) for key, text in messages.items()}
+        self.renderers = {key: template.render for key, template in self.templates.items()}
+
+    def render(self, key, **values):
+        return self.renderers[key](values)
+
+    def __contains__(self, key):
+        return key in self.templates
+
+
+class LocaleCatalog:
+    """Compiled templates for every language, all built at startup.
+
+    Each language gets one dict of renderers holding its own templates and,
+    for keys it lacks, the default language's, so a lookup is a single dict
+    access whatever the language. Missing keys are reported in `missing`.
+    A translation that adds a key or a placeholder the default language does
+    not have fails the build, since no handler would fill it in.
+    """
+
+    def __init__(self, default_language, default_messages, locales):
+        base = Catalog(default_messages)
+        self.default_language = default_language
+        self.languages = [default_language, *locales]
+        self.missing = {}
+        self.renderers = {default_language: base.renderers}
+
+        for language, messages in locales.items():
+            catalog = Catalog(messages)
+            for key, template in catalog.templates.items():
+                if key not in base:
+                    raise ValueError(f'{language}: {key} is not a {default_language} template')
+                unknown = set(template.fields) - set(base.templates[key].fields)
+                if unknown:
+                    raise ValueError(f'{language}: {key} uses unknown placeholders {", ".join(sorted(unknown))}')
+            self.missing[language] = sorted(set(base.templates) - set(catalog.templates))
+            self.renderers[language] = {**base.renderers, **catalog.renderers}
+
+        # Users whose language is no longer offered are answered in the default one
+        self.fallback = base.renderers
+
+    def render(self, language, key, **values):
+        return self.renderers.get(language, self.fallback)[key](values)
+
+
+def units(text):
+    """(length in encoding units, limits) of text as GSM-7 if it fits that alphabet, else UCS-2"""
+    if text.isascii():
+        # Nearly every reply is ASCII, where only a handful of characters need a closer look
+        special = ASCII_SPECIAL.findall(text)
+        if GSM_EXTENDED.issuperset(special):
+            return len(text) + len(special), GSM_LIMITS
+    elif GSM.issuperset(text):
+        return len(text) + sum(map(text.count, GSM_EXTENDED)), GSM_LIMITS
+    # Characters outside the Basic Multilingual Plane take two UTF-16 units
+    return len(text) + sum(1 for char in text if char > '\uffff'), UCS2_LIMITS
+
+
+def segments(text):
+    """Number of SMS parts needed to send text"""
+    length, (single, part) = units(text)
+    return 1 if length <= single else -(-length // part)
+
+
+def fit(text, max_segments):
+    """Text cut down, with an ellipsis, to fit in max_segments SMS parts"""
+    length, (single, part) = units(text)
+    limit = single if max_segments == 1 else part * max_segments
+    if length <= limit:
+        return text
+    # Every character is at least one unit, so cutting to the limit overshoots only on wide characters
+    cut = text[:limit - len(ELLIPSIS)]
+    while units(cut + ELLIPSIS)[0] > limit:
+        cut = cut[:-1]
+    return cut.rstrip() + ELLIPSIS
+
+
+locales = LocaleCatalog(app.config['DEFAULT_LANGUAGE'], SMS_MESSAGES, LOCALES)
+for language, keys in locales.missing.items():
+    if keys:
+        logger.warning('%s templates fall back to %s for %d keys: %s',
+                       language, locales.default_language, len(keys), ', '.join(keys))
+
+# Language replies are rendered in, set per SMS by speaking()
+current_language = ContextVar('language', default=None)
+
+
+@contextmanager
+def speaking(language):
+    """Render templates in the block in `language`"""
+    token = current_language.set(language)
+    try:
+        yield language
+    finally:
+        current_language.reset(token)
+
+
+def render(key, **values):
+    """Fill in a template in the current language"""
+    return locales.renderers.get(current_language.get(), locales.fallback)[key](values)
+
+
+def reply(text):
+    """Hold a reply to SMS_MAX_SEGMENTS parts"""
+    return fit(text, app.config['SMS_MAX_SEGMENTS'])
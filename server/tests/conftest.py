@@ -0,0 +1,39 @@
+# Standard library imports
+import os
+import sys
+import tempfile
+
+# Remote library imports
+import pytest
+
+# Point the app at a throwaway database before config is imported
+os.environ['DATABASE_URI'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'test.db')
+os.environ.pop('SHARDS', None)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Local imports
+from app import app, db
+from outbox import outbox
+from resolver import user_resolver
+
+
+@pytest.fixture
+def client():
+    """A test client on empty tables, with the per-process caches and rate limits out of the way"""
+    app.config.update(RATE_LIMIT_ENABLED=False, MATCH_CACHE_ENABLED=False, PROFILE_CACHE_ENABLED=False)
+    user_resolver.cache.clear()
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        yield app.test_client()
+        outbox.join()
+        db.session.remove()
+
+
+@pytest.fixture
+def sms(client):
+    """Send one SMS and return the reply text"""
+    def send(phone_number, text):
+        response = client.post('/sms', json={'from': phone_number, 'text': text})
+        return response.get_json().get('response')
+    return send
@@ -0,0 +1,55 @@
+# Standard library imports
+import asyncio
+import json
+import time
+
+# Local imports
+from app import app
+from asgi import SMSWebhook
+from ratelimit import rate_limiter
+
+
+async def post(webhook, sender, text):
+    received = [{'type': 'http.request', 'body': json.dumps({'from': sender, 'text': text}).encode()}]
+    sent = []
+
+    async def receive():
+        return received.pop()
+
+    async def send(message):
+        sent.append(message)
+
+    await webhook({'type': 'http', 'path': '/sms', 'method': 'POST'}, receive, send)
+    return sent[0]['status'], json.loads(sent[1]['body'])
+
+
+def test_blocking_calls_run_off_the_event_loop(client, monkeypatch):
+    app.config['RATE_LIMIT_ENABLED'] = True
+    monkeypatch.setattr(rate_limiter, 'check', lambda phone_number, name: time.sleep(0.2))
+
+    async def main():
+        webhook = SMSWebhook()
+        ticks = 0
+
+        async def tick():
+            nonlocal ticks
+            while True:
+                ticks += 1
+                await asyncio.sleep(0.01)
+
+        ticker = asyncio.create_task(tick())
+        started = time.perf_counter()
+        replies = await asyncio.gather(*(
+            post(webhook, f'07000000{i}0', f'start#user{i}#30#male#nairobi#nairobi') for i in range(4)
+        ))
+        elapsed = time.perf_counter() - started
+        ticker.cancel()
+        await webhook.engine.dispose()
+        return replies, elapsed, ticks
+
+    replies, elapsed, ticks = asyncio.run(main())
+
+    assert [status for status, body in replies] == [200] * 4
+    # Four 0.2s rate limit checks overlap, and the loop keeps running meanwhile
+    assert elapsed < 0.6
+    assert ticks >= 10
@@ -0,0 +1,71 @@
+# Standard library imports
+import io
+
+# Remote library imports
+import pytest
+
+# Local imports
+from app import app
+from bulk import import_users
+from config import SMS_MESSAGES
+from match_index import match_index
+from models import User, db
+
+LADIES = (
+    'phone_number,name,age,gender,county,town\n'
+    '0700000010,lady0,24,female,nairobi,nairobi\n'
+    '0700000011,lady1,25,female,nairobi,nairobi\n'
+)
+
+
+def import_csv(data, chunk_size=1):
+    rejected = []
+    importer = import_users(io.StringIO(data), 'csv', lambda line_number, error: rejected.append(line_number), chunk_size)
+    return importer.imported, rejected
+
+
+@pytest.fixture
+def built_index():
+    match_index.build()
+    yield match_index
+    match_index._buckets = None
+
+
+def test_import_drops_cached_match_results(client, sms):
+    app.config['MATCH_CACHE_ENABLED'] = True
+    sms('0700000000', 'start#john#30#male#nairobi#nairobi')
+    assert 'no matches found' in sms('0700000000', 'match#20-30#nairobi')
+
+    assert import_csv(LADIES) == (2, [])
+    assert 'We have 2 ladies' in sms('0700000000', 'match#20-30#nairobi')
+
+
+def test_import_adds_committed_users_to_a_built_index(client, sms, built_index):
+    assert import_csv(LADIES) == (2, [])
+    assert built_index.count('female', 'Nairobi', 18, 80) == 2
+
+    # The repeated number is rejected; only the new one reaches the index
+    assert import_csv(LADIES.replace('0700000010,lady0', '0700000012,lady2'), chunk_size=10) == (1, [3])
+    assert built_index.count('female', 'Nairobi', 18, 80) == 3
+    assert built_index.verify_all() == []
+
+
+def test_rows_without_a_town_are_rejected_like_registrations(client, sms):
+    rows = (
+        'phone_number,name,age,gender,county,town\n'
+        '0700000010,lady0,24,female,nairobi,\n'
+        '0700000011,lady1,25,female,,nairobi\n'
+    )
+    assert import_csv(rows) == (0, [2, 3])
+    assert sms('0700000012', 'start#lady2#26#female#nairobi#') == SMS_MESSAGES['REGISTRATION_INVALID_FORMAT']
+
+
+def test_registrations_count_past_ids_reserved_for_an_import(client, sms):
+    # An import reserves its chunk's ids before inserting them; nothing else may take them meanwhile
+    reserved = db.session().new_user_ids(['0700000010', '0700000011'])
+    db.session.commit()
+    sms('0700000000', 'start#john#30#male#nairobi#nairobi')
+    assert User.query.one().id == reserved[-1] + 1
+
+    assert import_csv(LADIES, chunk_size=2) == (2, [])
+    assert len({user.id for user in User.query}) == 3
@@ -0,0 +1,24 @@
+# Local imports
+from app import SMSProcessor
+from commands import PHONE, keyword, lookup
+
+
+def test_phone_number_routes_to_profile_lookup():
+    assert keyword('0712345678') == PHONE
+    assert lookup('0712345678').handler == SMSProcessor.handle_profile_request.__name__
+
+
+def test_phone_is_not_a_command_word(client):
+    assert lookup('phone') is None
+    assert lookup('phone 0712345678') is None
+
+    response = client.post('/sms', json={'from': '0700000000', 'text': 'phone'})
+    assert response.status_code == 400
+    assert response.get_json()['message'] == 'Unsupported command'
+
+
+def test_prefix_commands_tolerate_trailing_letters():
+    assert lookup('yesplease').name == 'yes'
+    assert lookup('nextt').name == 'next'
+    assert lookup('myselfkind and calm').name == 'myself'
+    assert lookup('matchx#20#nairobi') is None
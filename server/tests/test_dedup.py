@@ -0,0 +1,39 @@
+# Remote library imports
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+# Local imports
+from config import SMS_MESSAGES
+from models import User
+
+
+def batch(client, *messages):
+    return client.post('/sms/batch', json=[
+        {'from': phone_number, 'text': text, 'id': message_id} for phone_number, text, message_id in messages
+    ])
+
+
+def test_batched_response_is_replayed_once_committed(client, sms):
+    sms('0700000000', 'start#john#30#male#nairobi#nairobi')
+    first = batch(client, ('0700000000', 'myself kind, funny and calm', 'b1')).get_json()['results'][0]
+
+    retry = client.post('/sms', json={'from': '0700000000', 'text': 'myself changed my mind', 'id': 'b1'})
+    assert retry.get_json()['response'] == first['response'] == SMS_MESSAGES['SELF_DESCRIPTION_SUCCESS']
+    assert User.query.filter_by(phone_number='0700000000').one().details.self_description == 'kind, funny and calm'
+
+
+def test_failed_batch_commit_releases_its_message_ids(client, sms):
+    sms('0700000000', 'start#john#30#male#nairobi#nairobi')
+
+    def fail(session):
+        raise RuntimeError('commit failed')
+
+    event.listen(Session, 'before_commit', fail)
+    try:
+        assert batch(client, ('0700000000', 'myself kind, funny and calm', 'b2')).status_code == 500
+    finally:
+        event.remove(Session, 'before_commit', fail)
+
+    # Nothing was written, so the retry runs the message instead of replaying its reply
+    client.post('/sms', json={'from': '0700000000', 'text': 'myself gentle and patient', 'id': 'b2'})
+    assert User.query.filter_by(phone_number='0700000000').one().details.self_description == 'gentle and patient'
@@ -0,0 +1,57 @@
+# Remote library imports
+import pytest
+
+# Local imports
+from gazetteer import normalize_county, normalize_town, towns
+from models import User
+
+
+@pytest.mark.parametrize('text, town', [
+    ('Nairobi', 'Nairobi'),
+    ('nbi', 'Nairobi'),
+    ('Nyeri Town', 'Nyeri'),
+    ('nairobii', 'Nairobi'),
+    ('mombassa', 'Mombasa'),
+    ('westland', 'Westlands'),
+])
+def test_confident_matches(text, town):
+    assert towns.lookup(text) == town
+
+
+@pytest.mark.parametrize('text', ['Rongo', 'Nkubu', 'Ngong road', 'Kilimani'])
+def test_uncertain_matches_are_misses(text):
+    assert towns.lookup(text) is None
+    assert normalize_town(text) == text.title()
+
+
+def test_stored_names_are_not_fuzzy_matched():
+    assert normalize_town('nairobii', fuzzy=False) == 'Nairobii'
+    assert normalize_town('nbi', fuzzy=False) == 'Nairobi'
+    assert normalize_county('muranga', fuzzy=False) == "Murang'a"
+
+
+def test_registration_keeps_an_unrecognized_town(sms):
+    sms('0700000000', 'start#john#30#male#migori#rongo')
+    sms('0700000001', 'start#jane#30#female#nairobi#nairobii')
+
+    assert [(user.county, user.town) for user in User.query.order_by(User.id)] == [
+        ('Migori', 'Rongo'),
+        ('Nairobi', 'Nairobii'),
+    ]
+
+
+def test_match_finds_a_town_stored_as_typed(sms):
+    sms('0700000000', 'start#john#30#male#nairobi#nairobi')
+    sms('0700000001', 'start#jane#25#female#nairobi#nairobii')
+    sms('0700000002', 'start#mary#26#female#nairobi#nairobi')
+
+    assert 'We have 1 ladies' in sms('0700000000', 'match#20-30#nairobii')
+    assert 'Jane aged 25' in sms('0700000000', 'match#20-30#nairobii')
+    assert 'Mary aged 26' in sms('0700000000', 'match#20-30#nairobi')
+
+
+def test_match_guesses_a_misspelled_town_nobody_registered(sms):
+    sms('0700000000', 'start#john#30#male#nairobi#nairobi')
+    sms('0700000002', 'start#mary#26#female#nairobi#nairobi')
+
+    assert 'Mary aged 26' in sms('0700000000', 'match#20-30#nairobii')
@@ -0,0 +1,39 @@
+# Remote library imports
+import pytest
+
+# Local imports
+from match_cache import MatchCache, MemoryBackend, RedisBackend
+
+
+def rows(count):
+    return [(user_id, 25) for user_id in range(count)]
+
+
+def cached(cache, town, count):
+    """Look up a bucket, loading `count` rows on a miss; return whether the lookup loaded"""
+    loaded = []
+    cache.get_or_load('female', town, 20, 30, lambda: loaded.append(town) or rows(count))
+    return bool(loaded)
+
+
+def test_memory_backend_bounds_the_rows_it_holds():
+    cache = MatchCache(MemoryBackend(max_rows=100, ttl=60))
+    assert cached(cache, 'Nairobi', 60)
+    assert cached(cache, 'Kisumu', 30)
+    assert not cached(cache, 'Nairobi', 60)
+
+    # 60 + 30 + 30 rows is past the bound, so the least recently used result goes
+    assert cached(cache, 'Mombasa', 30)
+    assert not cached(cache, 'Nairobi', 60)
+    assert cached(cache, 'Kisumu', 30)
+
+
+def test_redis_backend_shares_results_until_the_bucket_is_written():
+    fakeredis = pytest.importorskip('fakeredis')
+    server = fakeredis.FakeServer()
+    worker, other = (MatchCache(RedisBackend(fakeredis.FakeRedis(server=server), ttl=60)) for _ in range(2))
+
+    assert cached(worker, 'Nairobi', 3)
+    assert not cached(other, 'Nairobi', 3)
+    other.invalidate('female', 'Nairobi')
+    assert cached(worker, 'Nairobi', 3)
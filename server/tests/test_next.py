@@ -0,0 +1,43 @@
+# Remote library imports
+import pytest
+
+# Local imports
+from app import app
+from config import SMS_MESSAGES
+
+
+@pytest.fixture(params=['eager', 'lazy'])
+def match_mode(request):
+    app.config['MATCH_MODE'] = request.param
+    yield request.param
+    app.config['MATCH_MODE'] = 'eager'
+
+
+def register_matches(sms, count):
+    sms('0700000000', 'start#john#30#male#nairobi#nairobi')
+    for i in range(count):
+        sms(f'07000000{i + 10}', f'start#lady{i}#{24 + i}#female#nairobi#nairobi')
+
+
+def test_next_pages_through_matches(sms, match_mode):
+    register_matches(sms, 5)
+
+    first = sms('0700000000', 'match#20-30#nairobi')
+    assert 'We have 5 ladies' in first
+    assert 'Lady2 aged 26' in first and 'Lady3' not in first
+
+    assert sms('0700000000', 'next') == 'Lady3 aged 27, 0700000013. Lady4 aged 28, 0700000014.'
+
+
+def test_next_at_and_past_the_end(sms, match_mode):
+    register_matches(sms, 3)
+    sms('0700000000', 'match#20-30#nairobi')
+
+    assert sms('0700000000', 'next') == SMS_MESSAGES['NEXT_NO_MORE_MATCHES']
+    assert sms('0700000000', 'next') == SMS_MESSAGES['NEXT_NO_MORE_MATCHES']
+
+
+def test_next_without_a_match_request(sms):
+    register_matches(sms, 0)
+
+    assert sms('0700000000', 'next') == SMS_MESSAGES['NEXT_NO_ACTIVE_REQUEST']
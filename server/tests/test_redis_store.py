@@ -0,0 +1,40 @@
+# Remote library imports
+import pytest
+
+# Local imports
+from dedup import DedupStore, PENDING
+from ratelimit import RateLimiter, RedisBackend
+from redis_store import RedisStore
+
+fakeredis = pytest.importorskip('fakeredis')
+
+
+@pytest.fixture
+def redis_client():
+    """A client on a fresh in-process Redis-compatible server"""
+    return fakeredis.FakeRedis(server=fakeredis.FakeServer())
+
+
+def test_store_shares_values_between_clients(redis_client):
+    store, other = RedisStore(redis_client, 'test:', ttl=60), RedisStore(redis_client, 'test:')
+    assert store.add('a', {'reply': 1})
+    assert not other.add('a', 'again')
+    assert other.get('a') == {'reply': 1}
+    assert redis_client.ttl('test:a') == 60
+
+    store.delete('a')
+    assert other.get('a') is None
+
+
+def test_dedup_window_replays_through_the_store(redis_client):
+    dedup = DedupStore(RedisStore(redis_client, 'penzi:dedup:', 60))
+    assert dedup.claim('0722010203', 'm1') is None
+    assert dedup.claim('0722010203', 'm1') == PENDING
+    dedup.complete('0722010203', 'm1', 'done')
+    assert dedup.claim('0722010203', 'm1') == 'done'
+
+
+def test_rate_limit_buckets_are_taken_by_the_script(redis_client):
+    limiter = RateLimiter(RedisBackend(redis_client), {'default': (2, 60)})
+    assert [limiter.check('0722010203', 'match') for _ in range(3)] == [0, 0, 1]
+    assert limiter.check('0722010204', 'match') == 0
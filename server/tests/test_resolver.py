@@ -0,0 +1,36 @@
+# Standard library imports
+import time
+
+# Remote library imports
+from sqlalchemy import insert
+
+# Local imports
+from config import SMS_MESSAGES, app, db
+from models import User, UserDetail
+from resolver import user_resolver
+
+
+def test_stale_cached_details_are_re_read(sms):
+    sms('0700000000', 'start#john#30#male#nairobi#nairobi')
+    assert user_resolver.resolve('0700000000').details is None
+    db.session.remove()
+
+    # Another worker writes the details; this process's cache still says there are none
+    user_id = db.session.query(User.id).scalar()
+    with db.engine.begin() as connection:
+        connection.execute(insert(UserDetail), {'user_id': user_id, 'education_level': 'Degree'})
+
+    assert sms('0700000000', 'myself kind, funny and calm') == SMS_MESSAGES['SELF_DESCRIPTION_SUCCESS']
+
+    details = UserDetail.query.one()
+    assert (details.education_level, details.self_description) == ('Degree', 'kind, funny and calm')
+
+
+def test_cached_users_expire(sms, monkeypatch):
+    sms('0700000000', 'start#john#30#male#nairobi#nairobi')
+    user_resolver.resolve('0700000000')
+    assert user_resolver.cache.get('0700000000') is not None
+
+    now = time.monotonic()
+    monkeypatch.setattr(time, 'monotonic', lambda: now + app.config['USER_CACHE_TTL'])
+    assert user_resolver.cache.get('0700000000') is None
@@ -0,0 +1,24 @@
+# Remote library imports
+from sqlalchemy import bindparam, func, select
+
+# Local imports
+from app import db
+from models import User
+from sharding import ShardRouting, SingleSession
+
+
+def test_single_database_session_runs_the_shard_helpers_locally(client, sms):
+    sms('0722010203', 'start#john#30#male#nairobi#nairobi')
+    session = db.session()
+    assert isinstance(session, SingleSession)
+    assert session.shard_ids() == [None]
+    with session.home_for_phone('0722010203'):
+        assert session.gather(select(func.count(User.id))) == [(1,)]
+
+
+def test_ids_bound_at_execution_route_to_their_shards():
+    routing = ShardRouting({'shard0': None, 'shard1': None, 'shard2': None}, slots=3)
+    statement = select(User).where(User.id.in_(bindparam('primary_keys', expanding=True)))
+    assert routing.criteria_shards(statement.whereclause, {'primary_keys': [3, 6]}) == ['shard0']
+    assert routing.criteria_shards(statement.whereclause, {'primary_keys': [4, 8]}) == ['shard1', 'shard2']
+    assert routing.criteria_shards(statement.whereclause) is None
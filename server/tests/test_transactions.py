@@ -0,0 +1,103 @@
+# Standard library imports
+import threading
+
+# Remote library imports
+import pytest
+from sqlalchemy import event, func
+
+# Local imports
+import app as app_module
+import commit_hooks
+from commit_hooks import Staged
+from config import SMS_MESSAGES, db
+from models import MatchRequest, ProfileMatch, User
+
+
+@pytest.fixture
+def commits(client):
+    """Count the database commits this thread makes while a test runs; the outbox commits from its own"""
+    count = [0]
+    thread = threading.get_ident()
+
+    def on_commit(connection):
+        if threading.get_ident() == thread:
+            count[0] += 1
+
+    event.listen(db.engine, 'commit', on_commit)
+    yield count
+    event.remove(db.engine, 'commit', on_commit)
+
+
+def register(sms):
+    sms('0700000000', 'start#john#30#male#nairobi#nairobi')
+    for i in range(5):
+        sms(f'07000000{i + 10}', f'start#lady{i}#{24 + i}#female#nairobi#nairobi')
+
+
+def rows(model):
+    return db.session.query(func.count()).select_from(model).scalar()
+
+
+@pytest.mark.parametrize('text', ['match#20-30#nairobi', 'next', '0700000010', 'yes'])
+def test_each_sms_commits_once(sms, commits, text):
+    register(sms)
+    sms('0700000000', 'match#20-30#nairobi')
+    sms('0700000010', '0700000000')
+
+    before = commits[0]
+    sms('0700000010' if text == 'yes' else '0700000000', text)
+    assert commits[0] - before == 1
+
+
+def test_failed_match_request_leaves_no_partial_rows(sms, monkeypatch):
+    register(sms)
+    sms('0700000000', 'match#20-25#nairobi')
+    before = rows(MatchRequest), rows(ProfileMatch)
+    db.session.remove()
+
+    def fail(user_ids):
+        raise RuntimeError('boom')
+
+    monkeypatch.setattr(app_module, 'load_users', fail)
+    reply = sms('0700000000', 'match#20-30#nairobi')
+    assert reply == SMS_MESSAGES['MATCH_FAILED'].format(error='boom')
+
+    db.session.remove()
+    # The earlier request is still the active one, and nothing from the failed one was kept
+    assert (rows(MatchRequest), rows(ProfileMatch)) == before
+    assert [(request.age_range_end, request.is_active) for request in MatchRequest.query] == [(25, True)]
+
+
+def test_failed_message_in_batch_rolls_back_only_its_savepoint(client, monkeypatch):
+    register(lambda phone_number, text: client.post('/sms', json={'from': phone_number, 'text': text}))
+    db.session.remove()
+
+    monkeypatch.setattr(app_module, 'load_users', lambda user_ids: 1 / 0)
+    response = client.post('/sms/batch', json=[
+        {'from': '0700000000', 'text': 'match#20-30#nairobi'},
+        {'from': '0700000010', 'text': 'myself kind, funny and calm'},
+    ]).get_json()
+
+    assert response['results'][0]['response'].startswith('Match request failed')
+    db.session.remove()
+    assert rows(MatchRequest) == 0 and rows(ProfileMatch) == 0
+    assert User.query.filter_by(phone_number='0700000010').one().details.self_description == 'kind, funny and calm'
+
+
+def test_staged_items_wait_for_commit_and_leave_with_their_savepoint(client, monkeypatch):
+    monkeypatch.setattr(commit_hooks, 'registry', [])
+    applied, discarded = [], []
+    staged = Staged(lambda session, items: applied.extend(items), lambda session, items: discarded.extend(items))
+    session = db.session()
+
+    staged.add(session, 'kept')
+    with session.begin_nested() as savepoint:
+        staged.add(session, 'dropped')
+        savepoint.rollback()
+    assert (applied, discarded) == ([], ['dropped'])
+
+    session.commit()
+    session.connection()
+    staged.add(session, 'uncommitted')
+    session.rollback()
+    assert (applied, discarded) == (['kept'], ['dropped', 'uncommitted'])